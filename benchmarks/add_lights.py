@@ -0,0 +1,128 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+# This script compares adding lights one by one with add_light against adding
+# them at once with add_lights. Run it from any directory:
+#
+#   python benchmarks/add_lights.py [num_lights ...]
+
+import os
+import sys
+import time
+import random
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, base_dir)
+
+from panda3d.core import PerspectiveLens, NodePath, Camera, PTAInt, Vec3  # noqa
+from panda3d._rplight import InternalLightManager, ShadowManager, GPUCommandList  # noqa
+from panda3d._rplight import RPPointLight  # noqa
+
+from rpcore.globals import Globals  # noqa
+from rpcore.light_manager import LightManager  # noqa
+
+
+class CommandQueue(object):  # pylint: disable=too-few-public-methods
+
+    """ Command queue only providing the command lists, without uploading
+    the commands to the gpu """
+
+    def __init__(self):
+        self.command_list = GPUCommandList()
+        self.priority_list = GPUCommandList()
+        self.priority_available = True
+
+    def mark_barrier(self):
+        pass
+
+
+class ShowBase(object):  # pylint: disable=too-few-public-methods
+
+    """ Provides the main camera used to prioritize the lights in view """
+
+    def __init__(self):
+        self.render = NodePath("render")
+        self.camLens = PerspectiveLens()  # noqa # pylint: disable=invalid-name
+        self.cam = self.render.attach_new_node(Camera("camera", self.camLens))
+
+
+def create_light_manager():
+    """ Creates a light manager with only the internal light manager and the
+    command lists, which are all add_light uses """
+    light_mgr = LightManager.__new__(LightManager)
+    light_mgr.light_budget = None
+    light_mgr._budget_lights = {}  # pylint: disable=protected-access
+    light_mgr.cmd_queue = CommandQueue()
+    light_mgr.internal_mgr = InternalLightManager()
+    light_mgr.internal_mgr.shadow_manager = ShadowManager()
+    light_mgr.internal_mgr.set_command_list(light_mgr.cmd_queue.command_list)
+    light_mgr.pta_max_light_index = PTAInt.empty_array(1)
+    return light_mgr
+
+
+def create_lights(num_lights):
+    """ Creates point lights spread around the camera """
+    lights = []
+    for _ in range(num_lights):
+        light = RPPointLight()
+        light.pos = Vec3(*[random.uniform(-500.0, 500.0) for _ in range(3)])
+        light.radius = 10.0
+        light.energy = 20.0
+        lights.append(light)
+    return lights
+
+
+def measure(num_lights):
+    """ Returns the time in seconds to add the given amount of lights one by
+    one with add_light, and at once with add_lights """
+    light_mgr = create_light_manager()
+    lights = create_lights(num_lights)
+    start = time.perf_counter()
+    for light in lights:
+        light_mgr.add_light(light)
+    individual = time.perf_counter() - start
+
+    light_mgr = create_light_manager()
+    lights = create_lights(num_lights)
+    start = time.perf_counter()
+    light_mgr.add_lights(lights)
+    batched = time.perf_counter() - start
+    return individual, batched
+
+
+def main():
+    random.seed(1)
+    Globals.base = ShowBase()
+    for num_lights in [int(arg) for arg in sys.argv[1:]] or [10000, 50000]:
+        individual, batched = measure(num_lights)
+        print("Lights: {:6d}  add_light loop: {:8.1f} ms ({:5.2f} us per call)  "
+              "add_lights: {:8.1f} ms  speedup: {:5.2f}x".format(
+                  num_lights, individual * 1000.0, individual / num_lights * 1e6,
+                  batched * 1000.0, individual / batched))
+
+
+if __name__ == "__main__":
+    main()
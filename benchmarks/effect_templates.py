@@ -0,0 +1,150 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+# This script compares the throughput of the cached template segments used by
+# Effect._process_shader_template with the line by line template processing
+# it replaced. Run it from any directory:
+#
+#   python benchmarks/effect_templates.py [iterations]
+
+import os
+import sys
+import time
+import tempfile
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, base_dir)
+
+from panda3d.core import Filename, VirtualFileSystem  # noqa
+
+from direct.stdpy.file import open  # noqa
+
+from rpcore.effect import Effect  # noqa
+from rpcore.util.shader_cache import ShaderCache  # noqa
+
+
+class LineByLineEffect(Effect):
+
+    """ Effect using the template processing from before the segment cache,
+    which reads and scans the whole template for every generated shader """
+
+    def _process_shader_template(self, template_src, cache_key, injections):
+        with open(template_src, "r") as handle:
+            shader_lines = handle.readlines()
+
+        parsed_lines = ["\n\n"]
+        addline = parsed_lines.append
+
+        addline("/* Compiled Shader Template")
+        addline(" * generated from: '" + template_src + "'")
+        addline(" * cache key: '" + cache_key + "'")
+        addline(" *")
+        addline(" * !!! Autogenerated, do not edit! Your changes will be lost. !!!")
+        addline(" */\n\n")
+
+        in_main = False
+        for line in shader_lines:
+            stripped_line = line.strip().lower()
+            if "void main()" in stripped_line:
+                in_main = True
+            if stripped_line.startswith("%") and stripped_line.endswith("%"):
+                hook_name = stripped_line[1:-1]
+                indent = " " * (len(line) - len(line.lstrip()))
+                if hook_name in injections:
+                    insertions = injections.pop(hook_name)
+                    if len(insertions) > 0:
+                        header = indent + "/* Hook: " + hook_name + " */"
+                        addline(header + (" {" if in_main else ""))
+                        for line_to_insert in insertions:
+                            if line_to_insert.startswith("#"):
+                                addline(line_to_insert)
+                            else:
+                                addline(indent + line_to_insert)
+                        if in_main:
+                            addline(indent + "}")
+            else:
+                addline(line.rstrip())
+        addline("")
+
+        shader_content = "\n".join(parsed_lines)
+        temp_path = "/$$rptemp/$$effect-" + cache_key + ".glsl"
+        with open(temp_path, "w") as handle:
+            handle.write(shader_content)
+        return temp_path
+
+
+def mount(temp_dir):
+    """ Mounts the pipeline directories the same way the MountManager does,
+    using a temporary directory as write path """
+    vfs = VirtualFileSystem.get_global_ptr()
+    vfs.mount(Filename.from_os_specific(base_dir), "/$$rp", 0)
+    vfs.mount(Filename.from_os_specific(os.path.join(base_dir, "rpcore", "shader")),
+              "/$$rp/shader", 0)
+    vfs.mount(Filename.from_os_specific(temp_dir), "/$$rptemp", 0)
+
+
+def generate_all(effect_cls, effect_srcs, iterations):
+    """ Generates the shaders of all passes of the given effects, and returns
+    the amount of generated shaders per second """
+    effects = []
+    for effect_src in effect_srcs:
+        effect = effect_cls()
+        effect.do_load(effect_src)
+        effects.append(effect)
+
+    # pylint: disable=protected-access
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for effect in effects:
+            for pass_id in Effect._PASSES:
+                effect._parse_shader_template(pass_id, "vertex", effect._vertex_data)
+                effect._parse_shader_template(pass_id, "fragment", effect._fragment_data)
+    duration = time.perf_counter() - start
+    return iterations * len(effects) * len(Effect._PASSES) * 2 / duration
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    ShaderCache.enabled = False
+    mount(tempfile.mkdtemp())
+
+    effect_dir = os.path.join(base_dir, "effects")
+    effect_srcs = ["/$$rp/effects/" + name for name in sorted(os.listdir(effect_dir))
+                   if name.endswith(".yaml")]
+
+    # Warm up the template cache, so only the steady state is measured
+    generate_all(Effect, effect_srcs, 1)
+
+    line_by_line = generate_all(LineByLineEffect, effect_srcs, iterations)
+    segments = generate_all(Effect, effect_srcs, iterations)
+    print("Effects:", len(effect_srcs), " Iterations:", iterations)
+    print("Line by line:     {:10.0f} shaders/s".format(line_by_line))
+    print("Cached segments:  {:10.0f} shaders/s".format(segments))
+    print("Speedup:          {:10.2f}x".format(segments / line_by_line))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+# This script measures how long RenderPipeline.create takes with and without
+# a config bundle. The pipeline can only be created once per process, so each
+# measurement runs in a new process, with an offscreen window. Run it from any
+# directory, this requires a graphics context:
+#
+#   python benchmarks/pipeline_startup.py [runs]
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, base_dir)
+
+
+def create_pipeline(bundle_path):
+    """ Creates the pipeline with all plugins, using the given config bundle
+    if it is not empty, and returns the duration of RenderPipeline.create in
+    seconds """
+    from panda3d.core import load_prc_file_data
+    from direct.showbase.ShowBase import ShowBase
+    from rpcore.render_pipeline import RenderPipeline
+
+    load_prc_file_data("", "window-type offscreen")
+    pipeline = RenderPipeline()
+    if bundle_path:
+        pipeline.mount_mgr.config_bundle = bundle_path
+    pipeline.plugins_used = " ".join(sorted(os.listdir(os.path.join(base_dir, "rpplugins"))))
+    base = ShowBase()
+
+    start = time.perf_counter()
+    pipeline.create(base)
+    return time.perf_counter() - start
+
+
+def measure(bundle_path, runs, work_dir):
+    """ Returns the durations of creating the pipeline in new processes """
+    durations = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, os.path.realpath(__file__), "--create", bundle_path], cwd=work_dir)
+        durations.append(float(output.decode("utf-8").strip().splitlines()[-1]))
+    return durations
+
+
+def main():
+    if sys.argv[1:2] == ["--create"]:
+        print(create_pipeline(sys.argv[2]))
+        return
+
+    from rplibs.yaml.bundle import build_bundle
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    temp_dir = tempfile.mkdtemp()
+    bundle_path = os.path.join(temp_dir, "config-bundle.pickle")
+    print("Bundled", build_bundle(base_dir, bundle_path), "files")
+
+    # The plugin manager loads the plugin configs from ../render/rpplugins
+    work_dir = os.path.join(temp_dir, "work")
+    os.mkdir(work_dir)
+    os.symlink(os.path.realpath(base_dir), os.path.join(temp_dir, "render"))
+
+    # The first launch is only used to warm up the disk caches
+    measure("", 1, work_dir)
+    for name, pth in (("individual files", ""), ("config bundle", bundle_path)):
+        durations = measure(pth, runs, work_dir)
+        print("{:18} best: {:8.1f} ms  mean: {:8.1f} ms".format(
+            name, min(durations) * 1000.0, sum(durations) / len(durations) * 1000.0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+# This script compares applying one effect to many nodepaths with
+# set_effect_many against calling set_effect for each nodepath. Run it from
+# any directory:
+#
+#   python benchmarks/set_effect_many.py [num_nodepaths]
+
+import os
+import sys
+import time
+import tempfile
+import collections
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, base_dir)
+
+from panda3d.core import Filename, VirtualFileSystem, NodePath, Camera  # noqa
+from panda3d._rplight import TagStateManager  # noqa
+
+from rpcore.effect import Effect  # noqa
+from rpcore.render_pipeline import RenderPipeline  # noqa
+from rpcore.util.shader_cache import ShaderCache  # noqa
+from rpcore.util.shader_includes import ShaderDependencyGraph  # noqa
+
+
+class PluginManager(object):  # pylint: disable=too-few-public-methods
+
+    """ Plugin manager without any enabled plugin """
+
+    def is_plugin_enabled(self, plugin_id):  # pylint: disable=unused-argument
+        return False
+
+
+class StageManager(object):  # pylint: disable=too-few-public-methods
+
+    """ Stage manager only providing the shader graph effects register with """
+
+    def __init__(self):
+        self.shader_graph = ShaderDependencyGraph()
+
+
+def create_pipeline():
+    """ Creates a pipeline with only the managers set_effect uses """
+    pipeline = RenderPipeline.__new__(RenderPipeline)
+    pipeline._applied_effects = collections.OrderedDict()  # pylint: disable=protected-access
+    pipeline.tag_mgr = TagStateManager(NodePath(Camera("camera")))
+    pipeline.plugin_mgr = PluginManager()
+    pipeline.stage_mgr = StageManager()
+    return pipeline
+
+
+def mount(temp_dir):
+    """ Mounts the pipeline directories the same way the MountManager does,
+    using a temporary directory as write path """
+    vfs = VirtualFileSystem.get_global_ptr()
+    vfs.mount(Filename.from_os_specific(base_dir), "/$$rp", 0)
+    vfs.mount(Filename.from_os_specific(os.path.join(base_dir, "rpcore", "shader")),
+              "/$$rp/shader", 0)
+    vfs.mount(Filename.from_os_specific(temp_dir), "/$$rptemp", 0)
+
+
+def main():
+    num_nodepaths = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    ShaderCache.enabled = False
+    mount(tempfile.mkdtemp())
+
+    effect_src = "/$$rp/effects/default.yaml"
+    root = NodePath("root")
+    nodepaths = [root.attach_new_node("node-" + str(i)) for i in range(num_nodepaths)]
+
+    # Generate the shaders once, so only applying the effect is measured
+    Effect.load(effect_src, {}).get_shader_obj("gbuffer")
+
+    pipeline = create_pipeline()
+    start = time.perf_counter()
+    for nodepath in nodepaths:
+        pipeline.set_effect(nodepath, effect_src, {})
+    individual = time.perf_counter() - start
+
+    pipeline = create_pipeline()
+    start = time.perf_counter()
+    pipeline.set_effect_many(nodepaths, effect_src, {})
+    batched = time.perf_counter() - start
+
+    print("Nodepaths:", num_nodepaths)
+    print("set_effect loop:  {:8.1f} ms".format(individual * 1000.0))
+    print("set_effect_many:  {:8.1f} ms".format(batched * 1000.0))
+    print("Speedup:          {:8.2f}x".format(individual / batched))
+
+
+if __name__ == "__main__":
+    main()
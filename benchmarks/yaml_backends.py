@@ -0,0 +1,83 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+# This script compares the time each registered yaml backend takes to parse
+# all yaml files of the pipeline. Run it from any directory:
+#
+#   python benchmarks/yaml_backends.py [iterations]
+
+import os
+import sys
+import time
+import glob
+
+base_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, base_dir)
+
+from rplibs.yaml import get_backends  # noqa
+from rplibs.yaml.loader import compare_backends, parse_yaml  # noqa
+
+
+def find_yaml_files():
+    """ Returns all yaml files of the pipeline """
+    return sorted(glob.glob(os.path.join(base_dir, "config", "*.yaml")) +
+                  glob.glob(os.path.join(base_dir, "effects", "*.yaml")) +
+                  glob.glob(os.path.join(base_dir, "rpplugins", "*", "*.yaml")))
+
+
+def measure(filenames, iterations):
+    """ Returns the time in seconds each backend takes to parse all given
+    files, repeated the given amount of iterations """
+    contents = []
+    for filename in filenames:
+        with open(filename, "rb") as handle:
+            contents.append(handle.read().decode("utf-8"))
+    timings = {}
+    for name in get_backends():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for content in contents:
+                parse_yaml(content, name)
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    filenames = find_yaml_files()
+    mismatches = compare_backends(filenames, open)
+    for filename, backend in mismatches:
+        print("Mismatch:", backend, "differs on", os.path.relpath(filename, base_dir))
+
+    timings = measure(filenames, iterations)
+    reference = timings["vendored"]
+    for name, duration in timings.items():
+        print("Backend: {:10s}  {:8.1f} ms per pass  speedup: {:5.2f}x".format(
+            name, duration / iterations * 1000.0, reference / duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -26,12 +26,12 @@ THE SOFTWARE.
 
 from panda3d.core import CS_yup_right, CS_zup_right, invert, Vec3, Mat4, Vec4
 from panda3d.core import SamplerState
-from direct.stdpy.file import open
 
 from rpcore.globals import Globals
 from rpcore.loader import RPLoader
 
 from rpcore.util.shader_input_blocks import GroupedInputBlock
+from rpcore.util.shader_includes import write_generated_include
 
 
 class CommonResources():
@@ -86,10 +86,13 @@ class CommonResources():
         proj_mat.set_cell(1, 1, 0.0)
         self._input_ubo.update_input("view_proj_mat_no_jitter", view_mat * proj_mat)
 
+    def get_input(self, name):
+        """ Returns the current value of an input of the main scene data """
+        return self._input_ubo.get_input(name)
+
     def write_config(self):
         content = self._input_ubo.generate_shader_code()
-        with open("/$$rptemp/$$main_scene_data.inc.glsl", "w") as handle:
-            handle.write(content)
+        write_generated_include("/$$rptemp/$$main_scene_data.inc.glsl", content)
  
     def _load_textures(self):
         self._load_environment_cubemap()
@@ -24,13 +24,19 @@ THE SOFTWARE.
 
 """
 
+import time
+import hashlib
+import collections
+
 from rplibs.yaml import load_yaml_file
 
-from panda3d.core import Filename
+from panda3d.core import Filename, VirtualFileSystem
 
 from direct.stdpy.file import open
 
 from rpcore.loader import RPLoader
+from rpcore.util.shader_cache import ShaderCache
+from rpcore.util.shader_includes import ShaderSourceIndex
 
 
 class Effect():
@@ -51,9 +57,35 @@ class Effect():
     # TagStateManager class.
     _PASSES = ("gbuffer", "shadow", "voxelize", "envmap", "forward")
 
-    # Effects are cached based on their source filename and options, this is
-    # the cache where compiled are effects stored.
-    _GLOBAL_CACHE = {}
+    # Plugins which render the given passes. If such a plugin is not enabled,
+    # nothing consumes the pass and its shaders never have to be generated.
+    _PASS_PLUGINS = {
+        "voxelize": "vxgi",
+        "envmap": "env_probes",
+        "forward": "forward_shading",
+    }
+
+    # Effects are cached based on the path and timestamp of their source file
+    # and their options, this is the cache where compiled effects are stored. The cache
+    # is ordered by last access, so the least recently used effect gets
+    # evicted first as soon as the cache grows beyond _CACHE_SIZE.
+    _GLOBAL_CACHE = collections.OrderedDict()
+    _CACHE_SIZE = 256
+
+    # Statistics about the effect cache, see get_cache_stats()
+    _CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "load_time": 0.0,
+                    "compile_time": 0.0}
+
+    # Parsed shader templates, see _load_template()
+    _TEMPLATE_CACHE = {}
+
+    # Index used to hash the files an effect is made of, see invalidate_modified()
+    _SOURCE_INDEX = None
+
+    # Shader dependency graph effects get registered in when they are applied,
+    # set by the RenderPipeline. Effects removed from the cache are removed
+    # from the graph as well, so they can be garbage collected.
+    SHADER_GRAPH = None
 
     # Global counter to store the amount of generated effects, used to create
     # a unique id used for writing temporary files.
@@ -64,27 +96,157 @@ class Effect():
         """ Loads an effect from a given filename with the specified options.
         This lookups in the global effect cache, and checks if a similar effect
         (i.e. with the same hash) was already loaded, and in that case returns it.
-        Otherwise a new effect with the given options is created. """
-        effect_hash = cls._generate_hash(filename, options)
-        if effect_hash in cls._GLOBAL_CACHE:
-            return cls._GLOBAL_CACHE[effect_hash]
+        Otherwise a new effect with the given options is created and stored
+        in the cache. """
+        options = options or {}
+        cache_key = cls._generate_key(filename, options)
+        if cache_key in cls._GLOBAL_CACHE:
+            cls._CACHE_STATS["hits"] += 1
+            cls._GLOBAL_CACHE.move_to_end(cache_key)
+            return cls._GLOBAL_CACHE[cache_key]
+
+        cls._CACHE_STATS["misses"] += 1
+        start_time = time.perf_counter()
         effect = cls()
         effect.set_options(options)
         if not effect.do_load(filename):
-            print("Effect", "Could not load effect!")
+            effect.warn("Could not load effect!")
             return None
+        cls._CACHE_STATS["load_time"] += time.perf_counter() - start_time
+
+        cls._GLOBAL_CACHE[cache_key] = effect
+        cls._evict_least_recently_used()
         return effect
 
     @classmethod
-    def _generate_hash(cls, filename, options):
-        options = {k: options.get(k, v) for k, v in cls._DEFAULT_OPTIONS.items()}
-        
+    def invalidate(cls, filename, options=None):
+        """ Removes all cached effects which were loaded from the given filename.
+        If options are passed, only the effect matching these options is removed.
+        Returns the amount of removed effects. """
+        filename = cls._make_absolute(filename)
+        options_hash = None if options is None else cls._generate_options_hash(options)
+        to_remove = []
+        for cache_key, effect in cls._GLOBAL_CACHE.items():
+            if cls._make_absolute(effect.filename) != filename:
+                continue
+            if options_hash is not None and cache_key[2] != options_hash:
+                continue
+            to_remove.append(cache_key)
+        for cache_key in to_remove:
+            cls._remove(cache_key)
+        return len(to_remove)
+
+    @classmethod
+    def invalidate_modified(cls):
+        """ Removes all cached effects whose effect file, shader templates or
+        any file included by these changed since the effect was loaded. This
+        is done when reloading the shaders, so unchanged effects can still be
+        served from the cache. Returns the amount of removed effects. """
+        index = cls._get_source_index()
+        index.forget()
+
+        # Templates are only parsed again if their timestamp changed, which
+        # might not be the case if they were modified within the same second
+        cls._TEMPLATE_CACHE.clear()
+        to_remove = [
+            cache_key for cache_key, effect in cls._GLOBAL_CACHE.items()
+            if index.get_source_hashes(effect.dependencies) != effect.source_hashes]
+        for cache_key in to_remove:
+            cls._remove(cache_key)
+        return len(to_remove)
+
+    @classmethod
+    def invalidate_dependents(cls, paths):
+        """ Removes all cached effects whose shaders are made of any of the
+        given files, directly or through includes. The files are read again
+        the next time an effect uses them. Returns the removed effects. """
+        index = cls._get_source_index()
+        paths = set(index.resolve(path) or path for path in paths)
+        index.forget(paths)
+        for path in paths:
+            cls._TEMPLATE_CACHE.pop(path, None)
+        to_remove = [cache_key for cache_key, effect in cls._GLOBAL_CACHE.items()
+                     if not paths.isdisjoint(effect.source_hashes)]
+        removed = [cls._GLOBAL_CACHE[cache_key] for cache_key in to_remove]
+        for cache_key in to_remove:
+            cls._remove(cache_key)
+        return removed
+
+    @classmethod
+    def clear_cache(cls):
+        """ Removes all effects from the cache and resets the statistics """
+        for cache_key in list(cls._GLOBAL_CACHE.keys()):
+            cls._remove(cache_key)
+        cls._get_source_index().forget()
+        cls._TEMPLATE_CACHE.clear()
+        for key in cls._CACHE_STATS:
+            cls._CACHE_STATS[key] = 0.0 if key.endswith("_time") else 0
+
+    @classmethod
+    def set_cache_size(cls, size):
+        """ Sets the maximum amount of cached effects. Least recently used
+        effects are evicted if the cache currently holds more effects. """
+        cls._CACHE_SIZE = max(1, int(size))
+        cls._evict_least_recently_used()
+
+    @classmethod
+    def get_cache_stats(cls):
+        """ Returns a dictionary containing the amount of cache hits, misses
+        and evictions, the total time in seconds spent loading effects and
+        spent generating and compiling their passes, and the amount of
+        currently cached effects. """
+        stats = dict(cls._CACHE_STATS)
+        stats["size"] = len(cls._GLOBAL_CACHE)
+        stats["capacity"] = cls._CACHE_SIZE
+        return stats
+
+    @classmethod
+    def _evict_least_recently_used(cls):
+        """ Removes the least recently used effects until the cache does not
+        hold more than _CACHE_SIZE effects """
+        while len(cls._GLOBAL_CACHE) > cls._CACHE_SIZE:
+            cls._remove(next(iter(cls._GLOBAL_CACHE)))
+            cls._CACHE_STATS["evictions"] += 1
+
+    @classmethod
+    def _remove(cls, cache_key):
+        """ Removes a single effect from the cache and the shader graph """
+        effect = cls._GLOBAL_CACHE.pop(cache_key)
+        if cls.SHADER_GRAPH is not None:
+            cls.SHADER_GRAPH.unregister(effect)
+
+    @classmethod
+    def _get_source_index(cls):
+        """ Returns the index used to resolve and hash the effect sources """
+        if cls._SOURCE_INDEX is None:
+            cls._SOURCE_INDEX = ShaderSourceIndex()
+        return cls._SOURCE_INDEX
+
+    @classmethod
+    def _make_absolute(cls, filename):
+        """ Converts a filename to an absolute os specific path """
         filename = Filename(filename)
         filename.make_absolute()
-        file_hash = str(hash(filename.to_os_generic()))
+        return filename.to_os_generic()
 
-        options_hash = "".join(["1" if options[key] else "0" for key in sorted(options.keys())])
-        return file_hash + "-" + options_hash
+    @classmethod
+    def _generate_options_hash(cls, options):
+        """ Generates a string from the given options, after merging them
+        with the default options """
+        options = {k: options.get(k, v) for k, v in cls._DEFAULT_OPTIONS.items()}
+        return "".join([
+            ("1" if options[key] else "0") if isinstance(options[key], bool)
+            else "(" + str(options[key]) + ")" for key in sorted(options.keys())])
+
+    @classmethod
+    def _generate_key(cls, filename, options):
+        """ Generates the cache key of an effect from the absolute path and the
+        timestamp of the effect file, and the options. The file is not read,
+        modified effect files are detected by their timestamp. """
+        filename = cls._make_absolute(filename)
+        vfile = VirtualFileSystem.get_global_ptr().get_file(Filename(filename), True)
+        timestamp = vfile.get_timestamp() if vfile else 0
+        return (filename, timestamp, cls._generate_options_hash(options))
 
     def __init__(self):
         self.effect_id = Effect._EFFECT_ID
@@ -93,6 +255,9 @@ class Effect():
         self._options = self._DEFAULT_OPTIONS.copy()
         self._generated_shader_paths = {}
         self._shader_objs = {}
+        self._vertex_data = {}
+        self._fragment_data = {}
+        self.source_hashes = {}
 
     def get_option(self, name):
         """ Returns a given option value by name """
@@ -105,30 +270,96 @@ class Effect():
 
     def do_load(self, filename):
         """ Internal method to load the effect from the given filename, do
-        not use this directly, instead use load(). """
+        not use this directly, instead use load(). The shaders of the
+        individual passes are not generated here, but on the first call to
+        get_shader_obj() for the respective pass. """
         self.filename = filename
         self.effect_name = self._convert_filename_to_name(filename)
-        self.effect_hash = self._generate_hash(filename, self._options)
+
+        # The effect file was modified if it is loaded again
+        index = self._get_source_index()
+        effect_path = index.resolve(filename) or filename
+        index.forget([effect_path])
 
         # Load the YAML file
         parsed_yaml = load_yaml_file(filename) or {}
         self._parse_content(parsed_yaml)
 
-        # Construct a shader object for each pass
-        for pass_id in self._PASSES:
-            vertex_src = self._generated_shader_paths["vertex-" + pass_id]
-            fragment_src = self._generated_shader_paths["fragment-" + pass_id]
-            self._shader_objs[pass_id] = RPLoader.load_shader(vertex_src, fragment_src)
+        # Remember the content of all files the shaders will be made of, so
+        # invalidate_modified can find out if the effect is outdated
+        self.source_hashes = index.get_source_hashes(self.dependencies)
+        file_hash = self.source_hashes.get(effect_path) or hashlib.sha1(
+            effect_path.encode("utf-8")).hexdigest()
+        self.effect_hash = file_hash[:16] + "-" + self._generate_options_hash(self._options)
         return True
 
+    def is_pass_enabled(self, pass_id, plugin_mgr=None):
+        """ Returns whether the given pass should be rendered with this effect.
+        This is not the case if the pass was disabled with the render_* options,
+        or if a plugin manager is passed and the plugin consuming the pass is
+        not enabled. """
+        if not self._options["render_" + pass_id]:
+            return False
+        if plugin_mgr is not None and pass_id in self._PASS_PLUGINS:
+            return plugin_mgr.is_plugin_enabled(self._PASS_PLUGINS[pass_id])
+        return True
+
+    @property
+    def materialized_passes(self):
+        """ Returns a tuple of all passes whose shaders were generated and
+        compiled so far """
+        return tuple(pass_id for pass_id in self._PASSES if pass_id in self._shader_objs)
+
+    @property
+    def source_files(self):
+        """ Returns the files the generated shaders of this effect were made
+        from. This includes the effect file, the used templates and the
+        generated shaders, whose includes are not resolved here. """
+        files = [self.filename]
+        for key, path in self._generated_shader_paths.items():
+            stage, pass_id = key.split("-", 1)
+            if stage == "vertex":
+                files.append("/$$rp/shader/templates/vertex.vert.glsl")
+            else:
+                files.append("/$$rp/shader/templates/{}.frag.glsl".format(pass_id))
+            files.append(path)
+        return files
+
+    @property
+    def dependencies(self):
+        """ Returns the files the shaders of all enabled passes are made of,
+        without resolving their includes. Unlike source_files, this includes
+        passes whose shaders were not generated yet. """
+        files = [self.filename, "/$$rp/shader/templates/vertex.vert.glsl"]
+        files += ["/$$rp/shader/templates/{}.frag.glsl".format(pass_id)
+                  for pass_id in self._PASSES if self._options["render_" + pass_id]]
+        for data in (self._vertex_data, self._fragment_data):
+            files += data.get("dependencies", None) or []
+        return files
+
     def get_shader_obj(self, pass_id):
         """ Returns a handle to the compiled shader object for a given render
-        pass. """
+        pass. The shader is generated and compiled on the first request. """
         if pass_id not in self._shader_objs:
-            self.warn("Pass '" + pass_id + "' not found!")
-            return False
+            if pass_id not in self._PASSES:
+                self.warn("Pass '" + pass_id + "' not found!")
+                return False
+            if not self._options["render_" + pass_id]:
+                self.warn("Pass '" + pass_id + "' is disabled by the effect options!")
+                return False
+            start_time = time.perf_counter()
+            self._parse_shader_template(pass_id, "vertex", self._vertex_data)
+            self._parse_shader_template(pass_id, "fragment", self._fragment_data)
+            vertex_src = self._generated_shader_paths["vertex-" + pass_id]
+            fragment_src = self._generated_shader_paths["fragment-" + pass_id]
+            self._shader_objs[pass_id] = RPLoader.load_shader(vertex_src, fragment_src)
+            self._CACHE_STATS["compile_time"] += time.perf_counter() - start_time
         return self._shader_objs[pass_id]
 
+    def warn(self, *args):
+        """ Prints a warning about this effect """
+        print("Effect", self.filename, *args)
+
     def _convert_filename_to_name(self, filename):
         """ Constructs an effect name from a filename, this is used for writing
         out temporary files """
@@ -136,13 +367,10 @@ class Effect():
             .replace("/", "_").replace("\\", "_").replace(".", "-")
 
     def _parse_content(self, parsed_yaml):
-        """ Internal method to construct the effect from a yaml object """
-        vtx_data = parsed_yaml.get("vertex", None) or {}
-        frag_data = parsed_yaml.get("fragment", None) or {}
-
-        for pass_id in self._PASSES:
-            self._parse_shader_template(pass_id, "vertex", vtx_data)
-            self._parse_shader_template(pass_id, "fragment", frag_data)
+        """ Internal method to construct the effect from a yaml object. This
+        only stores the template data, the passes are generated lazily. """
+        self._vertex_data = parsed_yaml.get("vertex", None) or {}
+        self._fragment_data = parsed_yaml.get("fragment", None) or {}
 
     def _parse_shader_template(self, pass_id, stage, data):
         """ Parses a fragment template. This just finds the default template
@@ -157,7 +385,8 @@ class Effect():
         shader_path = self._construct_shader_from_data(pass_id, stage, template_src, data)
         self._generated_shader_paths[stage + "-" + pass_id] = shader_path
 
-    def _construct_shader_from_data(self, pass_id, stage, template_src, data):  # noqa # pylint: disable=too-many-branches
+    def _construct_shader_from_data(  # pylint: disable=too-many-branches
+            self, pass_id, stage, template_src, data):
         """ Constructs a shader from a given dataset """
         injects = {"defines": []}
 
@@ -178,10 +407,11 @@ class Effect():
             for dependency in data["dependencies"]:
                 include_str = "#pragma include \"{}\"".format(dependency)
                 injects["includes"].append(include_str)
-            del data["dependencies"]
 
         # Append aditional injects
         for key, val in data.items():
+            if key == "dependencies":
+                continue
             if val is None:
                 self.warn("Empty insertion: '" + key + "'")
                 continue
@@ -195,12 +425,65 @@ class Effect():
         cache_key = self.effect_name + "@" + stage + "-" + pass_id + "@" + self.effect_hash
         return self._process_shader_template(template_src, cache_key, injects)
 
+    @classmethod
+    def _load_template(cls, template_src):
+        """ Returns the parsed segments and the content hash of a shader
+        template. Templates are only parsed once into a list of segments,
+        which are either literal blocks of code (strings) or hook slots,
+        stored as (hook_name, indent, in_main) tuples. The parsed template
+        is cached and only parsed again when the file changed. """
+        vfs = VirtualFileSystem.get_global_ptr()
+        vfile = vfs.get_file(Filename(template_src), True)
+        timestamp = vfile.get_timestamp() if vfile else 0
+
+        cached = cls._TEMPLATE_CACHE.get(template_src)
+        if cached is not None and cached[0] == timestamp:
+            return cached[2], cached[1]
+
+        with open(template_src, "r") as handle:
+            content = handle.read()
+        content_hash = hashlib.md5(content.encode("utf-8")).hexdigest()
+
+        # The file was touched, but its content did not change
+        if cached is not None and cached[1] == content_hash:
+            cls._TEMPLATE_CACHE[template_src] = (timestamp, content_hash, cached[2])
+            return cached[2], content_hash
+
+        segments = []
+        literal_lines = []
+        in_main = False
+
+        for line in content.splitlines():
+            stripped_line = line.strip().lower()
+            if "void main()" in stripped_line:
+                in_main = True
+            if stripped_line.startswith("%") and stripped_line.endswith("%"):
+                if literal_lines:
+                    segments.append("\n".join(literal_lines))
+                    literal_lines = []
+                indent = " " * (len(line) - len(line.lstrip()))
+                segments.append((stripped_line[1:-1], indent, in_main))
+            else:
+                literal_lines.append(line.rstrip())
+
+        if literal_lines:
+            segments.append("\n".join(literal_lines))
+
+        cls._TEMPLATE_CACHE[template_src] = (timestamp, content_hash, segments)
+        return segments, content_hash
+
     def _process_shader_template(self, template_src, cache_key, injections):
         """ Generates a compiled shader object from a given shader
         source location and code injection definitions. """
+        segments, template_hash = self._load_template(template_src)
 
-        with open(template_src, "r") as handle:
-            shader_lines = handle.readlines()
+        # Check if the shader was already generated, possibly in a previous run
+        if ShaderCache.enabled:
+            cache_name = "effect-" + cache_key.split("@")[0] + "-" + cache_key.split("@")[1]
+            content_key = ShaderCache.make_key(template_src, template_hash, cache_key, injections)
+            cached_path = ShaderCache.lookup(cache_name, content_key)
+            if cached_path is not None:
+                return cached_path
 
         parsed_lines = ["\n\n"]
         addline = parsed_lines.append
@@ -212,42 +495,35 @@ class Effect():
         addline(" * !!! Autogenerated, do not edit! Your changes will be lost. !!!")
         addline(" */\n\n")
 
-        in_main = False
-
-        for line in shader_lines:  # pylint: disable=too-many-nested-blocks
-            stripped_line = line.strip().lower()
-            if "void main()" in stripped_line:
-                in_main = True
-            if stripped_line.startswith("%") and stripped_line.endswith("%"):
-                hook_name = stripped_line[1:-1]
-                indent = " " * (len(line) - len(line.lstrip()))
-
-                if hook_name in injections:
-                    insertions = injections.pop(hook_name)
-                    if len(insertions) > 0:
-                        header = indent + "/* Hook: " + hook_name + " */" + (" {" if in_main else "")  # noqa # pylint: disable=line-too-long
-                        addline(header)
+        for segment in segments:  # pylint: disable=too-many-nested-blocks
+            if isinstance(segment, str):
+                addline(segment)
+                continue
 
-                        for line_to_insert in insertions:
-                            if line_to_insert is None:
-                                self.warn("Empty insertion '" + hook_name + "'")
-                                continue
+            hook_name, indent, in_main = segment
+            if hook_name in injections:
+                insertions = injections.pop(hook_name)
+                if len(insertions) > 0:
+                    header = indent + "/* Hook: " + hook_name + " */"
+                    addline(header + (" {" if in_main else ""))
 
-                            if not isinstance(line_to_insert, str):
-                                self.warn("Invalid line type: ", line_to_insert)
-                                continue
+                    for line_to_insert in insertions:
+                        if line_to_insert is None:
+                            self.warn("Empty insertion '" + hook_name + "'")
+                            continue
 
-                            # Dont indent defines and pragmas
-                            if line_to_insert.startswith("#"):
-                                addline(line_to_insert)
-                            else:
-                                addline(indent + line_to_insert)
+                        if not isinstance(line_to_insert, str):
+                            self.warn("Invalid line type: ", line_to_insert)
+                            continue
 
-                        if in_main:
-                            addline(indent + "}")
+                        # Dont indent defines and pragmas
+                        if line_to_insert.startswith("#"):
+                            addline(line_to_insert)
+                        else:
+                            addline(indent + line_to_insert)
 
-            else:
-                addline(line.rstrip())
+                    if in_main:
+                        addline(indent + "}")
 
         addline("")
 
@@ -256,6 +532,9 @@ class Effect():
 
         # Write the constructed shader and load it back
         shader_content = "\n".join(parsed_lines)
+        if ShaderCache.enabled:
+            return ShaderCache.store(cache_name, content_key, shader_content)
+
         temp_path = "/$$rptemp/$$effect-" + cache_key + ".glsl"
 
         with open(temp_path, "w") as handle:
@@ -24,7 +24,9 @@ THE SOFTWARE.
 
 """
 
-from panda3d.core import PTAInt
+import collections
+
+from panda3d.core import PTAInt, PTAUchar, GeomEnums
 
 from rpcore.image import Image
 from rpcore.loader import RPLoader
@@ -36,12 +38,33 @@ from panda3d._rplight import GPUCommand, GPUCommandList
 class GPUCommandQueue():
 
     """ This class offers an interface to the gpu, allowing commands to be
-    pushed to a queue which then get executed on the gpu """
+    pushed to a queue which then get executed on the gpu.
+
+    The amount of commands executed per frame adapts to the backlog: It grows
+    up to max_commands_per_frame while more commands are queued than can be
+    processed, and shrinks back to commands_per_frame once the backlog is
+    drained. Commands in the priority list are always executed before the
+    commands of the regular command list. """
+
+    # Amount of floats each command occupies in the command buffer
+    COMMAND_SIZE = 32
+
+    # Amount of frames to keep statistics for, see get_stats
+    NUM_STAT_SAMPLES = 240
 
     def __init__(self, pipeline):
         self._pipeline = pipeline
-        self._commands_per_frame = 1024
+        self.commands_per_frame = pipeline.command_queue_budget
+        self.max_commands_per_frame = max(self.commands_per_frame,
+                                          pipeline.command_queue_max_budget)
+        self._commands_per_frame = self.commands_per_frame
+        self._buffer_capacity = 0
         self._command_list = GPUCommandList()
+        self._priority_list = GPUCommandList()
+        self._barrier = 0
+        self._backlog_age = 0
+        self._bytes_uploaded = 0
+        self._stats = collections.deque(maxlen=self.NUM_STAT_SAMPLES)
         self._pta_num_commands = PTAInt.empty_array(1)
         self._create_data_storage()
         self._create_command_target()
@@ -57,13 +80,34 @@ class GPUCommandQueue():
         """ Returns a handle to the command list """
         return self._command_list
 
+    @property
+    def priority_list(self):
+        """ Returns a handle to the priority command list, whose commands are
+        executed before all commands of the regular command list. Only use it
+        while priority_available is True, see mark_barrier. """
+        return self._priority_list
+
+    @property
+    def priority_available(self):
+        """ Returns whether commands may be added to the priority list. This is
+        not the case while commands queued before the last barrier are still
+        waiting in the regular command list. """
+        return self._barrier == 0
+
+    def mark_barrier(self):
+        """ Makes sure all commands currently in the regular command list are
+        executed before any command added to the priority list from now on.
+        This is required after commands which must not be overtaken, like the
+        removal of a light whose slot might get reused. """
+        self._barrier = self._command_list.num_commands
+
     @property
     def num_queued_commands(self):
         """ Returns the amount of queued commands, which are waiting to get
         executed on the gpu. This might be zero a lot of the time, because the
         GPUCommandList clears the queue after executing, so you have to call
         this after work was submitted. """
-        return self._command_list.num_commands
+        return self._command_list.num_commands + self._priority_list.num_commands
 
     @property
     def num_processed_commands(self):
@@ -71,20 +115,103 @@ class GPUCommandQueue():
         command queue was updated """
         return self._pta_num_commands[0]
 
+    @property
+    def num_backlog_commands(self):
+        """ Returns the amount of commands which could not be processed the
+        last time the command queue was updated, and are still queued """
+        return self.num_queued_commands
+
+    @property
+    def backlog_age(self):
+        """ Returns for how many frames the queue has not been fully drained """
+        return self._backlog_age
+
+    @property
+    def bytes_uploaded(self):
+        """ Returns the amount of command data uploaded the last time the
+        command queue was updated, in bytes """
+        return self._bytes_uploaded
+
+    @property
+    def current_commands_per_frame(self):
+        """ Returns the maximum amount of commands executed per frame, after
+        adapting it to the backlog """
+        return self._commands_per_frame
+
+    def get_stats(self):
+        """ Returns the statistics of the last frame, and the averages and
+        maximums of the last NUM_STAT_SAMPLES frames """
+        stats = {
+            "commands_per_frame": self._commands_per_frame,
+            "buffer_capacity": self._buffer_capacity,
+            "backlog_age": self._backlog_age,
+            "queued": 0, "processed": 0, "backlog": 0, "bytes_uploaded": 0,
+        }
+        if not self._stats:
+            return stats
+        stats.update(self._stats[-1])
+        for key in ("queued", "processed", "backlog", "bytes_uploaded"):
+            samples = [sample[key] for sample in self._stats]
+            stats["avg_" + key] = sum(samples) / float(len(samples))
+            stats["max_" + key] = max(samples)
+        return stats
+
     def process_queue(self):
         """ Processes the n first commands of the queue """
+        num_queued = self.num_queued_commands
+        self._adapt_budget(num_queued)
+        budget = self._commands_per_frame
         pointer = self._data_texture.modify_ram_image()
-        num_commands_exec = self._command_list.write_commands_to(
-            pointer, self._commands_per_frame)
+
+        num_priority = self._priority_list.write_commands_to(pointer, budget)
+        if num_priority == 0:
+            num_regular = self._command_list.write_commands_to(pointer, budget)
+        elif num_priority < budget:
+            # The regular commands have to be placed after the priority
+            # commands, so write them to a staging buffer first
+            num_regular = self._command_list.write_commands_to(
+                self._staging, budget - num_priority)
+            command_bytes = self.COMMAND_SIZE * 4
+            offset = num_priority * command_bytes
+            memoryview(pointer)[offset:offset + num_regular * command_bytes] = \
+                memoryview(self._staging)[:num_regular * command_bytes]
+        else:
+            num_regular = 0
+
+        num_commands_exec = num_priority + num_regular
         self._pta_num_commands[0] = num_commands_exec
+        self._barrier = max(0, self._barrier - num_regular)
+
+        backlog = num_queued - num_commands_exec
+        self._backlog_age = self._backlog_age + 1 if backlog > 0 else 0
+        self._bytes_uploaded = num_commands_exec * self.COMMAND_SIZE * 4
+        self._stats.append({
+            "queued": num_queued, "processed": num_commands_exec,
+            "backlog": backlog, "bytes_uploaded": self._bytes_uploaded})
+
+    def _adapt_budget(self, num_queued):
+        """ Grows the amount of commands executed per frame while the backlog
+        exceeds it, and shrinks it again once the backlog got small """
+        budget = self._commands_per_frame
+        if num_queued > budget:
+            budget = min(budget * 2, self.max_commands_per_frame)
+        elif num_queued < budget // 4:
+            budget = max(budget // 2, self.commands_per_frame)
+        self._commands_per_frame = budget
+        if budget > self._buffer_capacity:
+            self._resize_data_storage(budget)
 
     def reload_shaders(self):
         """ Reloads the command shader """
-        shader = RPLoader.load_shader(
-            "/$$rp/shader/default_post_process.vert.glsl",
-            "/$$rp/shader/process_command_queue.frag.glsl")
+        shader = RPLoader.load_shader(*self.shader_sources)
         self._command_target.shader = shader
 
+    @property
+    def shader_sources(self):
+        """ Returns the files the command shader is loaded from """
+        return ("/$$rp/shader/default_post_process.vert.glsl",
+                "/$$rp/shader/process_command_queue.frag.glsl")
+
     def register_input(self, key, val):
         """ Registers an new shader input to the command target """
         self._command_target.set_shader_input(key, val)
@@ -101,8 +228,21 @@ class GPUCommandQueue():
 
     def _create_data_storage(self):
         """ Creates the buffer used to transfer commands """
-        command_buffer_size = self._commands_per_frame * 32
+        self._buffer_capacity = self._commands_per_frame
+        command_buffer_size = self._commands_per_frame * self.COMMAND_SIZE
         self._data_texture = Image.create_buffer("CommandQueue", command_buffer_size, "R32")
+        self._staging = PTAUchar.empty_array(command_buffer_size * 4)
+
+    def _resize_data_storage(self, num_commands):
+        """ Grows the buffer used to transfer commands, so it can hold the
+        given amount of commands. The texture stays the same, so it does not
+        have to be bound again. """
+        self._buffer_capacity = num_commands
+        command_buffer_size = num_commands * self.COMMAND_SIZE
+        comp_type, comp_format = Image.convert_texture_format("R32")
+        self._data_texture.setup_buffer_texture(
+            command_buffer_size, comp_type, comp_format, GeomEnums.UH_static)
+        self._staging = PTAUchar.empty_array(command_buffer_size * 4)
 
     def _create_command_target(self):
         """ Creates the target which processes the commands """
@@ -26,11 +26,14 @@ THE SOFTWARE.
 
 import math
 
-from panda3d.core import LVecBase2i, PTAInt
+from panda3d.core import LVecBase2i, PTAInt, Point3, BoundingSphere, Mat4
 
 from rpcore.globals import Globals
 from rpcore.gpu_command_queue import GPUCommandQueue
 from rpcore.image import Image
+from rpcore.util.light_culling import LightCullingGrid, cull_lights, pack_light_data
+from rpcore.util.light_grid_tuner import CameraPose
+from rpcore.util.light_budget import LightImportanceBudget
 
 from panda3d._rplight import InternalLightManager, ShadowManager
 from panda3d._rplight import RPPointLight
@@ -56,6 +59,12 @@ class LightManager():
     def __init__(self, pipeline):
         """ Constructs the light manager """
         self.pipeline = pipeline
+
+        # Optional budget of active lights, see enable_light_budget. Maps the
+        # keys used by the budget to the lights.
+        self.light_budget = None
+        self._budget_lights = {}
+
         self.compute_tile_size()
         self.init_internal_manager()
         self.init_command_queue()
@@ -83,20 +92,164 @@ class LightManager():
         """ Returns the shadow atlas coverage in percentage  """
         return self.internal_mgr.shadow_manager.atlas.coverage * 100.0
 
-    def add_light(self, light):
-        """ Adds a new light """
-        self.internal_mgr.add_light(light)
+    def add_light(self, light, priority=False):
+        """ Adds a new light. The commands of prioritized lights are executed
+        before all other queued commands. Unlike add_lights, the light is not
+        prioritized by default, since that would require the camera frustum
+        for every single light. """
+        if self.light_budget is not None:
+            self._budget_lights[id(light)] = light
+            self._register_budget_light(light)
+            return
+        if priority and self.cmd_queue.priority_available:
+            self.internal_mgr.set_command_list(self.cmd_queue.priority_list)
+            self.internal_mgr.add_light(light)
+            self.internal_mgr.set_command_list(self.cmd_queue.command_list)
+        else:
+            self.internal_mgr.add_light(light)
         self.pta_max_light_index[0] = self.internal_mgr.max_light_index
 
     def remove_light(self, light):
         """ Removes a light """
-        self.internal_mgr.remove_light(light)
+        self.remove_lights((light,))
+
+    def add_lights(self, lights, priority=None):
+        """ Adds several lights at once, see add_light. Unless priority is
+        given, the lights visible to the main camera are prioritized. The
+        camera frustum is only computed once, and the maximum light index is
+        only updated after all lights were added. If a light budget is
+        enabled, the lights only get attached once they are ranked high
+        enough. Returns the amount of added lights. """
+        lights = list(lights)
+        if self.light_budget is not None:
+            for light in lights:
+                self._budget_lights[id(light)] = light
+                self._register_budget_light(light)
+            return len(lights)
+        self._attach_lights(lights, priority)
+        self.pta_max_light_index[0] = self.internal_mgr.max_light_index
+        return len(lights)
+
+    def remove_lights(self, lights):
+        """ Removes several lights at once, see remove_light. Returns the amount
+        of removed lights. """
+        count = 0
+        for light in lights:
+            # Lights added before enabling the budget are not managed by it
+            key = id(light)
+            if self._budget_lights.pop(key, None) is not None:
+                attached = key in self.light_budget.active
+                self.light_budget.remove(key)
+                if not attached:
+                    count += 1
+                    continue
+            self.internal_mgr.remove_light(light)
+            count += 1
+        self.pta_max_light_index[0] = self.internal_mgr.max_light_index
+
+        # The slots of the lights might get reused, so prioritized lights may
+        # not overtake the removal
+        self.cmd_queue.mark_barrier()
+        return count
+
+    def _attach_lights(self, lights, priority):
+        """ Adds the given lights to the internal light manager, the commands
+        of prioritized lights go to the priority list of the command queue """
+        # The camera frustum is only required if lights can be prioritized
+        if not self.cmd_queue.priority_available or not lights:
+            prioritized = ()
+        elif priority is None:
+            view_bounds = self._get_view_bounds()
+            prioritized = [self._is_in_view(light, view_bounds) for light in lights]
+        else:
+            prioritized = [priority] * len(lights)
+
+        regular = lights
+        if any(prioritized):
+            regular = []
+            self.internal_mgr.set_command_list(self.cmd_queue.priority_list)
+            for light, is_prioritized in zip(lights, prioritized):
+                if is_prioritized:
+                    self.internal_mgr.add_light(light)
+                else:
+                    regular.append(light)
+            self.internal_mgr.set_command_list(self.cmd_queue.command_list)
+
+        for light in regular:
+            self.internal_mgr.add_light(light)
+
+    def enable_light_budget(self, max_lights, cell_size=100.0, hysteresis=0.25):
+        """ Limits the amount of attached lights. Each frame, the lights are
+        ranked by their estimated contribution from their energy, radius and
+        distance to the camera, and only the max_lights most important lights
+        are attached, see rpcore.util.light_budget. Only lights added after
+        enabling the budget are managed by it. Lights which get moved, or
+        whose radius or energy changes, should be passed to
+        update_budget_light. If a budget is already enabled, its lights are
+        kept and ranked with the new limits at the next update. """
+        previous_budget = self.light_budget
+        self.light_budget = LightImportanceBudget(max_lights, cell_size, hysteresis)
+        if previous_budget is None:
+            self._budget_lights = {}
+            return
+        for light in self._budget_lights.values():
+            self._register_budget_light(light)
+        self.light_budget.active = previous_budget.active
+
+    def disable_light_budget(self):
+        """ Disables the light budget, and attaches all hibernated lights """
+        if self.light_budget is None:
+            return
+        hibernated = [light for key, light in self._budget_lights.items()
+                      if key not in self.light_budget.active]
+        self.light_budget = None
+        self._budget_lights = {}
+        self._attach_lights(hibernated, None)
         self.pta_max_light_index[0] = self.internal_mgr.max_light_index
 
+    def update_budget_light(self, light):
+        """ Updates the position, radius and energy of a light managed by the
+        light budget, see enable_light_budget """
+        if self.light_budget is not None and id(light) in self._budget_lights:
+            self._register_budget_light(light)
+
+    def _register_budget_light(self, light):
+        pos = light.pos
+        self.light_budget.add(id(light), (pos.x, pos.y, pos.z),
+                              getattr(light, "radius", 0.0), light.energy)
+
+    def _update_light_budget(self, camera_pos):
+        """ Attaches the lights which became important enough, and detaches the
+        lights which are not anymore """
+        activated, hibernated = self.light_budget.update(
+            (camera_pos.x, camera_pos.y, camera_pos.z))
+        if not activated and not hibernated:
+            return
+        for key in hibernated:
+            self.internal_mgr.remove_light(self._budget_lights[key])
+        if hibernated:
+            self.cmd_queue.mark_barrier()
+        self._attach_lights([self._budget_lights[key] for key in activated], None)
+        self.pta_max_light_index[0] = self.internal_mgr.max_light_index
+
+    def _get_view_bounds(self):
+        """ Returns the bounds of the main camera frustum in world space """
+        bounds = Globals.base.camLens.make_bounds()
+        bounds.xform(Globals.base.cam.get_transform(Globals.base.render).get_mat())
+        return bounds
+
+    def _is_in_view(self, light, view_bounds):
+        """ Returns whether the light is at least partially visible in the
+        given view bounds, see _get_view_bounds """
+        radius = max(getattr(light, "radius", 0.0), 0.001)
+        return view_bounds.contains(BoundingSphere(Point3(light.pos), radius)) != 0
+
     def update(self):
         """ Main update method to process the GPU commands """
-        self.internal_mgr.set_camera_pos(
-            Globals.base.camera.get_pos(Globals.base.render))
+        camera_pos = Globals.base.camera.get_pos(Globals.base.render)
+        if self.light_budget is not None:
+            self._update_light_budget(camera_pos)
+        self.internal_mgr.set_camera_pos(camera_pos)
         self.internal_mgr.update()
         self.shadow_manager.update()
         self.cmd_queue.process_queue()
@@ -104,6 +257,7 @@ class LightManager():
     def reload_shaders(self):
         """ Reloads all assigned shaders """
         self.cmd_queue.reload_shaders()
+        self.pipeline.stage_mgr.shader_graph.register(self, self.cmd_queue.shader_sources)
 
     def compute_tile_size(self):
         """ Computes how many tiles there are on screen """
@@ -112,6 +266,32 @@ class LightManager():
         num_tiles_y = int(math.ceil(Globals.resolution.y / float(self.tile_size.y)))
         self.num_tiles = LVecBase2i(num_tiles_x, num_tiles_y)
 
+    def get_culling_grid(self):
+        """ Returns the parameters of the light culling grid, see
+        rpcore.util.light_culling """
+        return LightCullingGrid(
+            self.num_tiles.x, self.num_tiles.y, self.pipeline.culling_grid_slices,
+            self.pipeline.culling_max_distance, self.pipeline.max_lights_per_cell)
+
+    def cull_lights_cpu(self, lights, used_cells=None):
+        """ Culls the given lights on the cpu, using the current camera and the
+        culling grid of the pipeline. This is useful to validate light setups
+        without a gpu, see rpcore.util.light_culling.cull_lights """
+        light_data, int_packing = pack_light_data(lights)
+        pose = self.get_camera_pose()
+        return cull_lights(
+            light_data, self.get_culling_grid(), pose.view_mat, pose.frustum_directions,
+            int_packing, used_cells)
+
+    def get_camera_pose(self, depth_samples=None):
+        """ Returns the current camera pose as used by the light culling, this
+        can be recorded along a camera path to tune the culling grid with
+        rpcore.util.light_grid_tuner.LightGridTuner """
+        resources = self.pipeline.common_resources
+        return CameraPose(Mat4(resources.get_input("view_mat_z_up")),
+                          Mat4(resources.get_input("vs_frustum_directions")),
+                          depth_samples)
+
     def init_command_queue(self):
         """ Inits the command queue """
         self.cmd_queue = GPUCommandQueue(self.pipeline)
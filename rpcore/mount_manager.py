@@ -31,6 +31,11 @@ from panda3d.core import Filename, VirtualFileSystem, get_model_path
 from panda3d.core import VirtualFileMountRamdisk
 from direct.stdpy.file import join, isdir, isfile
 
+from rplibs.yaml.snapshot_cache import set_snapshot_dir
+from rplibs.yaml.bundle import load_bundle, unload_bundle
+
+from rpcore.util.shader_cache import ShaderCache
+
 class MountManager():
 
     """ This classes mounts the required directories for the pipeline to run.
@@ -48,6 +53,9 @@ class MountManager():
         self._mounted = False
         self._do_cleanup = True
         self._config_dir = None
+        self._cache_path = None
+        self._cache_size = 64 * 1024 * 1024
+        self._config_bundle = None
         atexit.register(self._on_exit_cleanup)
 
     @property
@@ -112,6 +120,63 @@ class MountManager():
         Set the directory to None to use the default directory. """
         self._config_dir = Filename.from_os_specific(pth).get_fullpath()
 
+    @property
+    def cache_path(self):
+        """ Returns the shader cache directory previously set with
+        set_cache_path, or None if the shader cache is disabled """
+        return self._cache_path
+
+    @cache_path.setter
+    def cache_path(self, pth):
+        """ Sets a persistent directory to store generated shaders and parsed
+        YAML files in. Unlike the write path, this directory is not cleaned up
+        when the application stops, so generated effect and stage shaders can
+        be reused on the next launch. Set the directory to None to disable the shader cache. If the
+        mount manager was already mounted, the directory is mounted directly. """
+        if pth is None:
+            self._cache_path = None
+            self._unmount_cache()
+            return
+        self._cache_path = Filename.from_os_specific(pth).get_fullpath()
+        if self._mounted:
+            self._mount_cache()
+
+    @property
+    def cache_size(self):
+        """ Returns the maximum size of the shader cache in bytes """
+        return self._cache_size
+
+    @cache_size.setter
+    def cache_size(self, size):
+        """ Sets the maximum size of the shader cache in bytes. When the cache
+        directory gets mounted and exceeds this size, the files written
+        first are removed until the cache fits again. Reading a cached file
+        does not count as a use, so this is not a least recently used
+        eviction, and the size is not enforced while the cache is mounted. """
+        self._cache_size = int(size)
+
+    @property
+    def config_bundle(self):
+        """ Returns the config bundle previously set, or None if the
+        configuration files are loaded individually """
+        return self._config_bundle
+
+    @config_bundle.setter
+    def config_bundle(self, pth):
+        """ Sets the path to a config bundle built with
+        python -m rplibs.yaml.bundle. The bundle contains the parsed
+        configuration, plugin configuration and effect files and is loaded
+        with a single read. Files which were modified after building the bundle
+        are loaded individually. Set the path to None to disable the bundle. If
+        the mount manager was already mounted, the bundle is loaded directly. """
+        if pth is None:
+            self._config_bundle = None
+            unload_bundle()
+            return
+        self._config_bundle = Filename.from_os_specific(pth).get_fullpath()
+        if self._mounted:
+            self._load_config_bundle()
+
     @property
     def do_cleanup(self):
         """ Returns whether the mount manager will attempt to cleanup the
@@ -232,6 +297,63 @@ class MountManager():
                     except IOError:
                         pass
 
+    def _mount_cache(self):
+        """ Internal method to mount the shader cache directory. This also
+        evicts old entries if the cache grew too large. """
+        cache_dir = Filename(self._cache_path).to_os_specific()
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except (IOError, OSError) as msg:
+                print("Failed to create shader cache path:", msg)
+                return
+        self._evict_cache(cache_dir)
+        self._unmount_cache()
+        vfs = VirtualFileSystem.get_global_ptr()
+        vfs.mount(Filename.from_os_specific(cache_dir), ShaderCache.MOUNT_POINT, 0)
+        ShaderCache.enabled = True
+        set_snapshot_dir(ShaderCache.MOUNT_POINT)
+
+    def _unmount_cache(self):
+        """ Internal method to unmount the shader cache directory, if it was
+        mounted, and to disable the shader cache """
+        if ShaderCache.enabled:
+            VirtualFileSystem.get_global_ptr().unmount_point(ShaderCache.MOUNT_POINT)
+            ShaderCache.enabled = False
+            set_snapshot_dir(None)
+
+    def _load_config_bundle(self):
+        """ Internal method to load the config bundle, mapping the virtual
+        config and base directories, and the effects directory mounted
+        relative to the working directory, to the directories they are
+        mounted from """
+        config_dir = self._config_dir or join(self._base_path, "config")
+        aliases = {
+            "/$$rpconfig/": Filename(config_dir).to_os_specific(),
+            "/$$rp/": Filename(self._base_path).to_os_specific(),
+            "effects/": Filename(join(self._base_path, "effects")).to_os_specific(),
+        }
+        if not load_bundle(Filename(self._config_bundle).to_os_specific(), aliases):
+            print("Loading configuration files individually")
+
+    def _evict_cache(self, cache_dir):
+        """ Removes the files written first from the shader cache until its
+        total size is below the configured cache size. This only runs when
+        the cache gets mounted, see the cache_size setter. """
+        entries = []
+        for fname in os.listdir(cache_dir):
+            pth = os.path.join(cache_dir, fname)
+            if os.path.isfile(pth) and fname.startswith("$$"):
+                stat = os.stat(pth)
+                entries.append((stat.st_mtime, stat.st_size, pth))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, pth in sorted(entries):
+            if total_size <= self._cache_size:
+                break
+            if self._try_remove(pth):
+                total_size -= size
+
     @property
     def is_mounted(self):
         """ Returns whether the MountManager was already mounted by calling
@@ -258,6 +380,11 @@ class MountManager():
 
         /$$rpshader/ (Link to /$$rp/rpcore/shader)
 
+        /$$rpcache/ (Only if a cache path is specified)
+            + generated effect and stage shaders
+            + parsed yaml snapshots
+            + ...
+
          """
         self._mounted = True
 
@@ -291,6 +418,14 @@ class MountManager():
                     self.fatal("Failed to create temporary path:", msg)
             vfs.mount(convert_path(self._write_path), '/$$rptemp', 0)
 
+        # Without a cache path, parsed YAML snapshots are only kept in memory,
+        # and do not speed up the next launch
+        if self._cache_path is not None:
+            self._mount_cache()
+
+        if self._config_bundle is not None:
+            self._load_config_bundle()
+
         get_model_path().prepend_directory("/$$rp")
         get_model_path().prepend_directory("/$$rp/shader")
         get_model_path().prepend_directory("/$$rptemp")
@@ -24,9 +24,8 @@ THE SOFTWARE.
 
 """
 
-from direct.stdpy.file import open
-
 from rpcore.util.shader_input_blocks import GroupedInputBlock
+from rpcore.util.shader_includes import write_generated_include
 from rpcore.pluginbase.day_setting_types import ColorType
 
 class DayTimeManager():
@@ -78,8 +77,7 @@ class DayTimeManager():
 
         # Generate UBO shader code
         shader_code = self._input_ubo.generate_shader_code()
-        with open("/$$rptemp/$$daytime_config.inc.glsl", "w") as handle:
-            handle.write(shader_code)
+        write_generated_include("/$$rptemp/$$daytime_config.inc.glsl", shader_code)
 
     def update(self):
         """ Internal update method which updates all day time settings """
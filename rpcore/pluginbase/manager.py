@@ -24,7 +24,10 @@ THE SOFTWARE.
 
 """
 
+import json
+import time
 import importlib
+import contextlib
 import collections
 
 from rplibs.yaml.my_yaml import load_yaml_file_my
@@ -48,6 +51,18 @@ class PluginManager():
         # Used by the plugin configurator and to only load the required data
         self.requires_daytime_settings = True
 
+        # Maps each hook name to the bound methods of the plugins implementing
+        # it, see trigger_hook
+        self._hooks = {}
+
+        # Rolling hook durations per (plugin_id, hook_name), or None if hook
+        # timing is disabled
+        self._hook_timings = None
+
+        # Plugins whose shaders have to be reloaded once the current setting
+        # batch ends, or None if no batch is active, see setting_batch
+        self._pending_reloads = None
+
     def load(self, plugins_used):
         # Список используемых плагинов.
         plugins_list = plugins_used.split()
@@ -82,18 +97,67 @@ class PluginManager():
                     for setting_id, control_points in settings.items():
                         self.day_settings[name][setting_id].set_control_points(control_points)
 
+        # Новые плагины могут реализовывать хуки.
+        self._hooks.clear()
 
     def trigger_hook(self, hook_name):
-
-        hook_method = "on_"+hook_name
-
-        for name in self.enabled_plugins:
-        
-            plugin_handle = self.instances[name]
-
-            if hasattr(plugin_handle, hook_method):
-            
-                getattr(plugin_handle, hook_method)()
+        """ Calls the on_<hook_name> method of all enabled plugins which
+        implement it. The plugins implementing a hook are looked up once and
+        stored in a dispatch table, which is rebuilt when plugins get loaded """
+        hooks = self._hooks.get(hook_name)
+        if hooks is None:
+            hooks = self._hooks[hook_name] = self._resolve_hook(hook_name)
+
+        if self._hook_timings is None:
+            for _, method in hooks:
+                method()
+        else:
+            for plugin_id, method in hooks:
+                start = time.perf_counter()
+                method()
+                self._hook_timings[(plugin_id, hook_name)].append(time.perf_counter() - start)
+
+    def _resolve_hook(self, hook_name):
+        """ Returns a list of (plugin_id, bound method) of all enabled plugins
+        implementing the given hook, in plugin order """
+        hook_method = "on_" + hook_name
+        return [(name, getattr(self.instances[name], hook_method))
+                for name in self.enabled_plugins
+                if hasattr(self.instances[name], hook_method)]
+
+    def enable_hook_timing(self, num_samples=240):
+        """ Starts measuring the time each plugin spends in each hook. Only the
+        last num_samples calls per plugin and hook are kept. """
+        self._hook_timings = collections.defaultdict(
+            lambda: collections.deque(maxlen=num_samples))
+
+    def disable_hook_timing(self):
+        """ Stops measuring hook times and discards all collected samples """
+        self._hook_timings = None
+
+    def get_hook_stats(self):
+        """ Returns the collected hook timings as nested dictionary of the form
+        {plugin_id: {hook_name: {"calls", "mean", "p95", "max"}}}, with all
+        durations in milliseconds. Returns an empty dictionary if hook timing
+        is disabled. """
+        stats = {}
+        for (plugin_id, hook_name), samples in (self._hook_timings or {}).items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            stats.setdefault(plugin_id, {})[hook_name] = {
+                "calls": len(ordered),
+                "mean": sum(ordered) / len(ordered) * 1000.0,
+                "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000.0,
+                "max": ordered[-1] * 1000.0,
+            }
+        return stats
+
+    def export_hook_stats(self, filename):
+        """ Writes the hook timings returned by get_hook_stats to the given
+        file as json """
+        with open(filename, "w") as handle:
+            json.dump(self.get_hook_stats(), handle, indent=4, sort_keys=True)
 
     def is_plugin_enabled(self, plugin_id):
         return plugin_id in self.enabled_plugins
@@ -123,6 +187,46 @@ class PluginManager():
                 getattr(*update_method)()
 
         if setting.shader_runtime:
-            self.init_defines()
-            self._pipeline.stage_mgr.write_autoconfig()
+            if self._pending_reloads is not None:
+                self._pending_reloads[plugin_id] = True
+            else:
+                self._reload_plugin_shaders([plugin_id])
+
+    def on_settings_changed(self, changes):
+        """ Applies a list of (plugin_id, setting_id, value) changes at once,
+        see setting_batch """
+        with self.setting_batch():
+            for plugin_id, setting_id, value in changes:
+                self.on_setting_changed(plugin_id, setting_id, value)
+
+    @contextlib.contextmanager
+    def setting_batch(self):
+        """ Context manager to change several settings at once. Changes of
+        shader_runtime settings made within the batch only regenerate the
+        defines and the autoconfig once when the batch ends, and the shaders
+        of each affected plugin get reloaded exactly once. Example usage:
+
+          with plugin_mgr.setting_batch():
+            plugin_mgr.on_setting_changed("ao", "blur_quality", "HIGH")
+            plugin_mgr.on_setting_changed("ao", "sample_radius", 12.0)
+        """
+        if self._pending_reloads is not None:
+            # Nested batch, the outermost batch reloads the shaders
+            yield
+            return
+
+        self._pending_reloads = collections.OrderedDict()
+        try:
+            yield
+        finally:
+            pending, self._pending_reloads = self._pending_reloads, None
+            if pending:
+                self._reload_plugin_shaders(pending.keys())
+
+    def _reload_plugin_shaders(self, plugin_ids):
+        """ Regenerates the defines and the autoconfig and reloads the shaders
+        of the given plugins """
+        self.init_defines()
+        self._pipeline.stage_mgr.write_autoconfig()
+        for plugin_id in plugin_ids:
             self.instances[plugin_id].reload_shaders()
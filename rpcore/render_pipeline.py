@@ -24,9 +24,11 @@ THE SOFTWARE.
 
 """
 
+import collections
+
 from panda3d.core import LVecBase2i, TransformState, RenderState
 from panda3d.core import PandaSystem, MaterialAttrib, WindowProperties
-from panda3d.core import GeomTristrips, Vec4
+from panda3d.core import GeomTristrips, Vec4, WeakNodePath, BitMask32
 
 from rpcore.globals import Globals
 from rpcore.effect import Effect
@@ -39,6 +41,7 @@ from rpcore.pluginbase.day_manager import DayTimeManager
 from panda3d._rplight import TagStateManager
 
 from rpcore.util.task_scheduler import TaskScheduler
+from rpcore.util.shader_includes import ShaderFileWatcher
 
 from rpcore.util.ies_profile_loader import IESProfileLoader
 
@@ -67,8 +70,8 @@ class RenderPipeline():
         that. If the showbase has been initialized before, have a look at
         the alternative initialization of the render pipeline (the first sample)."""
 
-        mount_mgr = MountManager()
-        mount_mgr.mount()
+        self.mount_mgr = MountManager()
+        self.mount_mgr.mount()
 
         self.reference_mode = False
         self.resolution_scale = 1.0
@@ -81,13 +84,20 @@ class RenderPipeline():
         self.culling_max_distance = 500.0
         self.culling_slice_width = 2048
         self.max_lights_per_cell = 64
+
+        # Settings command queue, the amount of commands executed per frame
+        # grows up to the maximum while commands are backlogged
+        self.command_queue_budget = 1024
+        self.command_queue_max_budget = 16384
         
         # Settings shadow
         self.atlas_size = 4096
         self.max_update_distance = 150.0
         self.max_updates = 8
 
-        self._applied_effects = []
+        # All effects applied with set_effect, keyed by (node key, sort). Only
+        # weak references to the nodepaths are stored, see _get_applied_effects
+        self._applied_effects = collections.OrderedDict()
         
         # The folder names of the plugins, in a string format separated by a space.
         self.plugins_used = None
@@ -106,15 +116,106 @@ class RenderPipeline():
         self.light_mgr.reload_shaders()
         #self._set_default_effect()
         self.plugin_mgr.trigger_hook("shader_reload")
-        
-        """ Re-applies all custom shaders the user applied, to avoid them getting
-        removed when the shaders are reloaded """
-        
-        print("Re-applying", len(self._applied_effects), "custom shaders")
-        
-        for args in self._applied_effects:
-            self._internal_set_effect(*args)
 
+        # Effects are cached by their effect file, so effects whose templates
+        # or includes changed have to be dropped explicitly
+        Effect.invalidate_modified()
+        self._reapply_effects()
+
+    def reload_changed(self, paths):
+        """ Reloads only the shaders using one of the given files, directly or
+        through includes, instead of all shaders like reload_shaders does.
+        Paths should be full virtual file system paths like
+        /$$rp/shader/includes/brdf.inc.glsl, or be relative to the model path.
+        Returns the amount of reloaded stages, light manager shaders and
+        effects. """
+        graph = self.stage_mgr.shader_graph
+        reloaded = len(self.stage_mgr.reload_changed(paths))
+
+        if self.light_mgr in graph.get_affected(paths):
+            self.light_mgr.reload_shaders()
+            reloaded += 1
+
+        # Cached effects are not necessarily registered in the graph, so they
+        # are looked up through the files they were generated from instead
+        effect_srcs = set()
+        for effect in Effect.invalidate_dependents(paths):
+            effect_srcs.add(effect.filename)
+
+        if effect_srcs:
+            reloaded += self._reapply_effects(effect_srcs)
+        return reloaded
+
+    def index_shader_sources(self):
+        """ Indexes all shader files of the pipeline and of the enabled plugins,
+        so the shader graph also knows about files which are not used by any
+        loaded shader yet. Returns the amount of indexed files. """
+        directories = ["/$$rp/shader", "/$$rptemp"]
+        directories += ["/$$rp/rpplugins/{}/shader".format(plugin_id)
+                        for plugin_id in self.plugin_mgr.enabled_plugins]
+        return self.stage_mgr.shader_graph.index_directories(directories)
+
+    def enable_shader_watcher(self, interval=1.0):
+        """ Polls all shader files in use every interval seconds, and reloads
+        the shaders using modified files with reload_changed. This is useful
+        for fast iterations when developing shaders. """
+        self.disable_shader_watcher()
+        watcher = ShaderFileWatcher(self.stage_mgr.shader_graph)
+        watcher.poll()
+
+        def poll_files(task):
+            changed = watcher.poll()
+            if changed:
+                print("Reloading shaders using", ", ".join(changed))
+                self.reload_changed(changed)
+            return task.again
+
+        self.base.taskMgr.doMethodLater(interval, poll_files, "RP_ShaderWatcher")
+
+    def disable_shader_watcher(self):
+        """ Stops polling the shader files, see enable_shader_watcher """
+        self.base.taskMgr.remove("RP_ShaderWatcher")
+
+    def _reapply_effects(self, effect_srcs=None):
+        """ Re-applies all custom shaders the user applied, to avoid them getting
+        removed when the shaders are reloaded. Effects are cached by the content
+        of their source, so only effects whose sources changed get compiled
+        again, and each distinct effect is only resolved once. If a set of
+        effect sources is passed, only effects loaded from these get applied.
+        Returns the amount of distinct effects. """
+
+        applied_effects = self._get_applied_effects()
+        if effect_srcs is not None:
+            applied_effects = [entry for entry in applied_effects if entry[1] in effect_srcs]
+        print("Re-applying", len(applied_effects), "custom shaders")
+
+        effects = {}
+        for nodepath, effect_src, options, sort in applied_effects:
+            effect_key = (effect_src, tuple(sorted((options or {}).items())), sort)
+            if effect_key not in effects:
+                effect = Effect.load(effect_src, options)
+                if effect is not None:
+                    effects[effect_key] = (effect, self._build_effect_states(effect, sort))
+                else:
+                    effects[effect_key] = None
+            if effects[effect_key] is None:
+                print("Could not apply effect", effect_src)
+                continue
+            effect, effect_states = effects[effect_key]
+            self._apply_effect(nodepath, effect, sort, effect_states)
+        return len(effects)
+
+    def _get_applied_effects(self):
+        """ Returns a list of (nodepath, effect_src, options, sort) tuples of
+        all effects applied with set_effect. Entries whose nodepath was deleted
+        in the meantime are removed from the registry. """
+        result = []
+        for key, (weak_np, effect_src, options, sort) in list(self._applied_effects.items()):
+            if weak_np.was_deleted():
+                del self._applied_effects[key]
+                continue
+            result.append((weak_np.get_node_path(), effect_src, options, sort))
+        return result
 
     def create(self, base):
         """ This creates the pipeline, and setups all buffers. It also
@@ -148,7 +249,8 @@ class RenderPipeline():
         self.tag_mgr = TagStateManager(Globals.base.cam)
         
         self.stage_mgr = StageManager(self)
-        
+        Effect.SHADER_GRAPH = self.stage_mgr.shader_graph
+
         self.light_mgr = LightManager(self)
 
         self.daytime_mgr = DayTimeManager(self)
@@ -227,6 +329,17 @@ class RenderPipeline():
         remove_light documentation for further information. """
         self.light_mgr.remove_light(light)
 
+    def add_lights(self, lights):
+        """ Adds several lights at once, which is much faster than calling
+        add_light for each light, see LightManager.add_lights. Returns the
+        amount of added lights. """
+        return self.light_mgr.add_lights(lights)
+
+    def remove_lights(self, lights):
+        """ Removes several previously attached lights at once, see
+        LightManager.remove_lights. Returns the amount of removed lights. """
+        return self.light_mgr.remove_lights(lights)
+
     def load_ies_profile(self, filename):
         """ Loads an IES profile from a given filename and returns a handle which
         can be used to set an ies profile on a light """
@@ -242,29 +355,91 @@ class RenderPipeline():
         effect = Effect.load(effect_src, options)
         if effect is None:
             return self.error("Could not apply effect")
-
+        self._apply_effect(nodepath, effect, sort)
+
+    def _build_effect_states(self, effect, sort):
+        """ Resolves the per-pass states of an effect, so they can be applied
+        to an arbitrary amount of nodepaths. Returns the combined camera mask
+        of all passes the nodepaths should be hidden from, the combined mask
+        of all passes they should be shown to, and a list of (pass, shader,
+        sort) tuples. """
+        hide_mask = BitMask32()
+        show_mask = BitMask32()
+        states = []
         for i, stage in enumerate(("gbuffer", "shadow", "voxelize", "envmap", "forward")):
-            if not effect.get_option("render_" + stage):
-                nodepath.hide(self.tag_mgr.get_mask(stage))
+            # Passes which are disabled, or not consumed by any enabled plugin,
+            # are never requested, so their shaders never get generated
+            if not effect.is_pass_enabled(stage, self.plugin_mgr):
+                hide_mask |= self.tag_mgr.get_mask(stage)
             else:
-                shader = effect.get_shader_obj(stage)
-                if stage == "gbuffer":
-                    nodepath.set_shader(shader, 25)
-                else:
-                    self.tag_mgr.apply_state(
-                        stage, nodepath, shader, str(effect.effect_id), 25 + 10 * i + sort)
-                nodepath.show_through(self.tag_mgr.get_mask(stage))
+                states.append((stage, effect.get_shader_obj(stage), 25 + 10 * i + sort))
+                show_mask |= self.tag_mgr.get_mask(stage)
+
+        # Remember which files the effect was generated from, see reload_changed
+        if not self.stage_mgr.shader_graph.is_registered(effect):
+            self.stage_mgr.shader_graph.register(effect, effect.source_files)
 
         if effect.get_option("render_gbuffer") and effect.get_option("render_forward"):
             self.error("You cannot render an object forward and deferred at the "
                        "same time! Either use render_gbuffer or use render_forward, "
                        "but not both.")
+        return hide_mask, show_mask, states
+
+    def _apply_effect(self, nodepath, effect, sort, effect_states=None):
+        """ Applies an already loaded effect to the given nodepath, see
+        _internal_set_effect. Precomputed states from _build_effect_states
+        can be passed to avoid resolving them for each nodepath. """
+        hide_mask, show_mask, states = effect_states or self._build_effect_states(effect, sort)
+        effect_name = str(effect.effect_id)
+        for stage, shader, state_sort in states:
+            if stage == "gbuffer":
+                nodepath.set_shader(shader, 25)
+            else:
+                self.tag_mgr.apply_state(stage, nodepath, shader, effect_name, state_sort)
+        if not hide_mask.is_zero():
+            nodepath.hide(hide_mask)
+        if not show_mask.is_zero():
+            nodepath.show_through(show_mask)
 
     def set_effect(self, nodepath, effect_src, options = None, sort=30):
-        """ See _internal_set_effect. """
-        args = (nodepath, effect_src, options, sort)
-        self._applied_effects.append(args)
-        self._internal_set_effect(*args)
+        """ See _internal_set_effect. The effect is remembered, so it can be
+        applied again when the shaders are reloaded. Setting an effect on the
+        same nodepath with the same sort replaces the previous entry. """
+        key = (nodepath.get_key(), sort)
+        self._applied_effects.pop(key, None)
+        self._applied_effects[key] = (WeakNodePath(nodepath), effect_src, options, sort)
+        self._internal_set_effect(nodepath, effect_src, options, sort)
+
+    def set_effect_many(self, nodepaths, effect_src, options=None, sort=30):
+        """ Sets the same effect on all given nodepaths, see set_effect. This
+        is much faster than calling set_effect for each nodepath, since the
+        effect and its per-pass states are only resolved once, and then
+        applied to all nodepaths in a single sweep. Returns the amount of
+        nodepaths the effect was applied to. """
+        effect = Effect.load(effect_src, options)
+        if effect is None:
+            self.error("Could not apply effect")
+            return 0
+
+        effect_states = self._build_effect_states(effect, sort)
+        applied_effects = self._applied_effects
+        count = 0
+        for nodepath in nodepaths:
+            key = (nodepath.get_key(), sort)
+            applied_effects.pop(key, None)
+            applied_effects[key] = (WeakNodePath(nodepath), effect_src, options, sort)
+            self._apply_effect(nodepath, effect, sort, effect_states)
+            count += 1
+        return count
+
+    def set_effect_by_pattern(self, root, pattern, effect_src, options=None, sort=30):
+        """ Sets an effect on all nodepaths below root matching the given
+        pattern, see set_effect_many. The pattern uses the syntax of
+        NodePath.find_all_matches, e.g. "**/=my_tag" to select all nodes with
+        a given tag, or "**/wall*" to select nodes by name. Returns the amount
+        of nodepaths the effect was applied to. """
+        return self.set_effect_many(
+            root.find_all_matches(pattern), effect_src, options, sort)
 
     def add_environment_probe(self):
         """ Constructs a new environment probe and returns the handle, so that
@@ -46,6 +46,11 @@ class RenderStage():
     produced_pipes = {}
     produced_defines = {}
 
+    # Pipes produced by this stage which are read by other stages, by the id
+    # of the reading stage. The stage manager adds them to the required pipes
+    # of the reading stage, so stages do not have to modify other stages
+    required_by = {}
+
     disabled = False
 
     def __init__(self, pipeline):
@@ -55,6 +60,9 @@ class RenderStage():
         self._active = True
         self._targets = {}
 
+        # Files of each shader loaded during the last reload_shaders call
+        self._shader_sources = []
+
     def create(self):
         """ This method should setup the stage and create the pipes """
         raise NotImplementedError()
@@ -96,16 +104,26 @@ class RenderStage():
             for target in self._targets.values():
                 target.active = self._active
 
-    def create_target(self, name):
-        """ Creates a new render target and binds it to this stage """
+    def create_target(self, name, transient=False):
+        """ Creates a new render target and binds it to this stage. The color
+        texture of transient targets may be shared with transient targets of
+        other stages. Only targets whose color texture is not read after the
+        last stage consuming it during the same frame may be transient. """
         # Format the name like Plugin:Stage:Name, so it can be easily
         # found in pstats below the plugin cagetory
         name = self._get_plugin_id() + ":" + self.stage_id + ":" + name
         if name in self._targets:
             return self.error("Overriding existing target: " + name)
         self._targets[name] = RenderTarget(name)
+        self._targets[name].transient = transient
         return self._targets[name]
 
+    @property
+    def transient_textures(self):
+        """ Returns the color textures of all transient targets of the stage """
+        return [target.color_tex for target in self._targets.values()
+                if target.transient and "color" in target.targets]
+
     def remove_target(self, target):
         """ Removes a previously registered target. This unregisters the
         target, as well as removing it from the list of assigned targets. """
@@ -126,7 +144,7 @@ class RenderStage():
         path_args = []
 
         for source in args:
-            for prefix in ("/$$rpconfig", "/$$rp/shader", "/$$rptemp"):
+            for prefix in ("/$$rpconfig", "/$$rp/shader", "/$$rptemp", "/$$rpcache"):
                 if prefix in source:
                     path_args.append(source)
                     break
@@ -137,6 +155,7 @@ class RenderStage():
         # and use the default vertex shader
         if len(args) == 1:
             path_args = ["/$$rp/shader/default_post_process.vert.glsl"] + path_args
+        self._shader_sources.append(tuple(path_args))
         return RPLoader.load_shader(*path_args)
 
     def _get_plugin_id(self):
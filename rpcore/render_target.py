@@ -33,6 +33,7 @@ from panda3d.core import LVecBase2i
 
 from rpcore.globals import Globals
 from rpcore.util.post_process_region import PostProcessRegion
+from rpcore.util.transient_texture_pool import estimate_texture_bytes
 
 __all__ = "RenderTarget",
 __version__ = "2.0"
@@ -58,6 +59,10 @@ class RenderTarget():
     REGISTERED_TARGETS = []
     CURRENT_SORT = -300
 
+    # Pool the color textures of transient targets are taken from, set by the
+    # StageManager while creating the stages
+    TRANSIENT_POOL = None
+
     def __init__(self, name="target"):
         self.name = name
         self._targets = {}
@@ -77,6 +82,8 @@ class RenderTarget():
         self.engine = Globals.base.graphicsEngine
         self.support_transparency = False
         self.create_default_region = True
+        self.transient = False
+        self._texture_pool = None
 
         # Disable all global clears, since they are not required
         for region in Globals.base.win.get_display_regions():
@@ -238,8 +245,12 @@ class RenderTarget():
         self._internal_buffer.clear_render_textures()
         self.engine.remove_window(self._internal_buffer)
         self._active = False
-        for target in self._targets.values():
-            target.release_all()
+        for name, target in self._targets.items():
+            # Pooled textures may still be used by other transient targets
+            if name == "color" and self._texture_pool is not None:
+                self._texture_pool.detach(target)
+            else:
+                target.release_all()
         RenderTarget.REGISTERED_TARGETS.remove(self)
 
     def set_clear_color(self, *args):
@@ -255,6 +266,12 @@ class RenderTarget():
     def _create_buffer(self):
         """ Internal method to create the buffer object """
         self._compute_size_from_constraint()
+        if self.transient and RenderTarget.TRANSIENT_POOL is not None and "color" in self._targets:
+            self._texture_pool = RenderTarget.TRANSIENT_POOL
+            self._targets["color"] = RenderTarget.TRANSIENT_POOL.acquire(
+                (tuple(self._size_constraint), self._color_bits, RenderTarget.USE_R11G11B10),
+                self.name + "_color",
+                estimate_texture_bytes(self._size.x, self._size.y, self._color_bits))
         if not self._create():
             print("Failed to create buffer!")
             return False
@@ -349,6 +366,24 @@ class RenderTarget():
             print("Failed to create buffer")
             return
 
+        self._bind_render_textures()
+
+        if not self.sort:
+            RenderTarget.CURRENT_SORT += 20
+            self.sort = RenderTarget.CURRENT_SORT
+
+        RenderTarget.NUM_ALLOCATED_BUFFERS += 1
+        self._internal_buffer.set_sort(self.sort)
+        self._internal_buffer.disable_clears()
+        self._internal_buffer.get_display_region(0).disable_clears()
+        self._internal_buffer.get_overlay_display_region().disable_clears()
+        self._internal_buffer.get_overlay_display_region().set_active(False)
+
+        RenderTarget.REGISTERED_TARGETS.append(self)
+        return True
+
+    def _bind_render_textures(self):
+        """ Internal method to bind all attachments to the internal buffer """
         if self._depth_bits:
             self._internal_buffer.add_render_texture(
                 self.depth_tex, GraphicsOutput.RTM_bind_or_copy,
@@ -370,19 +405,15 @@ class RenderTarget():
             self._internal_buffer.add_render_texture(
                 self.aux_tex[i], GraphicsOutput.RTM_bind_or_copy, target_mode)
 
-        if not self.sort:
-            RenderTarget.CURRENT_SORT += 20
-            self.sort = RenderTarget.CURRENT_SORT
-
-        RenderTarget.NUM_ALLOCATED_BUFFERS += 1
-        self._internal_buffer.set_sort(self.sort)
-        self._internal_buffer.disable_clears()
-        self._internal_buffer.get_display_region(0).disable_clears()
-        self._internal_buffer.get_overlay_display_region().disable_clears()
-        self._internal_buffer.get_overlay_display_region().set_active(False)
-
-        RenderTarget.REGISTERED_TARGETS.append(self)
-        return True
+    def swap_color_attachment(self, texture):
+        """ Replaces the color attachment with the given texture and returns the
+        previous color attachment. Swapping the attachment every frame allows
+        to keep the result of the last frame without copying it. """
+        previous = self._targets["color"]
+        self._targets["color"] = texture
+        self._internal_buffer.clear_render_textures()
+        self._bind_render_textures()
+        return previous
 
     def consider_resize(self):
         """ Checks if the target has to get resized, and if this is the case,
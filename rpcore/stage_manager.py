@@ -24,11 +24,23 @@ THE SOFTWARE.
 
 """
 
+import json
+import time
+import collections
+
+from panda3d.core import PStatCollector, Texture
+
 from rplibs.yaml import load_yaml_file
 
 from direct.stdpy.file import open
 
 from rpcore.image import Image
+from rpcore.globals import Globals
+from rpcore.render_target import RenderTarget
+from rpcore.util.stage_graph import find_dead_stages, get_pipe_lifetimes, estimate_pipe_vram
+from rpcore.util.stage_graph import get_required_by
+from rpcore.util.transient_texture_pool import TransientTexturePool
+from rpcore.util.shader_includes import write_generated_include, ShaderDependencyGraph
 from rpcore.util.shader_input_blocks import SimpleInputBlock, GroupedInputBlock
 from rpcore.stages.update_previous_pipes_stage import UpdatePreviousPipesStage
 
@@ -50,6 +62,37 @@ class StageManager():
         self.pipeline = pipeline
         self.created = False
 
+        # Maps shader files to the stages and effects using them, see
+        # reload_shaders and reload_changed
+        self.shader_graph = ShaderDependencyGraph()
+
+        # Amount of shaders loaded during the last reload_shaders call
+        self.compiled_programs = 0
+
+        # Whether to remove stages whose results never reach the final stage
+        # before creating them, see _prune_dead_stages
+        self.prune_stages = False
+        self.pruned_stages = []
+
+        # Whether transient render targets of different stages may share their
+        # color textures, see _release_transient_textures
+        self.alias_transient_targets = True
+        self.transient_pool = None
+
+        # Per stage update timings, or None if stage timing is disabled, see
+        # enable_stage_timing
+        self._stage_timings = None
+        self._stage_timing_samples = 240
+
+        # Whether previous frame pipes are kept by alternating the producing
+        # target between two textures instead of copying them each frame
+        self.ping_pong_history = False
+        self._history_swaps = []
+
+        # (stage, pipe name, value) of all pipes bound to the stages, so the
+        # stages reading a swapped texture can be found, see _create_history_swap
+        self._pipe_bindings = []
+
         self._load_stage_order()
 
     def _load_stage_order(self):
@@ -95,6 +138,40 @@ class StageManager():
 
         self.stages.sort(key=lambda stage: self._stage_order.index(stage.stage_id))
 
+    def _prune_dead_stages(self):
+        """ Removes all stages whose produced pipes and inputs are never
+        consumed, directly or indirectly, by the final stage. The pruned
+        stages are also detached from their plugins, so they do not get
+        their shaders reloaded. Prints the estimated video memory saved. """
+        self.pruned_stages = find_dead_stages(self.stages)
+        if not self.pruned_stages:
+            return
+
+        resolution = Globals.resolution
+        saved_vram = 0
+        for stage in self.pruned_stages:
+            self.stages.remove(stage)
+            stage.disabled = True
+            if resolution is not None:
+                saved_vram += estimate_pipe_vram(stage, resolution.x, resolution.y)
+            for plugin in self.pipeline.plugin_mgr.instances.values():
+                if stage in plugin._assigned_stages:  # pylint: disable=protected-access
+                    plugin._assigned_stages.remove(stage)  # pylint: disable=protected-access
+
+        print("Pruned", len(self.pruned_stages), "unused stages (~{:.1f} MB):".format(
+            saved_vram / (1024.0 * 1024.0)), ", ".join(
+                stage.stage_id for stage in self.pruned_stages))
+
+    def _add_required_by_pipes(self):
+        """ Adds the pipes stages declared to be read by other stages with
+        required_by to the required pipes of these stages. This is done after
+        pruning, so pipes of pruned stages are not required. """
+        required_by = get_required_by(self.stages)
+        for stage in self.stages:
+            for pipe in required_by.get(stage.stage_id, ()):
+                if pipe not in stage.required_pipes:
+                    stage.required_pipes.append(pipe)
+
     def _bind_pipes_to_stage(self, stage):
         """ Sets all required pipes on a stage """
         for pipe in stage.required_pipes:
@@ -136,6 +213,7 @@ class StageManager():
                 return False
 
             pipe_value = self.pipes[pipe]
+            self._pipe_bindings.append((stage, pipe, pipe_value))
             if isinstance(pipe_value, list) or isinstance(pipe_value, tuple):
                 stage.set_shader_input(pipe, *pipe_value)
             else:
@@ -188,19 +266,92 @@ class StageManager():
         with the prefix 'Previous::' has to be stored and copied each frame. """
         if self.previous_pipes:
             self._prev_stage = UpdatePreviousPipesStage(self.pipeline)
-            for prev_pipe, prev_tex in self.previous_pipes.items():
+            for prev_pipe, prev_tex in list(self.previous_pipes.items()):
 
                 if prev_pipe not in self.pipes:
                     print("Attempted to use previous frame data from pipe",
                                prev_pipe, "- however, that pipe was never created!")
                     return False
 
+                if self.ping_pong_history and self._create_history_swap(prev_pipe):
+                    del self.previous_pipes[prev_pipe]
+                    continue
+
                 # Tell the stage to transfer the data from the current pipe to
                 # the current texture
                 self._prev_stage.add_transfer(self.pipes[prev_pipe], prev_tex)
-            self._prev_stage.create()
-            self._prev_stage.set_dimensions()
-            self.stages.append(self._prev_stage)
+
+            if self.previous_pipes:
+                self._prev_stage.create()
+                self._prev_stage.set_dimensions()
+                self.stages.append(self._prev_stage)
+
+    def _create_history_swap(self, pipe_name):
+        """ Makes the render target producing the given pipe alternate between
+        its color texture and a history texture each frame, so the previous
+        frame's pipe is available without copying it. Returns False if the pipe
+        is not the color attachment of a render target, in which case it has
+        to be copied by the UpdatePreviousPipesStage. """
+        texture = self.pipes[pipe_name]
+        target = None
+        for stage in self.stages:
+            for stage_target in stage._targets.values():  # pylint: disable=protected-access
+                if "color" in stage_target.targets and stage_target.color_tex is texture:
+                    target = stage_target
+        if target is None:
+            return False
+
+        # Both textures are read before they were rendered to the first time
+        history = Texture("Prev-" + pipe_name)
+        history.setup_2d_texture(texture.get_x_size(), texture.get_y_size(),
+                                 texture.get_component_type(), texture.get_format())
+        history.set_default_sampler(texture.get_default_sampler())
+        history.clear_image()
+        texture.clear_image()
+
+        # Collect all stages the texture was bound to when they were created.
+        # It might be exposed under more than one pipe name, and a pipe name
+        # might refer to another texture by now, if a later stage produced a
+        # pipe with the same name.
+        names = [name for name, value in self.pipes.items() if value is texture]
+        current_bindings = [(stage, name) for stage, name, value in self._pipe_bindings
+                            if value is texture]
+
+        # Stages reading the previous frame, and stages reading the pipe
+        # before it is rendered in the current frame, read the history
+        previous_bindings = [(stage, "Previous_" + pipe_name) for stage in self.stages
+                             if "PreviousFrame::" + pipe_name in stage.required_pipes]
+        future_bindings = [(name, stage) for name, stage in self.future_bindings
+                           if name in names]
+        previous_bindings += [(stage, name) for name, stage in future_bindings]
+        self.future_bindings = [binding for binding in self.future_bindings
+                                if binding not in future_bindings]
+
+        for stage, name in previous_bindings:
+            stage.set_shader_input(name, history)
+
+        self._history_swaps.append({
+            "target": target,
+            "history": history,
+            "names": names,
+            "current_bindings": current_bindings,
+            "previous_bindings": previous_bindings,
+        })
+        return True
+
+    def _swap_history(self):
+        """ Swaps the color texture of all targets producing a previous frame
+        pipe with their history texture, and updates all bindings """
+        for swap in self._history_swaps:
+            previous = swap["target"].swap_color_attachment(swap["history"])
+            current = swap["target"].color_tex
+            swap["history"] = previous
+            for name in swap["names"]:
+                self.pipes[name] = current
+            for stage, name in swap["current_bindings"]:
+                stage.set_shader_input(name, current)
+            for stage, name in swap["previous_bindings"]:
+                stage.set_shader_input(name, previous)
 
     def _apply_future_bindings(self):
         """ Applies all future bindings. At this point all pipes and
@@ -218,11 +369,24 @@ class StageManager():
         # Convert input blocks so we can access them in a better way
         self.input_blocks = {block.name: block for block in self.input_blocks}
         self._prepare_stages()
+        if self.prune_stages:
+            self._prune_dead_stages()
+        self._add_required_by_pipes()
 
-        for stage in self.stages:
+        if self.alias_transient_targets:
+            self.transient_pool = TransientTexturePool()
+            RenderTarget.TRANSIENT_POOL = self.transient_pool
+        lifetimes = get_pipe_lifetimes(self.stages)
+        transient_textures = []
+
+        for index, stage in enumerate(self.stages):
             stage.create()
             stage.handle_window_resize()
 
+            if self.transient_pool:
+                transient_textures += self._get_transient_lifetimes(index, stage, lifetimes)
+                transient_textures = self._release_transient_textures(index, transient_textures)
+
             # Rely on the methods to print an appropriate error message
             if not self._bind_pipes_to_stage(stage):
                 continue
@@ -230,22 +394,167 @@ class StageManager():
                 continue
 
             self._register_stage_result(stage)
+
+        RenderTarget.TRANSIENT_POOL = None
+        if self.transient_pool and self.transient_pool.requested_bytes:
+            print("Transient targets use {:.1f} MB instead of {:.1f} MB".format(
+                self.transient_pool.allocated_bytes / (1024.0 * 1024.0),
+                self.transient_pool.requested_bytes / (1024.0 * 1024.0)))
+
         self._create_previous_pipes()
         self._apply_future_bindings()
 
+    def _get_transient_lifetimes(self, index, stage, lifetimes):
+        """ Returns a list of (last stage index, texture) for all transient
+        textures of the given stage. Textures only used within the stage end
+        with the stage itself, textures exposed as pipe end with the last stage
+        reading that pipe. The last index is None for textures which have to be
+        kept alive, like pipes read in the next frame or produced inputs. """
+        result = []
+        for texture in stage.transient_textures:
+            last_index = index
+            for pipe_name, pipe_data in stage.produced_pipes.items():
+                if pipe_data is texture or (isinstance(pipe_data, (list, tuple)) and
+                                            any(i is texture for i in pipe_data)):
+                    last_index = lifetimes.get((index, pipe_name))
+                    break
+            if any(i is texture for i in stage.produced_inputs.values()):
+                last_index = None
+            result.append((last_index, texture))
+        return result
+
+    def _release_transient_textures(self, index, transient_textures):
+        """ Returns all transient textures which are no longer read after the
+        stage with the given index to the pool, so stages created afterwards,
+        which are also rendered afterwards, can reuse them. Returns the list of
+        textures which are still in use. """
+        in_use = []
+        for last_index, texture in transient_textures:
+            if last_index is not None and last_index <= index:
+                self.transient_pool.release(texture)
+            else:
+                in_use.append((last_index, texture))
+        return in_use
+
     def reload_shaders(self):
         """ This pass sets the shaders to all passes and also generates the
-        shader configuration """
+        shader configuration. Stages are only reloaded if one of the files
+        their shaders are made of changed since they were last loaded, this
+        includes the generated includes like the autoconfig. """
         self.write_autoconfig()
+        self.shader_graph.refresh()
+        self.compiled_programs = 0
         for stage in self.stages:
-            stage.reload_shaders()
+            if not self.shader_graph.is_modified(stage):
+                continue
+            self._reload_stage(stage)
+
+    def reload_changed(self, paths):
+        """ Reloads the shaders of all stages using one of the given files,
+        directly or through includes. The files are read again, and the
+        amount of loaded shaders is stored in compiled_programs. Returns the
+        reloaded stages. """
+        self.shader_graph.refresh(self.shader_graph.resolve(path) for path in paths)
+        self.compiled_programs = 0
+        stages = [stage for stage in self.shader_graph.get_affected(paths)
+                  if stage in self.stages]
+        for stage in stages:
+            self._reload_stage(stage)
+        return stages
+
+    def _reload_stage(self, stage):
+        """ Reloads the shaders of a stage, and registers the files they were
+        loaded from in the shader graph """
+        stage._shader_sources = []  # pylint: disable=protected-access
+        stage.reload_shaders()
+        loaded = stage._shader_sources  # pylint: disable=protected-access
+        self.compiled_programs += len(loaded)
+
+        # Stages which did not load their shaders with load_shader or
+        # load_plugin_shader can not be tracked, and always get reloaded
+        roots = [source for sources in loaded for source in sources]
+        if roots:
+            self.shader_graph.register(stage, roots)
+        else:
+            self.shader_graph.unregister(stage)
+
+    def get_include_dependents(self, filename):
+        """ Returns all stages whose shaders include the given file, directly
+        or indirectly """
+        return [stage for stage in self.shader_graph.get_dependents(filename)
+                if stage in self.stages]
 
     def update(self):
         """ Calls the update method for each registered stage. Inactive stages
         are skipped. """
+        if self._history_swaps:
+            self._swap_history()
+
+        if self._stage_timings is not None:
+            self._update_timed()
+            return
+
+        for stage in self.stages:
+            if stage.active:
+                stage.update()
+
+    def _update_timed(self):
+        """ Same as update, but measures the time each stage takes to update,
+        and counts in how many frames the stage was active """
         for stage in self.stages:
+            timing = self._stage_timings.get(stage)
+            if timing is None:
+                plugin_id = stage._get_plugin_id()  # pylint: disable=protected-access
+                timing = self._stage_timings[stage] = {
+                    "name": plugin_id + ":" + stage.stage_id,
+                    "samples": collections.deque(maxlen=self._stage_timing_samples),
+                    "frames": 0,
+                    "active_frames": 0,
+                }
+                timing["collector"] = PStatCollector(timing["name"] + ":Update")
+
+            timing["frames"] += 1
             if stage.active:
+                timing["active_frames"] += 1
+                timing["collector"].start()
+                start = time.perf_counter()
                 stage.update()
+                timing["samples"].append(time.perf_counter() - start)
+                timing["collector"].stop()
+
+    def enable_stage_timing(self, num_samples=240):
+        """ Starts measuring the time each stage spends in its update method.
+        Only the last num_samples updates per stage are kept. The timings are
+        also sent to PStats, as Plugin:Stage:Update collector. """
+        self._stage_timing_samples = num_samples
+        self._stage_timings = {}
+
+    def disable_stage_timing(self):
+        """ Stops measuring stage times and discards all collected samples """
+        self._stage_timings = None
+
+    def get_stage_stats(self):
+        """ Returns the collected stage timings as dictionary of the form
+        {"Plugin:Stage": {"frames", "active_frames", "mean", "p95", "max"}},
+        with all durations in milliseconds. Returns an empty dictionary if
+        stage timing is disabled. """
+        stats = {}
+        for timing in (self._stage_timings or {}).values():
+            ordered = sorted(timing["samples"])
+            entry = {"frames": timing["frames"], "active_frames": timing["active_frames"],
+                     "mean": 0.0, "p95": 0.0, "max": 0.0}
+            if ordered:
+                entry["mean"] = sum(ordered) / len(ordered) * 1000.0
+                entry["p95"] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000.0
+                entry["max"] = ordered[-1] * 1000.0
+            stats[timing["name"]] = entry
+        return stats
+
+    def export_stage_stats(self, filename):
+        """ Writes the stage timings returned by get_stage_stats to the given
+        file as json """
+        with open(filename, "w") as handle:
+            json.dump(self.get_stage_stats(), handle, indent=4, sort_keys=True)
 
     def handle_window_resize(self):
         """ Method to get called when the window got resized. Propagates the
@@ -255,7 +564,8 @@ class StageManager():
 
     def write_autoconfig(self):
         """ Writes the shader auto config, based on the defines specified by the
-        different stages """
+        different stages. The file is only rewritten if its content changed,
+        returns whether it was written. """
 
         # Generate autoconfig as string
         output = "#pragma once\n\n"
@@ -268,7 +578,8 @@ class StageManager():
             output += "#define " + key + " " + str(value) + "\n"
 
         try:
-            with open("/$$rptemp/$$pipeline_shader_config.inc.glsl", "w") as handle:
-                handle.write(output)
+            return write_generated_include(
+                "/$$rptemp/$$pipeline_shader_config.inc.glsl", output)
         except IOError as msg:
             print("Error writing shader autoconfig:", msg)
+            return False
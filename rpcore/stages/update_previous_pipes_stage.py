@@ -28,6 +28,7 @@ from direct.stdpy.file import open
 
 from rpcore.render_stage import RenderStage
 from rpcore.globals import Globals
+from rpcore.util.shader_cache import ShaderCache
 
 
 class UpdatePreviousPipesStage(RenderStage):
@@ -95,10 +96,17 @@ class UpdatePreviousPipesStage(RenderStage):
             fragment += "  " + line + "\n"
         fragment += "}\n"
 
-        # Write the shader
-        shader_dest = "/$$rptemp/$$update_previous_pipes.frag.glsl"
-        with open(shader_dest, "w") as handle:
-            handle.write(fragment)
+        # Write the shader, or reuse it from the shader cache
+        if ShaderCache.enabled:
+            cache_key = ShaderCache.make_key(fragment)
+            shader_dest = ShaderCache.lookup("update_previous_pipes", cache_key, ".frag.glsl")
+            if shader_dest is None:
+                shader_dest = ShaderCache.store(
+                    "update_previous_pipes", cache_key, fragment, ".frag.glsl")
+        else:
+            shader_dest = "/$$rptemp/$$update_previous_pipes.frag.glsl"
+            with open(shader_dest, "w") as handle:
+                handle.write(fragment)
 
         # Load it back again
         self._target.shader = self.load_shader(shader_dest)
@@ -0,0 +1,91 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+from panda3d._rplight import RPPointLight, RPSpotLight
+
+__all__ = ["create_point_lights", "create_spot_lights"]
+
+
+def _to_rows(values, count, name):
+    """ Converts an array like object with one entry per light, like a NumPy
+    array, to a list. Single values are used for all lights. Returns None if
+    no values were passed. """
+    if values is None:
+        return None
+    if hasattr(values, "tolist"):
+        # Converting NumPy arrays at once is much faster than iterating them
+        values = values.tolist()
+    if not isinstance(values, (list, tuple)):
+        return [values] * count
+    if len(values) != count:
+        raise ValueError("Expected {} {}, got {}".format(count, name, len(values)))
+    return values
+
+
+def _setup_lights(lights, positions, colors, radii, energies):
+    """ Sets the properties shared by all light types """
+    count = len(lights)
+    colors = _to_rows(colors, count, "colors")
+    radii = _to_rows(radii, count, "radii")
+    energies = _to_rows(energies, count, "energies")
+    for index, light in enumerate(lights):
+        light.set_pos(*positions[index])
+        if colors is not None:
+            light.set_color(*colors[index])
+        if radii is not None:
+            light.set_radius(radii[index])
+        if energies is not None:
+            light.set_energy(energies[index])
+
+
+def create_point_lights(positions, colors=None, radii=None, energies=None):
+    """ Creates a point light for each of the given positions. Positions
+    and colors are arrays of shape (n, 3), radii and energies arrays of shape
+    (n,) or single values for all lights. NumPy arrays and nested sequences
+    are both accepted. Properties which are not passed keep their defaults.
+    The lights still have to be added to the pipeline, preferably with
+    RenderPipeline.add_lights. """
+    positions = _to_rows(positions, len(positions), "positions")
+    lights = [RPPointLight() for _ in range(len(positions))]
+    _setup_lights(lights, positions, colors, radii, energies)
+    return lights
+
+
+def create_spot_lights(positions, directions, fovs=None, colors=None, radii=None,
+                       energies=None):
+    """ Creates a spot light for each of the given positions, see
+    create_point_lights. Directions are an array of shape (n, 3), fovs an
+    array of shape (n,) or a single value for all lights. """
+    positions = _to_rows(positions, len(positions), "positions")
+    directions = _to_rows(directions, len(positions), "directions")
+    lights = [RPSpotLight() for _ in range(len(positions))]
+    _setup_lights(lights, positions, colors, radii, energies)
+    fovs = _to_rows(fovs, len(lights), "fovs")
+    for index, light in enumerate(lights):
+        light.set_direction(*directions[index])
+        if fovs is not None:
+            light.set_fov(fovs[index])
+    return lights
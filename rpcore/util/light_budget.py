@@ -0,0 +1,165 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import math
+import heapq
+
+__all__ = ["LightImportanceBudget"]
+
+
+class LightImportanceBudget(object):
+
+    """ Decides which lights should be active, if there are more lights than
+    can be afforded. Lights are ranked by their estimated contribution, which
+    is their energy times the solid angle their radius covers as seen from the
+    camera. Lights are stored in a spatial hash, so only the cells which might
+    contain one of the most important lights have to be visited.
+
+    To prevent lights from popping when their importance is close to the one
+    of the least important active light, the importance of active lights is
+    increased by the hysteresis factor. Lights are identified by arbitrary
+    hashable keys, so the ranking does not depend on the native light types. """
+
+    def __init__(self, max_lights, cell_size=100.0, hysteresis=0.25, min_distance=1.0):
+        self.max_lights = max_lights
+        self.cell_size = float(cell_size)
+        self.hysteresis = hysteresis
+        self.min_distance = min_distance
+        self.update_distance = self.cell_size * 0.1
+        self.active = set()
+        self._dirty = False
+        self._ranked_pos = None
+        self._lights = {}
+        self._cells = {}
+        self._cell_weights = {}
+
+    @property
+    def num_lights(self):
+        """ Returns the amount of registered lights """
+        return len(self._lights)
+
+    def _get_cell(self, position):
+        return (int(math.floor(position[0] / self.cell_size)),
+                int(math.floor(position[1] / self.cell_size)),
+                int(math.floor(position[2] / self.cell_size)))
+
+    def add(self, key, position, radius, energy):
+        """ Registers a light, or updates it if it was already registered.
+        New lights are inactive until the next update. """
+        self.remove(key, keep_active=True)
+        position = tuple(position)
+        cell = self._get_cell(position)
+        weight = energy * radius * radius
+        self._lights[key] = (position, weight, cell)
+        self._cells.setdefault(cell, {})[key] = weight
+        self._cell_weights[cell] = max(self._cell_weights.get(cell, 0.0), weight)
+        self._dirty = True
+
+    def remove(self, key, keep_active=False):
+        """ Unregisters a light, returns whether it was registered """
+        if key not in self._lights:
+            return False
+        _, weight, cell = self._lights.pop(key)
+        lights = self._cells[cell]
+        del lights[key]
+        if not lights:
+            del self._cells[cell]
+            del self._cell_weights[cell]
+        elif weight >= self._cell_weights[cell]:
+            self._cell_weights[cell] = max(lights.values())
+        if not keep_active:
+            self.active.discard(key)
+        self._dirty = True
+        return True
+
+    def get_importance(self, key, camera_pos):
+        """ Returns the estimated contribution of a light, without hysteresis """
+        position, weight, _ = self._lights[key]
+        dist_sq = sum((position[i] - camera_pos[i]) ** 2 for i in range(3))
+        return weight / max(dist_sq, self.min_distance * self.min_distance)
+
+    def _get_cell_bound(self, cell, camera_pos):
+        """ Returns an upper bound for the importance of all lights in a cell,
+        by using the distance to the closest point of the cell """
+        dist_sq = 0.0
+        for i in range(3):
+            cell_min = cell[i] * self.cell_size
+            delta = max(cell_min - camera_pos[i], 0.0, camera_pos[i] - cell_min - self.cell_size)
+            dist_sq += delta * delta
+        bound = self._cell_weights[cell] / max(dist_sq, self.min_distance * self.min_distance)
+        return bound * (1.0 + self.hysteresis)
+
+    def rank(self, camera_pos):
+        """ Returns the keys of the lights which should be active, most
+        important first """
+        if self.max_lights <= 0:
+            return []
+        bounds = sorted(((self._get_cell_bound(cell, camera_pos), cell) for cell in self._cells),
+                        reverse=True)
+        cam_x, cam_y, cam_z = camera_pos[0], camera_pos[1], camera_pos[2]
+        min_dist_sq = self.min_distance * self.min_distance
+        active_factor = 1.0 + self.hysteresis
+        active = self.active
+        lights = self._lights
+        heap = []
+        counter = 0
+        for bound, cell in bounds:
+            if len(heap) >= self.max_lights and bound <= heap[0][0]:
+                break
+            for key, weight in self._cells[cell].items():
+                position = lights[key][0]
+                dist_sq = (position[0] - cam_x) ** 2 + (position[1] - cam_y) ** 2 + \
+                    (position[2] - cam_z) ** 2
+                importance = weight / max(dist_sq, min_dist_sq)
+                if key in active:
+                    importance *= active_factor
+                counter += 1
+                if len(heap) < self.max_lights:
+                    heapq.heappush(heap, (importance, counter, key))
+                elif importance > heap[0][0]:
+                    heapq.heapreplace(heap, (importance, counter, key))
+        return [key for _, _, key in sorted(heap, reverse=True)]
+
+    def update(self, camera_pos, force=False):
+        """ Ranks all lights for the given camera position and updates the set
+        of active lights. Returns the lists of keys of the lights which got
+        activated and of the lights which should be hibernated. The lights are
+        only ranked again if lights were added or removed, or the camera moved
+        further than update_distance since the last ranking, unless force is
+        set. """
+        if not force and not self._dirty and self._ranked_pos is not None and \
+                sum((camera_pos[i] - self._ranked_pos[i]) ** 2 for i in range(3)) < \
+                self.update_distance * self.update_distance:
+            return [], []
+
+        self._dirty = False
+        self._ranked_pos = tuple(camera_pos)
+        ranked = self.rank(camera_pos)
+        selected = set(ranked)
+        activated = [key for key in ranked if key not in self.active]
+        hibernated = [key for key in self.active if key not in selected]
+        self.active = selected
+        return activated, hibernated
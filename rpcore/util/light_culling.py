@@ -0,0 +1,404 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import math
+import time
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ["LightCullingGrid", "LightCullingResult", "cull_lights", "pack_light_data",
+           "estimate_buffer_sizes"]
+
+# Constants of the CullLightsStage
+CULL_THREADS = 32
+NUM_LIGHT_CLASSES = 4
+
+# Light types, have to match RPLight::LightType in the native code
+LT_POINT_LIGHT = 1
+LT_SPOT_LIGHT = 2
+
+# Amount of floats per light in the light data buffer, see light_data.inc.glsl
+LIGHT_DATA_SIZE = 16
+
+# Constants of the culling shaders, see light_culling.inc.glsl and
+# cull_lights.frag.glsl
+SLICE_EXP_FACTOR = 3.0
+CULL_BIAS = 1.01
+DISTANCE_BIAS = 0.05
+RAY_DIRS = ((0.0, 0.0), (CULL_BIAS, CULL_BIAS), (-CULL_BIAS, CULL_BIAS),
+            (CULL_BIAS, -CULL_BIAS), (-CULL_BIAS, -CULL_BIAS))
+
+
+class LightCullingGrid(object):
+
+    """ Parameters of the light culling grid, matching the LC_* defines set by
+    the LightManager, see LightManager.get_culling_grid """
+
+    def __init__(self, num_tiles_x, num_tiles_y, num_slices=32, max_distance=500.0,
+                 max_lights_per_cell=64):
+        self.num_tiles_x = num_tiles_x
+        self.num_tiles_y = num_tiles_y
+        self.num_slices = num_slices
+        self.max_distance = max_distance
+        self.max_lights_per_cell = max_lights_per_cell
+
+    @property
+    def num_cells(self):
+        """ Returns the total amount of cells """
+        return self.num_tiles_x * self.num_tiles_y * self.num_slices
+
+    def get_slice_from_distance(self, distance):
+        """ Returns the slice containing the given view space distance """
+        flt_dist = distance / self.max_distance
+        return int(math.log(flt_dist * SLICE_EXP_FACTOR + 1.0) /
+                   math.log(1.0 + SLICE_EXP_FACTOR) * self.num_slices)
+
+    def get_distance_from_slice(self, slice_index):
+        """ Returns the view space distance at which the given slice starts """
+        flt_dist = slice_index / float(self.num_slices) * math.log(1.0 + SLICE_EXP_FACTOR)
+        return (math.exp(flt_dist) - 1.0) / SLICE_EXP_FACTOR * self.max_distance
+
+    def get_slice_bounds(self):
+        """ Returns the minimum and maximum distance lights are culled against
+        for each slice, including the bias used by the culling shader """
+        return [(self.get_distance_from_slice(i) - DISTANCE_BIAS,
+                 self.get_distance_from_slice(i + 1) + DISTANCE_BIAS)
+                for i in range(self.num_slices)]
+
+    def get_tile_ray_dirs(self, frustum_directions):
+        """ Returns the view space directions of the rays traced for each tile,
+        indexed by [y][x], given the four view space frustum corner directions
+        in the order (-1, -1), (1, -1), (-1, 1), (1, 1) """
+        corners = [tuple(direction[:3]) for direction in frustum_directions]
+        tiles = []
+        for tile_y in range(self.num_tiles_y):
+            row = []
+            for tile_x in range(self.num_tiles_x):
+                rays = []
+                for ray_x, ray_y in RAY_DIRS:
+                    pos_x = (tile_x + ray_x * 0.5 + 0.5) / self.num_tiles_x
+                    pos_y = (tile_y + ray_y * 0.5 + 0.5) / self.num_tiles_y
+                    bottom = _mix(corners[0], corners[1], pos_x)
+                    top = _mix(corners[2], corners[3], pos_x)
+                    rays.append(_normalize(_mix(bottom, top, pos_y)))
+                row.append(rays)
+            tiles.append(row)
+        return tiles
+
+
+def estimate_buffer_sizes(grid, max_lights=65535):
+    """ Returns the size in bytes of each buffer used for the light culling
+    with the given grid, see the FlagUsedCells, CollectUsedCells and
+    CullLights stages. max_lights should be LightManager.MAX_LIGHTS. """
+    num_tiles = grid.num_tiles_x * grid.num_tiles_y
+    max_cells = grid.num_cells
+    return {
+        "CellGridFlags": num_tiles * grid.num_slices,
+        "CellList": (1 + max_cells) * 4,
+        "CellIndices": num_tiles * grid.num_slices * 4,
+        "FrustumLights": max_lights * 2,
+        "PerCellLights": max_cells * grid.max_lights_per_cell * 2,
+        "PerCellLightCounts": max_cells * 4,
+        "GroupedPerCellLights": max_cells * (grid.max_lights_per_cell + NUM_LIGHT_CLASSES) * 2,
+        "GroupedPerCellLightsCount": max_cells * (1 + NUM_LIGHT_CLASSES) * 2,
+    }
+
+
+class LightCullingResult(object):
+
+    """ Result of the light culling. Cells are identified by (x, y, slice)
+    tuples, like they are packed by the culling shaders. """
+
+    def __init__(self, grid):
+        self.grid = grid
+
+        # Amount of lights intersecting each cell, indexed by [slice][y][x].
+        # This is not limited by max_lights_per_cell.
+        self.counts = None
+
+        # Lights stored for each cell with at least one light, limited to
+        # max_lights_per_cell lights
+        self.cell_lights = {}
+
+        # Cells with more lights than max_lights_per_cell
+        self.overflow_cells = []
+
+        self.num_frustum_lights = 0
+        self.num_processed_cells = 0
+        self.num_tests = 0
+        self.elapsed = 0.0
+
+    def get_count(self, cell_x, cell_y, cell_slice):
+        """ Returns the amount of lights intersecting the given cell """
+        return int(self.counts[cell_slice][cell_y][cell_x])
+
+    def get_stats(self):
+        """ Returns a summary of the culling result. num_tests is the amount of
+        ray/sphere intersection tests, which is proportional to the culling
+        cost on the gpu. """
+        counts = [self.get_count(*cell) for cell in self.cell_lights]
+        return {
+            "num_cells": self.grid.num_cells,
+            "num_processed_cells": self.num_processed_cells,
+            "num_occupied_cells": len(counts),
+            "num_overflow_cells": len(self.overflow_cells),
+            "num_frustum_lights": self.num_frustum_lights,
+            "max_lights_per_cell": max(counts) if counts else 0,
+            "avg_lights_per_occupied_cell": sum(counts) / float(len(counts)) if counts else 0.0,
+            "num_stored_lights": sum(len(lights) for lights in self.cell_lights.values()),
+            "num_tests": self.num_tests,
+            "elapsed": self.elapsed,
+        }
+
+
+def _mix(a, b, factor):
+    return tuple(a[i] + (b[i] - a[i]) * factor for i in range(3))
+
+
+def _normalize(vector):
+    length = math.sqrt(sum(component * component for component in vector))
+    return tuple(component / length for component in vector)
+
+
+def _to_rows(matrix):
+    """ Converts a Mat4 or a nested sequence to a list of rows """
+    if hasattr(matrix, "get_cell"):
+        return [[matrix.get_cell(row, col) for col in range(4)] for row in range(4)]
+    return [list(row) for row in matrix]
+
+
+def _unpack_int(value, int_packing):
+    """ Unpacks an integer packed by the GPUCommandQueue """
+    if int_packing:
+        return struct.unpack("<i", struct.pack("<f", value))[0]
+    return int(value)
+
+
+def _get_culling_sphere(row, view_rows, int_packing):
+    """ Returns the view space sphere used to cull the light with the given
+    light data, as (center, radius, distance of the light), or None for lights
+    of an unknown type. Matches get_representative_sphere. """
+    light_type = _unpack_int(row[0], int_packing)
+    pos = (row[3], row[4], row[5], 1.0)
+    pos_view = tuple(sum(pos[i] * view_rows[i][col] for i in range(4)) for col in range(3))
+
+    if light_type == LT_POINT_LIGHT:
+        center = pos_view
+        radius = row[9] + row[10]
+
+    elif light_type == LT_SPOT_LIGHT:
+        cone_radius, cone_fov = row[9], row[10]
+        direction = (row[11], row[12], row[13])
+        direction_view = _normalize(tuple(
+            sum(direction[i] * view_rows[i][col] for i in range(3)) for col in range(3)))
+        half_cone_radius = cone_radius * 0.5
+        center = tuple(pos_view[i] + direction_view[i] * half_cone_radius for i in range(3))
+        hypotenuse = cone_radius / cone_fov
+        radius = math.sqrt((1.0 - cone_fov * cone_fov) * hypotenuse * hypotenuse +
+                           half_cone_radius * half_cone_radius)
+    else:
+        return None
+    distance = math.sqrt(sum(component * component for component in pos_view))
+    return center, radius, distance
+
+
+def _get_frustum_lights(light_data, grid, view_rows, int_packing):
+    """ Returns (light index, center, culling radius) of all lights which are
+    not too far away, like the view frustum culling shader does """
+    max_dist_sq = grid.max_distance * grid.max_distance
+    lights = []
+    for index, row in enumerate(light_data):
+        if _unpack_int(row[0], int_packing) < 1:
+            continue
+        sphere = _get_culling_sphere(row, view_rows, int_packing)
+        if sphere is None:
+            continue
+        center, radius, distance = sphere
+        if sum(c * c for c in center) - radius * radius > max_dist_sq:
+            continue
+
+        # Matches the workaround for very distant small lights
+        lights.append((index, center, radius * max(1.0, distance / 200.0)))
+    return lights
+
+
+def _cull_python(result, frustum_lights, grid, frustum_directions, used_cells):
+    """ Pure python version of the per-cell culling """
+    slice_bounds = grid.get_slice_bounds()
+    tile_rays = grid.get_tile_ray_dirs(frustum_directions)
+    counts = [[[0] * grid.num_tiles_x for _ in range(grid.num_tiles_y)]
+              for _ in range(grid.num_slices)]
+
+    used_tiles = None
+    if used_cells is not None:
+        used_tiles = set((tile_x, tile_y) for tile_x, tile_y, _ in used_cells)
+
+    for tile_y in range(grid.num_tiles_y):
+        for tile_x in range(grid.num_tiles_x):
+            if used_tiles is not None and (tile_x, tile_y) not in used_tiles:
+                continue
+
+            # Compute the intersections of each ray with each light once, they
+            # do not depend on the slice
+            hits = []
+            for index, center, radius in frustum_lights:
+                intervals = []
+                for ray in tile_rays[tile_y][tile_x]:
+                    proj = -sum(ray[i] * center[i] for i in range(3))
+                    root = proj * proj - sum(c * c for c in center) + radius * radius
+                    if root > 0:
+                        sqr_root = math.sqrt(root)
+                        intervals.append((-proj - sqr_root, -proj + sqr_root))
+                if intervals:
+                    hits.append((index, intervals))
+
+            for cell_slice, (min_distance, max_distance) in enumerate(slice_bounds):
+                if used_cells is not None and (tile_x, tile_y, cell_slice) not in used_cells:
+                    continue
+                result.num_processed_cells += 1
+                lights = [index for index, intervals in hits
+                          if any(near < max_distance and far > min_distance
+                                 for near, far in intervals)]
+                counts[cell_slice][tile_y][tile_x] = len(lights)
+                if lights:
+                    result.cell_lights[(tile_x, tile_y, cell_slice)] = \
+                        lights[:grid.max_lights_per_cell]
+    result.counts = counts
+
+
+def _cull_numpy(result, frustum_lights, grid, frustum_directions, used_cells):
+    """ Vectorized version of the per-cell culling """
+    slice_bounds = numpy.array(grid.get_slice_bounds())
+    tile_rays = numpy.array(grid.get_tile_ray_dirs(frustum_directions))
+    tile_rays = tile_rays.reshape(-1, len(RAY_DIRS), 3)
+    num_tiles = tile_rays.shape[0]
+    counts = numpy.zeros((grid.num_slices, grid.num_tiles_y, grid.num_tiles_x), dtype=numpy.int32)
+
+    if used_cells is None:
+        used = numpy.ones((grid.num_slices, num_tiles), dtype=bool)
+    else:
+        used = numpy.zeros((grid.num_slices, grid.num_tiles_y, grid.num_tiles_x), dtype=bool)
+        for tile_x, tile_y, cell_slice in used_cells:
+            used[cell_slice, tile_y, tile_x] = True
+        used = used.reshape(grid.num_slices, num_tiles)
+    result.num_processed_cells = int(used.sum())
+
+    if frustum_lights:
+        indices = numpy.array([light[0] for light in frustum_lights])
+        centers = numpy.array([light[1] for light in frustum_lights])
+        radii = numpy.array([light[2] for light in frustum_lights])
+        center_sq = (centers * centers).sum(axis=1)
+
+        # Process the tiles in chunks, to limit the size of the temporary arrays
+        chunk_size = max(1, 2 ** 22 // (len(RAY_DIRS) * grid.num_slices * len(indices)))
+        for start in range(0, num_tiles, chunk_size):
+            rays = tile_rays[start:start + chunk_size]
+            proj = -numpy.einsum("tkc,lc->tkl", rays, centers)
+            root = proj * proj - center_sq + radii * radii
+            sqr_root = numpy.sqrt(numpy.abs(root))
+            near, far = -proj - sqr_root, -proj + sqr_root
+            visible = ((root > 0)[:, :, None, :] &
+                       (near[:, :, None, :] < slice_bounds[None, None, :, 1, None]) &
+                       (far[:, :, None, :] > slice_bounds[None, None, :, 0, None])).any(axis=1)
+
+            # visible is indexed by [tile, slice, light]
+            visible &= used[:, start:start + chunk_size].T[:, :, None]
+            chunk_counts = visible.sum(axis=2)
+            counts.reshape(grid.num_slices, num_tiles)[:, start:start + chunk_size] = chunk_counts.T
+            for tile, cell_slice in zip(*numpy.nonzero(chunk_counts)):
+                tile_index = start + tile
+                cell = (int(tile_index % grid.num_tiles_x), int(tile_index // grid.num_tiles_x),
+                        int(cell_slice))
+                lights = indices[visible[tile, cell_slice]][:grid.max_lights_per_cell]
+                result.cell_lights[cell] = lights.tolist()
+    result.counts = counts
+
+
+def cull_lights(light_data, grid, view_mat, frustum_directions, int_packing=False,
+                used_cells=None, use_numpy=None):
+    """ CPU reference implementation of the clustered light culling done by
+    the ViewFrustumCull, CollectUsedCells and CullLights stages.
+
+    light_data contains LIGHT_DATA_SIZE floats for each light slot, in the
+    layout of the light data buffer, see pack_light_data. view_mat is the
+    view_mat_z_up matrix of the main scene data, and frustum_directions are
+    the rows of vs_frustum_directions, both either as Mat4 or as nested
+    sequences. int_packing has to match GPUCommand.get_uses_integer_packing()
+    for data written by the native code. used_cells can be a set of
+    (x, y, slice) tuples, to only cull the cells containing geometry like the
+    pipeline does, by default all cells are processed.
+
+    Unlike the culling shader, which stores the first lights found by its
+    threads, the lights of each cell are stored in order of their index.
+    NumPy is used if it is available, unless use_numpy is False. """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    elif use_numpy and numpy is None:
+        raise ImportError("NumPy is not available")
+
+    start_time = time.perf_counter()
+    view_rows = _to_rows(view_mat)
+    frustum_directions = _to_rows(frustum_directions)
+
+    result = LightCullingResult(grid)
+    frustum_lights = _get_frustum_lights(light_data, grid, view_rows, int_packing)
+    result.num_frustum_lights = len(frustum_lights)
+
+    if use_numpy:
+        _cull_numpy(result, frustum_lights, grid, frustum_directions, used_cells)
+    else:
+        _cull_python(result, frustum_lights, grid, frustum_directions, used_cells)
+
+    result.num_tests = result.num_processed_cells * len(frustum_lights) * len(RAY_DIRS)
+    result.overflow_cells = sorted(
+        (cell for cell in result.cell_lights if result.get_count(*cell) > grid.max_lights_per_cell),
+        key=lambda cell: (cell[2], cell[1], cell[0]))
+    result.elapsed = time.perf_counter() - start_time
+    return result
+
+
+def pack_light_data(lights):
+    """ Returns the light data of the given RPLight objects, in the layout the
+    GPUCommandQueue uploads it, so it can be passed to cull_lights. Also
+    returns whether integers are packed as floats. """
+    from panda3d.core import PTAUchar
+    from panda3d._rplight import GPUCommand
+
+    buffer = PTAUchar.empty_array(32 * 4)
+    light_data = []
+    for light in lights:
+        command = GPUCommand(GPUCommand.CMD_store_light)
+        command.push_int(0)
+        light.write_to_command(command)
+        command.write_to(buffer, 0)
+
+        # Skip the command type and the slot
+        light_data.append(struct.unpack("<32f", bytes(buffer))[2:2 + LIGHT_DATA_SIZE])
+    return light_data, GPUCommand.get_uses_integer_packing()
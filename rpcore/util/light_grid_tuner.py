@@ -0,0 +1,212 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import math
+
+from rpcore.util.light_culling import LightCullingGrid, cull_lights, estimate_buffer_sizes
+from rpcore.util.light_culling import CULL_THREADS
+
+__all__ = ["CameraPose", "LightGridTuner"]
+
+
+class CameraPose(object):
+
+    """ A recorded camera pose, consisting of the view_mat_z_up matrix and
+    the vs_frustum_directions of the main scene data, see
+    LightManager.get_camera_pose. Depth samples are optional (u, v, distance)
+    tuples, with u and v in the range 0 .. 1 starting at the bottom left of
+    the screen, and the view space distance of the visible surface. They
+    describe which cells contain geometry, and how many pixels each cell
+    covers. """
+
+    def __init__(self, view_mat, frustum_directions, depth_samples=None):
+        self.view_mat = view_mat
+        self.frustum_directions = frustum_directions
+        self.depth_samples = depth_samples
+
+
+class LightGridTuner(object):
+
+    """ Evaluates light culling grid configurations for a recorded light set
+    and camera path with the CPU light culling, and recommends the settings
+    with the lowest estimated cost which do not drop any lights.
+
+    The cost of a configuration is the amount of ray/sphere tests done by the
+    culling, plus a constant overhead per processed cell, plus the amount of
+    lights evaluated per pixel, weighted by shading_weight. """
+
+    TILE_SIZES = ((16, 16), (24, 16), (32, 16), (32, 32), (48, 32), (64, 32))
+    SLICE_COUNTS = (16, 24, 32, 48, 64)
+    MAX_LIGHTS_PER_CELL = (16, 32, 64, 128, 256)
+    SLICE_WIDTHS = (1024, 2048, 4096, 8192)
+
+    def __init__(self, light_data, poses, resolution, int_packing=False, max_distance=500.0):
+        self.light_data = light_data
+        self.poses = poses
+        self.resolution = resolution
+        self.int_packing = int_packing
+        self.max_distance = max_distance
+        # Cost of evaluating one light for one pixel, relative to the cost of
+        # one ray/sphere test during the culling
+        self.shading_weight = 1.0
+
+        # Configurations exceeding the texture size limit, or the memory budget
+        # in bytes if one is set, are not recommended
+        self.max_texture_size = 16384
+        self.memory_budget = None
+
+    def _make_grid(self, tile_size, num_slices, max_lights_per_cell):
+        num_tiles_x = int(math.ceil(self.resolution[0] / float(tile_size[0])))
+        num_tiles_y = int(math.ceil(self.resolution[1] / float(tile_size[1])))
+        return LightCullingGrid(num_tiles_x, num_tiles_y, num_slices, self.max_distance,
+                                max_lights_per_cell)
+
+    def _get_sample_cells(self, grid, tile_size, pose):
+        """ Returns the cell of each depth sample of the pose """
+        cells = []
+        for u, v, distance in pose.depth_samples:
+            tile_x = min(int(u * self.resolution[0]) // tile_size[0], grid.num_tiles_x - 1)
+            tile_y = min(int(v * self.resolution[1]) // tile_size[1], grid.num_tiles_y - 1)
+            cell_slice = min(max(grid.get_slice_from_distance(distance), 0), grid.num_slices - 1)
+            cells.append((tile_x, tile_y, cell_slice))
+        return cells
+
+    def _choose_slice_width(self, grid):
+        """ Returns the slice width wasting the least threads for the given
+        grid, and the amount of wasted threads """
+        best = None
+        for slice_width in self.SLICE_WIDTHS:
+            num_threads = grid.num_cells * CULL_THREADS
+            num_rows = int(math.ceil(num_threads / float(slice_width)))
+            if slice_width > self.max_texture_size or num_rows > self.max_texture_size:
+                continue
+            waste = slice_width * num_rows - num_threads
+            if best is None or waste < best[1]:
+                best = (slice_width, waste)
+        return best
+
+    def _cull_poses(self, tile_size, num_slices):
+        """ Culls all poses with the given grid, returning a list of
+        (result, sample cells) tuples """
+        grid = self._make_grid(tile_size, num_slices, 2 ** 16)
+        results = []
+        for pose in self.poses:
+            sample_cells = None
+            if pose.depth_samples:
+                sample_cells = self._get_sample_cells(grid, tile_size, pose)
+            result = cull_lights(
+                self.light_data, grid, pose.view_mat, pose.frustum_directions,
+                self.int_packing, set(sample_cells) if sample_cells else None)
+            results.append((result, sample_cells))
+        return results
+
+    def _evaluate(self, tile_size, num_slices, max_lights_per_cell, results):
+        """ Computes the report of a configuration from the culling results of
+        its grid, see _cull_poses """
+        grid = self._make_grid(tile_size, num_slices, max_lights_per_cell)
+        num_pixels = self.resolution[0] * self.resolution[1]
+        cull_cost, shading_cost, overflow_cells, max_count = 0, 0.0, 0, 0
+        for result, sample_cells in results:
+            cull_cost += result.num_tests + result.num_processed_cells * CULL_THREADS
+            counts = [result.get_count(*cell) for cell in result.cell_lights]
+            overflow_cells += sum(1 for count in counts if count > max_lights_per_cell)
+            max_count = max([max_count] + counts)
+
+            if sample_cells:
+                weight = num_pixels / float(len(sample_cells))
+                shading_cost += weight * sum(
+                    min(result.get_count(*cell), max_lights_per_cell) for cell in sample_cells)
+            else:
+                # Without depth information, every slice of a tile is assumed
+                # to cover the same amount of pixels
+                weight = tile_size[0] * tile_size[1] / float(num_slices)
+                shading_cost += weight * sum(
+                    min(count, max_lights_per_cell) for count in counts)
+
+        slice_width = self._choose_slice_width(grid)
+        buffer_sizes = estimate_buffer_sizes(grid)
+        return {
+            "settings": {
+                "culling_grid_size_x": tile_size[0],
+                "culling_grid_size_y": tile_size[1],
+                "culling_grid_slices": num_slices,
+                "culling_slice_width": slice_width[0] if slice_width else None,
+                "max_lights_per_cell": max_lights_per_cell,
+            },
+            "num_cells": grid.num_cells,
+            "cull_cost": cull_cost,
+            "shading_cost": shading_cost,
+            "cost": cull_cost + self.shading_weight * shading_cost,
+            "overflow_cells": overflow_cells,
+            "max_lights_in_cell": max_count,
+            "wasted_threads": slice_width[1] if slice_width else None,
+            "buffer_sizes": buffer_sizes,
+            "memory": sum(buffer_sizes.values()),
+        }
+
+    def sweep(self, tile_sizes=None, slice_counts=None, max_lights_per_cell=None):
+        """ Evaluates all combinations of the given candidate values, by
+        default the class constants, and returns a report for each of them.
+        The culling only runs once per tile size and slice count. """
+        reports = []
+        for tile_size in tile_sizes or self.TILE_SIZES:
+            for num_slices in slice_counts or self.SLICE_COUNTS:
+                results = self._cull_poses(tile_size, num_slices)
+                for max_lights in max_lights_per_cell or self.MAX_LIGHTS_PER_CELL:
+                    reports.append(self._evaluate(tile_size, num_slices, max_lights, results))
+        return reports
+
+    def is_valid(self, report):
+        """ Returns whether a configuration can be used without dropping lights,
+        exceeding the texture size limit or the memory budget """
+        return report["overflow_cells"] == 0 and \
+            report["settings"]["culling_slice_width"] is not None and \
+            (self.memory_budget is None or report["memory"] <= self.memory_budget)
+
+    def recommend(self, reports=None):
+        """ Returns the report of the cheapest valid configuration, see sweep.
+        If no configuration is valid, the one dropping the least lights is
+        returned. The settings of the report can be applied to the
+        RenderPipeline attributes of the same name. """
+        reports = reports if reports is not None else self.sweep()
+        valid = [report for report in reports if self.is_valid(report)]
+        if valid:
+            return min(valid, key=lambda report: (report["cost"], report["memory"]))
+        return min(reports, key=lambda report: (report["overflow_cells"], report["cost"]))
+
+    @staticmethod
+    def format_report(reports):
+        """ Formats the given reports as a table, one configuration per line """
+        lines = ["{:>6} {:>6} {:>4} {:>6} {:>9} {:>14} {:>9} {:>10}".format(
+            "tile", "slices", "max", "width", "cells", "cost", "overflow", "memory")]
+        for report in reports:
+            settings = report["settings"]
+            lines.append("{:>6} {:>6} {:>4} {:>6} {:>9} {:>14.0f} {:>9} {:>7.2f} MB".format(
+                "{}x{}".format(settings["culling_grid_size_x"], settings["culling_grid_size_y"]),
+                settings["culling_grid_slices"], settings["max_lights_per_cell"],
+                settings["culling_slice_width"] or "-", report["num_cells"], report["cost"],
+                report["overflow_cells"], report["memory"] / (1024.0 * 1024.0)))
+        return "\n".join(lines)
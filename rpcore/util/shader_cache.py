@@ -0,0 +1,88 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import hashlib
+
+from direct.stdpy.file import open, isfile
+
+
+class ShaderCache(object):
+
+    """ Persistent, content addressed storage for generated shaders. The
+    MountManager mounts the cache directory as /$$rpcache when a cache path
+    was set, otherwise the cache is disabled and generated shaders are
+    written to /$$rptemp as before. Cache entries are named by a stable hash
+    of everything that went into generating them, so an existing entry can
+    always be reused as-is. """
+
+    MOUNT_POINT = "/$$rpcache"
+
+    # Set by the MountManager as soon as the cache directory is mounted
+    enabled = False
+
+    # Statistics about the shader cache, see get_stats()
+    _STATS = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def make_key(cls, *parts):
+        """ Generates a stable key from the given parts. Unlike hash(), this
+        key does not change between different runs. """
+        hasher = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, dict):
+                part = sorted(part.items())
+            hasher.update(repr(part).encode("utf-8"))
+            hasher.update(b"\0")
+        return hasher.hexdigest()[:24]
+
+    @classmethod
+    def get_path(cls, name, key, extension=".glsl"):
+        """ Returns the path of the cache entry with the given name and key """
+        return cls.MOUNT_POINT + "/$$" + name + "-" + key + extension
+
+    @classmethod
+    def lookup(cls, name, key, extension=".glsl"):
+        """ Returns the path of the cache entry with the given name and key if
+        it exists, and None otherwise """
+        path = cls.get_path(name, key, extension)
+        if isfile(path):
+            cls._STATS["hits"] += 1
+            return path
+        cls._STATS["misses"] += 1
+        return None
+
+    @classmethod
+    def store(cls, name, key, content, extension=".glsl"):
+        """ Writes the given content to the cache and returns its path """
+        path = cls.get_path(name, key, extension)
+        with open(path, "w") as handle:
+            handle.write(content)
+        return path
+
+    @classmethod
+    def get_stats(cls):
+        """ Returns the amount of cache hits and misses """
+        return dict(cls._STATS)
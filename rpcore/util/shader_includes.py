@@ -0,0 +1,262 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import re
+import hashlib
+import collections
+
+from panda3d.core import Filename, VirtualFileSystem, get_model_path
+from direct.stdpy.file import open
+
+__all__ = ["write_generated_include", "ShaderSourceIndex", "ShaderDependencyGraph",
+           "ShaderFileWatcher"]
+
+# Content hashes of the generated includes written so far, by path
+_GENERATED_HASHES = {}
+
+_INCLUDE_RE = re.compile(r'^\s*#pragma\s+include\s+["<]([^">]+)[">]', re.MULTILINE)
+
+
+def write_generated_include(path, content):
+    """ Writes a generated shader include, unless it was already written with
+    the same content before. Rewriting an include changes its modification
+    time, which forces all shaders including it to be recompiled. Returns
+    whether the file was written. """
+    content_hash = hashlib.sha1(content.encode("utf-8")).hexdigest()
+    if _GENERATED_HASHES.get(path) == content_hash:
+        return False
+    with open(path, "w") as handle:
+        handle.write(content)
+    _GENERATED_HASHES[path] = content_hash
+    return True
+
+
+class ShaderSourceIndex(object):
+
+    """ Resolves the files a shader is made of, following #pragma include
+    directives the same way the shader preprocessor does: relative to the
+    including file first, then on the model path. Each file is read and hashed
+    at most once, so an index should only be used for one reload, and then be
+    discarded to pick up changed files. """
+
+    def __init__(self):
+        self._vfs = VirtualFileSystem.get_global_ptr()
+        self._files = {}
+
+    def resolve(self, name, including_dir=None):
+        """ Returns the full path of the given shader file, or None if it
+        could not be found """
+        filename = Filename(name)
+        if including_dir and not filename.is_fully_qualified():
+            local = Filename(Filename(including_dir), filename)
+            if self._vfs.exists(local):
+                return local.get_fullpath()
+        found = self._vfs.find_file(filename, get_model_path().get_value())
+        return found.get_filename().get_fullpath() if found else None
+
+    def _index_file(self, path):
+        """ Reads the given file, returning its content hash and the full paths
+        of the files it includes """
+        if path not in self._files:
+            try:
+                content = self._vfs.read_file(Filename(path), True)
+            except Exception:  # pylint: disable=broad-except
+                content = None
+            if not content:
+                self._files[path] = (None, ())
+            else:
+                directory = Filename(path).get_dirname()
+                includes = []
+                for name in _INCLUDE_RE.findall(content.decode("utf-8", "replace")):
+                    resolved = self.resolve(name, directory)
+                    includes.append(resolved if resolved else name)
+                self._files[path] = (hashlib.sha1(content).hexdigest(), tuple(includes))
+        return self._files[path]
+
+    def forget(self, paths=None):
+        """ Drops the given files, or all files if None is passed, from the
+        index, so they are read again the next time they are requested """
+        if paths is None:
+            self._files.clear()
+        for path in paths or ():
+            self._files.pop(path, None)
+
+    def get_includes(self, path):
+        """ Returns the full paths of the files directly included by the given
+        file. Includes which could not be resolved are returned as written. """
+        return self._index_file(path)[1]
+
+    def index_directory(self, directory, extensions=(".glsl",)):
+        """ Indexes all shader files in the given directory and its sub
+        directories. Returns the full paths of the indexed files. """
+        indexed = []
+        listing = self._vfs.scan_directory(Filename(directory))
+        if listing is None:
+            return indexed
+        for vfile in listing:
+            path = vfile.get_filename().get_fullpath()
+            if vfile.is_directory():
+                indexed.extend(self.index_directory(path, extensions))
+            elif path.endswith(tuple(extensions)):
+                self._index_file(path)
+                indexed.append(path)
+        return indexed
+
+    def get_indexed_files(self):
+        """ Returns the full paths of all files read so far """
+        return list(self._files.keys())
+
+    def get_source_hashes(self, filenames):
+        """ Returns a dictionary mapping each of the given shader files and all
+        files they include, directly or indirectly, to their content hash.
+        Files which could not be found map to None. """
+        hashes = {}
+        pending = []
+        for name in filenames:
+            pending.append(self.resolve(name) or name)
+        while pending:
+            path = pending.pop()
+            if path in hashes:
+                continue
+            content_hash, includes = self._index_file(path)
+            hashes[path] = content_hash
+            pending.extend(includes)
+        return hashes
+
+
+class ShaderDependencyGraph(object):
+
+    """ Reverse dependency graph from shader files to the programs using them.
+    Programs are represented by arbitrary hashable owners, like render stages
+    or effects, which get registered with the files their shaders are loaded
+    from. Owners then depend on these files and every file they include. The
+    graph only reads files through the virtual file system, and does not
+    require a graphics context. """
+
+    def __init__(self):
+        self.index = ShaderSourceIndex()
+        self._owners = collections.OrderedDict()
+        self._dependents = {}
+
+    def register(self, owner, filenames):
+        """ Registers an owner with the files its shaders were loaded from,
+        replacing any previous registration. Returns the content hashes of all
+        files the owner depends on. """
+        self.unregister(owner)
+        hashes = self.index.get_source_hashes(filenames)
+        self._owners[owner] = (tuple(filenames), hashes)
+        for path in hashes:
+            self._dependents.setdefault(path, collections.OrderedDict())[owner] = True
+        return hashes
+
+    def unregister(self, owner):
+        """ Removes an owner from the graph """
+        if owner not in self._owners:
+            return
+        for path in self._owners.pop(owner)[1]:
+            dependents = self._dependents[path]
+            del dependents[owner]
+            if not dependents:
+                del self._dependents[path]
+
+    def is_registered(self, owner):
+        """ Returns whether the owner was registered """
+        return owner in self._owners
+
+    def is_modified(self, owner):
+        """ Returns whether any file the owner depends on changed since it was
+        registered, as far as the index was refreshed since then. Owners which
+        were never registered count as modified. """
+        if owner not in self._owners:
+            return True
+        filenames, hashes = self._owners[owner]
+        return self.index.get_source_hashes(filenames) != hashes
+
+    def refresh(self, paths=None):
+        """ Makes the index read the given files, or all files if None is
+        passed, again on the next request """
+        self.index.forget(paths)
+
+    def resolve(self, name):
+        """ Returns the full path of a shader file, as it is used in the
+        graph. Relative names are looked up on the model path. """
+        return self.index.resolve(name) or name
+
+    def get_dependents(self, path):
+        """ Returns all owners depending on the given file, directly or
+        through includes, in registration order """
+        dependents = self._dependents.get(self.resolve(path), ())
+        return [owner for owner in self._owners if owner in dependents]
+
+    def get_affected(self, paths):
+        """ Returns all owners depending on any of the given files, in
+        registration order """
+        affected = set()
+        for path in paths:
+            affected.update(self._dependents.get(self.resolve(path), ()))
+        return [owner for owner in self._owners if owner in affected]
+
+    def get_included_by(self, path):
+        """ Returns all indexed files directly including the given file. Use
+        index_directories to include files not used by any owner. """
+        path = self.resolve(path)
+        return [including for including in self.index.get_indexed_files()
+                if path in self.index.get_includes(including)]
+
+    def index_directories(self, directories):
+        """ Indexes all shader files in the given directories, see
+        ShaderSourceIndex.index_directory. Returns the amount of indexed files. """
+        return sum(len(self.index.index_directory(directory)) for directory in directories)
+
+    def get_files(self):
+        """ Returns the full paths of all files any owner depends on """
+        return list(self._dependents.keys())
+
+
+class ShaderFileWatcher(object):
+
+    """ Polls the modification time of all files in a shader dependency graph,
+    to find out which files changed since the last poll """
+
+    def __init__(self, graph):
+        self._graph = graph
+        self._vfs = VirtualFileSystem.get_global_ptr()
+        self._timestamps = {}
+
+    def _get_timestamp(self, path):
+        vfile = self._vfs.get_file(Filename(path), True)
+        return vfile.get_timestamp() if vfile else None
+
+    def poll(self):
+        """ Returns all files which were modified since the last poll. Files
+        seen for the first time are only recorded. """
+        changed = []
+        for path in self._graph.get_files():
+            timestamp = self._get_timestamp(path)
+            if path in self._timestamps and self._timestamps[path] != timestamp:
+                changed.append(path)
+            self._timestamps[path] = timestamp
+        return changed
@@ -29,9 +29,12 @@ from panda3d.core import Vec3, CurveFitter
 class SmoothConnectedCurve(object):
 
     """ Interface to a curve which also manages connecting the end of the
-    curve with the beginning. """
+    curve with the beginning. The curve is only fitted when it gets evaluated
+    the first time after its control points changed. """
 
     def __init__(self):
+        # Amount of curve fits performed so far, useful for profiling
+        self.fit_count = 0
         self._curve = None
         self._modified = False
         self._border_points = 1
@@ -88,7 +91,13 @@ class SmoothConnectedCurve(object):
         self.build_curve()
 
     def build_curve(self):
-        """ Rebuilds the curve based on the controll point values """
+        """ Marks the curve to be rebuilt based on the controll point values.
+        The actual fit is deferred until the curve gets evaluated. """
+        self._curve = None
+
+    def _fit_curve(self):
+        """ Internal method to fit the curve to the controll point values """
+        self.fit_count += 1
         sorted_points = sorted(self._cv_points, key=lambda v: v[0])
         first_point = sorted_points[0]
         fitter = CurveFitter()
@@ -121,11 +130,14 @@ class SmoothConnectedCurve(object):
         """ Updates the cv point at the given index """
         self._cv_points[index] = [x_value, y_value]
         self._modified = True
+        self.build_curve()
 
     def get_value(self, offset):
         """ Returns the value on the curve ranging whereas the offset should be
         from 0 to 1 (0 denotes the start of the curve). The returned value will
         be a value from 0 to 1 as well. """
+        if self._curve is None:
+            self._fit_curve()
         point = Vec3(0)
         self._curve.evaluate_xyz(offset, point)
         return max(0.0, min(1.0, point.y))
@@ -0,0 +1,174 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+__all__ = ["get_produced_names", "get_required_by", "find_dead_stages",
+           "get_pipe_lifetimes", "estimate_pipe_vram"]
+
+
+class _AttributeProbe(object):  # noqa # pylint: disable=too-few-public-methods
+
+    """ Stands in for a stage which was not created yet, so the produced_pipes
+    and produced_inputs properties can be evaluated to retrieve their keys.
+    Every attribute access, call or subscript returns the probe itself, while
+    iterating it yields nothing. """
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __getitem__(self, key):
+        return self
+
+    def __iter__(self):
+        return iter(())
+
+
+def _get_declared(stage, attr):
+    """ Returns the keys of the given produced_* attribute of a stage, without
+    requiring the stage to be created. Returns None if the keys could not be
+    determined. """
+    descriptor = getattr(type(stage), attr, None)
+    try:
+        if isinstance(descriptor, property):
+            return set(descriptor.fget(_AttributeProbe()).keys())
+        return set(getattr(stage, attr).keys())
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+def get_produced_names(stage):
+    """ Returns the names of all pipes and inputs the stage produces, or None
+    if they could not be determined before creating the stage """
+    pipes = _get_declared(stage, "produced_pipes")
+    inputs = _get_declared(stage, "produced_inputs")
+    if pipes is None or inputs is None:
+        return None
+    return pipes | inputs
+
+
+def get_required_by(stages):
+    """ Returns a dictionary mapping stage ids to the pipes other stages of the
+    given list declared to be read by them, see RenderStage.required_by """
+    required_by = {}
+    for stage in stages:
+        for stage_id, pipes in stage.required_by.items():
+            required_by.setdefault(stage_id, []).extend(pipes)
+    return required_by
+
+
+def _get_required_pipes(stage, required_by):
+    """ Returns the required pipes of a stage, including the pipes other
+    stages declared to be read by it """
+    return list(stage.required_pipes) + [
+        pipe for pipe in required_by.get(stage.stage_id, ())
+        if pipe not in stage.required_pipes]
+
+
+def _strip_prefix(name):
+    """ Returns the pipe name and whether it refers to a pipe of another frame,
+    like PreviousFrame::Name or FuturePipe::Name """
+    if "::" in name:
+        return name.split("::")[-1], True
+    return name, False
+
+
+def find_dead_stages(stages, root_ids=("FinalStage",)):
+    """ Builds the producer/consumer graph of the given stages, which have to
+    be sorted by their execution order, and returns the stages whose results
+    never reach one of the root stages.
+
+    A required pipe or input is provided by the last stage producing it before
+    the consuming stage. Pipes declared with required_by count as required by
+    the reading stage. References to other frames (PreviousFrame:: and
+    FuturePipe::) are provided by the last producer of the whole frame.
+    Stages producing defines, or whose produced names cannot be determined
+    or which produce nothing at all, are always kept, since they might have
+    side effects not expressed in the graph. """
+    produced = [get_produced_names(stage) for stage in stages]
+    required_by = get_required_by(stages)
+
+    live = set()
+    for index, stage in enumerate(stages):
+        if stage.stage_id in root_ids or not produced[index] or \
+                _get_declared(stage, "produced_defines"):
+            live.add(index)
+
+    def find_producer(name, before):
+        for index in range(before - 1, -1, -1):
+            if produced[index] and name in produced[index]:
+                return index
+        return None
+
+    pending = list(live)
+    while pending:
+        index = pending.pop()
+        stage = stages[index]
+        requirements = _get_required_pipes(stage, required_by) + list(stage.required_inputs)
+        for required in requirements:
+            name, other_frame = _strip_prefix(required)
+            producer = find_producer(name, len(stages) if other_frame else index)
+            if producer is not None and producer not in live:
+                live.add(producer)
+                pending.append(producer)
+
+    return [stage for index, stage in enumerate(stages) if index not in live]
+
+
+def get_pipe_lifetimes(stages):
+    """ Returns a dictionary mapping (stage index, pipe name) of each pipe
+    produced by the given stages, which have to be sorted by their execution
+    order, to the index of the last stage reading it during the frame. Pipes
+    which are read in another frame, through PreviousFrame:: or FuturePipe::
+    references, map to None, since they have to be kept alive. """
+    produced = [_get_declared(stage, "produced_pipes") or set() for stage in stages]
+    required_by = get_required_by(stages)
+    lifetimes = {}
+    for index, pipes in enumerate(produced):
+        for pipe in pipes:
+            lifetimes[(index, pipe)] = index
+
+    for index, stage in enumerate(stages):
+        for required in _get_required_pipes(stage, required_by):
+            name, other_frame = _strip_prefix(required)
+            before = len(stages) if other_frame else index
+            for producer in range(before - 1, -1, -1):
+                if name in produced[producer]:
+                    key = (producer, name)
+                    if other_frame:
+                        lifetimes[key] = None
+                    elif lifetimes[key] is not None:
+                        lifetimes[key] = max(lifetimes[key], index)
+                    break
+    return lifetimes
+
+
+def estimate_pipe_vram(stage, width, height, bytes_per_pixel=8):
+    """ Estimates the video memory used by the pipes of a stage, assuming each
+    pipe is a texture with the given size and RGBA16 format, like it is done
+    for the previous frame pipes """
+    return len(_get_declared(stage, "produced_pipes") or ()) * width * height * bytes_per_pixel
@@ -0,0 +1,102 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+from panda3d.core import Texture
+
+
+def estimate_texture_bytes(width, height, color_bits):
+    """ Estimates the video memory of a color texture with the given size and
+    bits per channel. Three channel formats are assumed to be padded to four
+    channels, except for packed formats like R11G11B10. """
+    channels = len([bits for bits in color_bits if bits > 0])
+    max_bits = max(color_bits)
+    if max_bits not in (8, 16, 32):
+        bytes_per_pixel = 4
+    else:
+        bytes_per_pixel = (4 if channels == 3 else channels) * max_bits // 8
+    return width * height * bytes_per_pixel
+
+
+class TransientTexturePool(object):
+
+    """ Hands out the color textures of transient render targets. Textures
+    which were released because nothing reads them anymore during the frame
+    are handed out again to targets with the same size constraint and format,
+    so render targets with non overlapping lifetimes share their memory. The
+    pool counts the targets using each texture, see detach. """
+
+    def __init__(self):
+        self._free = {}
+        self._handed_out = []
+        self._holders = []
+        self.requested_bytes = 0
+        self.allocated_bytes = 0
+
+    def acquire(self, key, name, num_bytes):
+        """ Returns a texture for a target with the given key, which should
+        contain the size constraint and format of the target. num_bytes is the
+        estimated size of the texture. """
+        self.requested_bytes += num_bytes
+        free = self._free.get(key)
+        if free:
+            texture = free.pop()
+        else:
+            texture = Texture(name)
+            self.allocated_bytes += num_bytes
+            self._holders.append([texture, 0])
+        self._handed_out.append((texture, key))
+        for holder in self._holders:
+            if holder[0] is texture:
+                holder[1] += 1
+        return texture
+
+    def release(self, texture):
+        """ Returns a texture previously handed out with acquire to the pool,
+        after which it may be handed out to other targets again """
+        for index, (handed_out, key) in enumerate(self._handed_out):
+            if handed_out is texture:
+                del self._handed_out[index]
+                self._free.setdefault(key, []).append(texture)
+                return
+
+    def detach(self, texture):
+        """ Has to be called when a target using a texture handed out with
+        acquire gets removed. Since the texture might be shared with other
+        targets, its memory is only released once no target uses it anymore.
+        Returns whether the memory was released. """
+        for index, holder in enumerate(self._holders):
+            if holder[0] is not texture:
+                continue
+            holder[1] -= 1
+            if holder[1] > 0:
+                return False
+            del self._holders[index]
+            self._handed_out = [entry for entry in self._handed_out if entry[0] is not texture]
+            for free in self._free.values():
+                free[:] = [entry for entry in free if entry is not texture]
+            texture.release_all()
+            return True
+        return False
@@ -1,15 +1,4 @@
-from direct.stdpy.file import open
-from .yaml_py3 import load as yaml_load
-from .yaml_py3 import YAMLError, SafeLoader
 
-def load_yaml_file(filename):
-    try:
-        with open(filename, "r") as handle:
-            parsed_yaml = yaml_load(handle, Loader=SafeLoader)
-
-    except IOError as msg:
-        raise Exception("Failed to load YAML file: File not found")
-        
-    except YAMLError as msg:
-        raise Exception("Failed to load YAML file: Invalid syntax")
-    return parsed_yaml
\ No newline at end of file
+from .yaml_py3 import YAMLError
+from .loader import load_yaml_file, register_backend, get_backends
+from .loader import get_backend, set_backend, get_backend_stats
@@ -0,0 +1,156 @@
+import os
+import sys
+import glob
+import pickle
+
+# Increment this whenever the format of the bundle changes
+BUNDLE_VERSION = 2
+
+# Files which are compiled into the bundle, relative to the base path
+BUNDLE_PATTERNS = ("config/*.yaml", "rpplugins/*/config.yaml", "effects/*.yaml")
+
+# Virtual directories the bundled files are mounted at by the MountManager.
+# Entries are keyed by their virtual path, so a bundle does not depend on the
+# directory it was built in, or on the working directory.
+CONFIG_ROOT = "/$$rpconfig/"
+BASE_ROOT = "/$$rp/"
+
+# Maps the virtual source path to (size, mtime, pickled object)
+_entries = {}
+
+# Maps path prefixes like /$$rpconfig/ or effects/ to the normalized os
+# specific directories they are mounted from
+_aliases = {}
+
+_stats = {"hits": 0, "stale": 0}
+
+
+def _normalize(pth):
+    return os.path.normcase(os.path.realpath(pth))
+
+
+def _make_key(root, directory, pth):
+    """ Returns the virtual path of a file, given the directory mounted at
+    root, or None if the file is not contained in it. Both paths have to be
+    normalized. """
+    if directory is None or not pth.startswith(os.path.join(directory, "")):
+        return None
+    return root + os.path.relpath(pth, directory).replace(os.sep, "/")
+
+
+def _stat(pth):
+    try:
+        stat = os.stat(pth)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_bundle(base_path, bundle_path, config_dir=None):
+    """ Parses all configuration, plugin configuration and effect files below
+    the given base path and writes them into a single bundle file. If the
+    config directory was moved with MountManager.config_dir, it should be
+    passed as well. Returns the amount of files in the bundle. """
+    from .loader import parse_yaml
+
+    base_path = _normalize(base_path)
+    config_dir = _normalize(config_dir or os.path.join(base_path, "config"))
+    sources = []
+    for pattern in BUNDLE_PATTERNS:
+        if pattern.startswith("config/"):
+            pattern = os.path.join(config_dir, pattern[len("config/"):])
+        else:
+            pattern = os.path.join(base_path, pattern)
+        sources += sorted(glob.glob(pattern))
+
+    entries = {}
+    for source in sources:
+        with open(source, "rb") as handle:
+            content = handle.read()
+        parsed = parse_yaml(content.decode("utf-8"))
+        size, mtime = _stat(source)
+        key = _make_key(CONFIG_ROOT, config_dir, _normalize(source)) or \
+            _make_key(BASE_ROOT, base_path, _normalize(source))
+        entries[key] = (size, mtime, pickle.dumps(parsed, pickle.HIGHEST_PROTOCOL))
+
+    with open(bundle_path, "wb") as handle:
+        pickle.dump({"version": BUNDLE_VERSION, "entries": entries}, handle,
+                    pickle.HIGHEST_PROTOCOL)
+    return len(entries)
+
+
+def load_bundle(bundle_path, aliases=None):
+    """ Loads a bundle previously written with build_bundle with a single read.
+    Aliases map path prefixes to the os specific directories they are mounted
+    from, and have to contain CONFIG_ROOT and BASE_ROOT. Files are found in
+    the bundle whether they are requested by their virtual name, with one of
+    the other prefixes, or by an absolute or relative os specific path.
+    Returns whether the bundle could be loaded. """
+    unload_bundle()
+    try:
+        with open(bundle_path, "rb") as handle:
+            bundle = pickle.loads(handle.read())
+    except Exception as msg:  # pylint: disable=broad-except
+        print("Failed to load config bundle:", msg)
+        return False
+
+    if not isinstance(bundle, dict) or bundle.get("version") != BUNDLE_VERSION:
+        print("Config bundle", bundle_path, "is outdated, please rebuild it")
+        return False
+
+    _entries.update(bundle["entries"])
+    _aliases.update((prefix, _normalize(directory))
+                    for prefix, directory in (aliases or {}).items())
+    return True
+
+
+def unload_bundle():
+    """ Removes the currently loaded bundle """
+    _entries.clear()
+    _aliases.clear()
+
+
+def get_bundle_stats():
+    """ Returns the amount of bundled files, and the amount of lookups which
+    were served from the bundle or found to be stale """
+    stats = dict(_stats)
+    stats["files"] = len(_entries)
+    return stats
+
+
+def lookup(filename):
+    """ Returns a fresh copy of the object stored for the given file, or None
+    if the file is not in the bundle or was modified since building it """
+    if not _entries:
+        return None
+
+    pth = filename
+    for prefix, directory in _aliases.items():
+        if filename.startswith(prefix):
+            pth = os.path.join(directory, filename[len(prefix):])
+            break
+
+    # Find the virtual path the file is mounted at. The config directory is
+    # checked first, since it might be contained in the base directory.
+    pth = _normalize(pth)
+    key = _make_key(CONFIG_ROOT, _aliases.get(CONFIG_ROOT), pth) or \
+        _make_key(BASE_ROOT, _aliases.get(BASE_ROOT), pth)
+
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+
+    size, mtime, blob = entry
+    if _stat(pth) != (size, mtime):
+        _stats["stale"] += 1
+        return None
+
+    _stats["hits"] += 1
+    return pickle.loads(blob)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python -m rplibs.yaml.bundle <base path> <bundle file> [config dir]")
+        sys.exit(1)
+    print("Bundled", build_bundle(*sys.argv[1:]), "files")
@@ -0,0 +1,128 @@
+import time
+from collections import OrderedDict
+
+from direct.stdpy.file import open as vfs_open
+
+from .yaml_py3 import load as vendored_load
+from .yaml_py3 import YAMLError as VendoredYAMLError
+from .yaml_py3 import SafeLoader as VendoredSafeLoader
+from .snapshot_cache import load_cached
+from .bundle import lookup as bundle_lookup
+
+# Maps backend name to (parse function, tuple of syntax error types), in
+# order of preference
+_backends = OrderedDict()
+
+_active_backend = None
+
+_stats = {}
+
+
+def register_backend(name, parse, error_types, preferred=False):
+    """ Registers a new yaml backend. parse takes the decoded file content
+    and returns the constructed object, error_types are the exceptions the
+    backend raises on invalid syntax. Preferred backends are put in front of
+    the existing ones and become the active backend. """
+    global _active_backend
+    _backends[name] = (parse, tuple(error_types))
+    _stats.setdefault(name, {"parses": 0, "time": 0.0})
+    if preferred:
+        _backends.move_to_end(name, last=False)
+    if preferred or _active_backend is None:
+        _active_backend = name
+
+
+def get_backends():
+    """ Returns the names of all registered backends, in order of preference """
+    return list(_backends.keys())
+
+
+def get_backend():
+    """ Returns the name of the backend used to parse yaml files """
+    return _active_backend
+
+
+def set_backend(name):
+    """ Selects the backend used to parse yaml files """
+    global _active_backend
+    if name not in _backends:
+        raise KeyError("Unknown yaml backend: " + name)
+    _active_backend = name
+
+
+def get_backend_stats():
+    """ Returns the amount of parsed files and total parse time per backend """
+    return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def parse_yaml(content, backend=None):
+    """ Parses the given yaml text with the given or active backend """
+    backend = backend or _active_backend
+    parse, error_types = _backends[backend]
+    start = time.perf_counter()
+    try:
+        return parse(content)
+    except error_types as msg:
+        raise VendoredYAMLError(str(msg))
+    finally:
+        _stats[backend]["parses"] += 1
+        _stats[backend]["time"] += time.perf_counter() - start
+
+
+def _parse_bytes(content):
+    return parse_yaml(content.decode("utf-8"))
+
+
+def load_yaml_file(filename, opener=vfs_open):
+    """ Loads the given yaml file with the active backend. Files contained in
+    an up to date config bundle are not read at all, other parsed files are
+    shared through the snapshot cache. """
+    parsed_yaml = bundle_lookup(filename)
+    if parsed_yaml is not None:
+        return parsed_yaml
+
+    try:
+        with opener(filename, "rb") as handle:
+            content = handle.read()
+        parsed_yaml = load_cached(filename, content, _parse_bytes)
+
+    except IOError as msg:
+        raise Exception("Failed to load YAML file: File not found")
+
+    except VendoredYAMLError as msg:
+        raise Exception("Failed to load YAML file: Invalid syntax")
+    return parsed_yaml
+
+
+def _read_text(filename, opener):
+    with opener(filename, "rb") as handle:
+        return handle.read().decode("utf-8")
+
+
+def compare_backends(filenames, opener=vfs_open):
+    """ Parses each file with every registered backend, bypassing the
+    snapshot cache, and returns a list of (filename, backend) pairs whose
+    result differs from the vendored backend """
+    mismatches = []
+    for filename in filenames:
+        content = _read_text(filename, opener)
+        reference = parse_yaml(content, "vendored")
+        for name in _backends:
+            if name != "vendored" and parse_yaml(content, name) != reference:
+                mismatches.append((filename, name))
+    return mismatches
+
+
+register_backend(
+    "vendored", lambda content: vendored_load(content, Loader=VendoredSafeLoader),
+    (VendoredYAMLError,))
+
+try:
+    import yaml as _native_yaml
+    from yaml import CSafeLoader as _NativeSafeLoader
+except ImportError:
+    pass
+else:
+    register_backend(
+        "native", lambda content: _native_yaml.load(content, Loader=_NativeSafeLoader),
+        (_native_yaml.YAMLError,), preferred=True)
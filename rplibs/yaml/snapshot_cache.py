@@ -0,0 +1,77 @@
+import pickle
+import hashlib
+
+from direct.stdpy.file import open as vfs_open
+
+# Increment this whenever the format of the snapshots changes
+SNAPSHOT_VERSION = 1
+
+# In-memory snapshots, maps each filename to the content hash and the pickled
+# object of the most recently loaded version of the file
+_memory_snapshots = {}
+
+# Directory where snapshots are stored across runs, set by the MountManager if
+# a shader cache path is set. Otherwise snapshots are only kept in memory.
+_snapshot_dir = None
+
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def set_snapshot_dir(directory):
+    """ Sets the (virtual) directory where parsed snapshots are written to,
+    or None to only keep snapshots in memory """
+    global _snapshot_dir
+    _snapshot_dir = directory
+
+
+def get_snapshot_stats():
+    """ Returns the amount of memory hits, disk hits and misses """
+    return dict(_stats)
+
+
+def clear_snapshots():
+    """ Clears all in-memory snapshots """
+    _memory_snapshots.clear()
+
+
+def load_cached(filename, content, parse):
+    """ Returns the object constructed from the given file content. The
+    content is only parsed with parse(content) if there is no snapshot of
+    it in memory or in the snapshot directory. A fresh copy is returned on
+    each call, so callers are free to modify the returned object. """
+    content_hash = hashlib.sha1(content).hexdigest()
+
+    snapshot = _memory_snapshots.get(filename)
+    if snapshot is not None and snapshot[0] == content_hash:
+        _stats["hits"] += 1
+        return pickle.loads(snapshot[1])
+
+    snapshot_path = None
+    if _snapshot_dir is not None:
+        name_hash = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:16]
+        snapshot_path = "{}/$$yaml-v{}-{}-{}.pickle".format(
+            _snapshot_dir, SNAPSHOT_VERSION, name_hash, content_hash[:24])
+        try:
+            with vfs_open(snapshot_path, "rb") as handle:
+                blob = handle.read()
+            result = pickle.loads(blob)
+            _memory_snapshots[filename] = (content_hash, blob)
+            _stats["disk_hits"] += 1
+            return result
+        except Exception:  # pylint: disable=broad-except
+            # No snapshot yet, or an unreadable one which gets overwritten
+            pass
+
+    _stats["misses"] += 1
+    result = parse(content)
+    blob = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    _memory_snapshots[filename] = (content_hash, blob)
+
+    if snapshot_path is not None:
+        try:
+            with vfs_open(snapshot_path, "wb") as handle:
+                handle.write(blob)
+        except IOError as msg:
+            print("Failed to write YAML snapshot:", msg)
+
+    return pickle.loads(blob)
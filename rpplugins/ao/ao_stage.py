@@ -39,12 +39,12 @@ class AOStage(RenderStage):
         return {"AmbientOcclusion": self.target_resolve.color_tex}
 
     def create(self):
-        self.target = self.create_target("Sample")
+        self.target = self.create_target("Sample", transient=True)
         self.target.size = -2
         self.target.add_color_attachment(bits=(8, 0, 0, 0))
         self.target.prepare_buffer()
 
-        self.target_upscale = self.create_target("Upscale")
+        self.target_upscale = self.create_target("Upscale", transient=True)
         self.target_upscale.add_color_attachment(bits=(8, 0, 0, 0))
         self.target_upscale.prepare_buffer()
 
@@ -52,7 +52,7 @@ class AOStage(RenderStage):
             SourceTex=self.target.color_tex,
             upscaleWeights=Vec2(0.001, 0.001))
 
-        self.tarrget_detail_ao = self.create_target("DetailAO")
+        self.tarrget_detail_ao = self.create_target("DetailAO", transient=True)
         self.tarrget_detail_ao.add_color_attachment(bits=(8, 0, 0, 0))
         self.tarrget_detail_ao.prepare_buffer()
         self.tarrget_detail_ao.set_shader_input("AOResult", self.target_upscale.color_tex)
@@ -76,11 +76,11 @@ class AOStage(RenderStage):
         current_tex = self.tarrget_detail_ao.color_tex
 
         for i in range(blur_passes):
-            target_blur_v = self.create_target("BlurV-" + str(i))
+            target_blur_v = self.create_target("BlurV-" + str(i), transient=True)
             target_blur_v.add_color_attachment(bits=(8, 0, 0, 0))
             target_blur_v.prepare_buffer()
 
-            target_blur_h = self.create_target("BlurH-" + str(i))
+            target_blur_h = self.create_target("BlurH-" + str(i), transient=True)
             target_blur_h.add_color_attachment(bits=(8, 0, 0, 0))
             target_blur_h.prepare_buffer()
 
@@ -43,12 +43,12 @@ class ApplyCloudsStage(RenderStage):
         return {"ShadedScene": self.target_apply_clouds.color_tex}
 
     def create(self):
-        self.render_target = self.create_target("RaymarchVoxels")
+        self.render_target = self.create_target("RaymarchVoxels", transient=True)
         self.render_target.size = -2
         self.render_target.add_color_attachment(bits=16, alpha=True)
         self.render_target.prepare_buffer()
 
-        self.upscale_target = self.create_target("UpscaleTarget")
+        self.upscale_target = self.create_target("UpscaleTarget", transient=True)
         self.upscale_target.add_color_attachment(bits=16, alpha=True)
         self.upscale_target.prepare_buffer()
         self.upscale_target.set_shader_inputs(
@@ -40,39 +40,39 @@ class DoFStage(RenderStage):
 
     def create(self):
 
-        self.target_prefilter = self.create_target("PrefilterDoF")
+        self.target_prefilter = self.create_target("PrefilterDoF", transient=True)
         # self.target_prefilter.size = -2
         self.target_prefilter.add_color_attachment(bits=16, alpha=True)
         self.target_prefilter.prepare_buffer()
 
         self.tile_size = 32
-        self.tile_target = self.create_target("FetchVertDOF")
+        self.tile_target = self.create_target("FetchVertDOF", transient=True)
         self.tile_target.size = -1, -self.tile_size
         self.tile_target.add_color_attachment(bits=(16, 16, 0))
         self.tile_target.prepare_buffer()
 
         self.tile_target.set_shader_input("PrecomputedCoC", self.target_prefilter.color_tex)
 
-        self.tile_target_horiz = self.create_target("FetchHorizDOF")
+        self.tile_target_horiz = self.create_target("FetchHorizDOF", transient=True)
         self.tile_target_horiz.size = -self.tile_size
         self.tile_target_horiz.add_color_attachment(bits=(16, 16, 0))
         self.tile_target_horiz.prepare_buffer()
         self.tile_target_horiz.set_shader_input("SourceTex", self.tile_target.color_tex)
 
-        self.minmax_target = self.create_target("DoFNeighborMinMax")
+        self.minmax_target = self.create_target("DoFNeighborMinMax", transient=True)
         self.minmax_target.size = -self.tile_size
         self.minmax_target.add_color_attachment(bits=(16, 16, 0))
         self.minmax_target.prepare_buffer()
         self.minmax_target.set_shader_input("TileMinMax", self.tile_target_horiz.color_tex)
 
-        self.presort_target = self.create_target("DoFPresort")
+        self.presort_target = self.create_target("DoFPresort", transient=True)
         self.presort_target.add_color_attachment(bits=(11, 11, 10))
         self.presort_target.prepare_buffer()
         self.presort_target.set_shader_inputs(
             TileMinMax=self.minmax_target.color_tex,
             PrecomputedCoC=self.target_prefilter.color_tex)
 
-        self.target = self.create_target("ComputeDoF")
+        self.target = self.create_target("ComputeDoF", transient=True)
         # self.target.size = -2
         self.target.add_color_attachment(bits=16, alpha=True)
         self.target.prepare_buffer()
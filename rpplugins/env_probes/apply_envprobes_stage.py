@@ -25,7 +25,6 @@ THE SOFTWARE.
 """
 
 from rpcore.render_stage import RenderStage
-from rpcore.stages.ambient_stage import AmbientStage
 
 
 class ApplyEnvprobesStage(RenderStage):
@@ -34,6 +33,7 @@ class ApplyEnvprobesStage(RenderStage):
 
     required_inputs = ["EnvProbes"]
     required_pipes = ["GBuffer", "PerCellProbes", "CellIndices"]
+    required_by = {"AmbientStage": ["EnvmapAmbientSpec", "EnvmapAmbientDiff"]}
 
     @property
     def produced_pipes(self):
@@ -47,7 +47,6 @@ class ApplyEnvprobesStage(RenderStage):
         self.target.add_color_attachment(bits=16, alpha=True)
         self.target.add_aux_attachment(bits=16)
         self.target.prepare_buffer()
-        AmbientStage.required_pipes += ["EnvmapAmbientSpec", "EnvmapAmbientDiff"]
 
     def reload_shaders(self):
         self.target.shader = self.load_plugin_shader("apply_envprobes.frag.glsl")
@@ -43,28 +43,29 @@ class MotionBlurStage(RenderStage):
     def create(self):
 
         if self.per_object_blur:
-            self.tile_target = self.create_target("FetchVertDominantVelocity")
+            self.tile_target = self.create_target("FetchVertDominantVelocity", transient=True)
             self.tile_target.size = -1, -self.tile_size
             self.tile_target.add_color_attachment(bits=(16, 16, 0))
             self.tile_target.prepare_buffer()
 
-            self.tile_target_horiz = self.create_target("FetchHorizDominantVelocity")
+            self.tile_target_horiz = self.create_target(
+                "FetchHorizDominantVelocity", transient=True)
             self.tile_target_horiz.size = -self.tile_size
             self.tile_target_horiz.add_color_attachment(bits=(16, 16, 0))
             self.tile_target_horiz.prepare_buffer()
             self.tile_target_horiz.set_shader_input("SourceTex", self.tile_target.color_tex)
 
-            self.minmax_target = self.create_target("NeighborMinMax")
+            self.minmax_target = self.create_target("NeighborMinMax", transient=True)
             self.minmax_target.size = -self.tile_size
             self.minmax_target.add_color_attachment(bits=(16, 16, 0))
             self.minmax_target.prepare_buffer()
             self.minmax_target.set_shader_input("TileMinMax", self.tile_target_horiz.color_tex)
 
-            self.pack_target = self.create_target("PackBlurData")
+            self.pack_target = self.create_target("PackBlurData", transient=True)
             self.pack_target.add_color_attachment(bits=(16, 16, 0))
             self.pack_target.prepare_buffer()
 
-            self.target = self.create_target("ObjectMotionBlur")
+            self.target = self.create_target("ObjectMotionBlur", transient=True)
             self.target.add_color_attachment(bits=16)
             self.target.prepare_buffer()
             self.target.set_shader_inputs(
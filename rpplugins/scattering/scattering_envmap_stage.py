@@ -27,9 +27,6 @@ THE SOFTWARE.
 from rpcore.render_stage import RenderStage
 from rpcore.util.cubemap_filter import CubemapFilter
 
-from rpcore.stages.ambient_stage import AmbientStage
-from rpcore.stages.gbuffer_stage import GBufferStage
-
 
 class ScatteringEnvmapStage(RenderStage):
 
@@ -39,6 +36,12 @@ class ScatteringEnvmapStage(RenderStage):
     required_pipes = []
     required_inputs = ["DefaultSkydome", "DefaultEnvmap"]
 
+    # Make the stages use our cubemap textures
+    required_by = {
+        "AmbientStage": ["ScatteringIBLDiffuse", "ScatteringIBLSpecular"],
+        "GBufferStage": ["ScatteringIBLDiffuse", "ScatteringIBLSpecular"],
+    }
+
     @property
     def produced_pipes(self):
         return {
@@ -56,11 +59,6 @@ class ScatteringEnvmapStage(RenderStage):
 
         self.cubemap_filter.create()
 
-        # Make the stages use our cubemap textures
-        for stage in (AmbientStage, GBufferStage):
-            stage.required_pipes.append("ScatteringIBLDiffuse")
-            stage.required_pipes.append("ScatteringIBLSpecular")
-
     def reload_shaders(self):
         self.target_cube.shader = self.load_plugin_shader("scattering_envmap.frag.glsl")
         self.cubemap_filter.reload_shaders()
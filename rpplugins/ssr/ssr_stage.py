@@ -27,7 +27,6 @@ THE SOFTWARE.
 from panda3d.core import SamplerState
 
 from rpcore.render_stage import RenderStage
-from rpcore.stages.ambient_stage import AmbientStage
 
 
 class SSRStage(RenderStage):
@@ -38,6 +37,7 @@ class SSRStage(RenderStage):
     required_pipes = ["ShadedScene", "CombinedVelocity", "GBuffer",
                       "DownscaledDepth", "PreviousFrame::PostAmbientScene",
                       "PreviousFrame::SSRSpecular", "PreviousFrame::SceneDepth"]
+    required_by = {"AmbientStage": ["SSRSpecular"]}
 
     @property
     def produced_pipes(self):
@@ -52,16 +52,16 @@ class SSRStage(RenderStage):
         self.target.color_tex.set_minfilter(SamplerState.FT_nearest)
         self.target.color_tex.set_magfilter(SamplerState.FT_nearest)
 
-        self.target_velocity = self.create_target("ReflectionVelocity")
+        self.target_velocity = self.create_target("ReflectionVelocity", transient=True)
         self.target_velocity.add_color_attachment(bits=(16, 16, 0, 0))
         self.target_velocity.prepare_buffer()
         self.target_velocity.set_shader_input("TraceResult", self.target.color_tex)
 
-        self.target_reproject_lighting = self.create_target("CopyLighting")
+        self.target_reproject_lighting = self.create_target("CopyLighting", transient=True)
         self.target_reproject_lighting.add_color_attachment(bits=16, alpha=True)
         self.target_reproject_lighting.prepare_buffer()
 
-        self.target_upscale = self.create_target("UpscaleSSR")
+        self.target_upscale = self.create_target("UpscaleSSR", transient=True)
         self.target_upscale.add_color_attachment(bits=16, alpha=True)
         self.target_upscale.prepare_buffer()
         self.target_upscale.set_shader_inputs(
@@ -75,8 +75,6 @@ class SSRStage(RenderStage):
             CurrentTex=self.target_upscale.color_tex,
             VelocityTex=self.target_velocity.color_tex)
 
-        AmbientStage.required_pipes.append("SSRSpecular")
-
     def reload_shaders(self):
         self.target.shader = self.load_plugin_shader(
             "ssr_trace.frag.glsl")
@@ -46,12 +46,12 @@ class VolumetricsStage(RenderStage):
     def create(self):
 
         if self.enable_volumetric_shadows:
-            self.target = self.create_target("ComputeVolumetrics")
+            self.target = self.create_target("ComputeVolumetrics", transient=True)
             self.target.size = -2
             self.target.add_color_attachment(bits=16, alpha=True)
             self.target.prepare_buffer()
 
-            self.target_upscale = self.create_target("Upscale")
+            self.target_upscale = self.create_target("Upscale", transient=True)
             self.target_upscale.add_color_attachment(bits=16, alpha=True)
             self.target_upscale.prepare_buffer()
 
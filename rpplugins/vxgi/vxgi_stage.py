@@ -28,7 +28,6 @@ from __future__ import division
 from panda3d.core import LVecBase2i, Vec2
 
 from rpcore.render_stage import RenderStage
-from rpcore.stages.ambient_stage import AmbientStage
 
 
 class VXGIStage(RenderStage):
@@ -38,6 +37,9 @@ class VXGIStage(RenderStage):
                       "ScatteringIBLDiffuse", "PreviousFrame::VXGIPostSample",
                       "CombinedVelocity", "PreviousFrame::SceneDepth"]
 
+    # Make the ambient stage use the GI result
+    required_by = {"AmbientStage": ["VXGIDiffuse"]}
+
     @property
     def produced_pipes(self):
         return {
@@ -90,9 +92,6 @@ class VXGIStage(RenderStage):
         self.target_resolve.prepare_buffer()
         self.target_resolve.set_shader_input("CurrentTex", self.target_upscale_diff.color_tex)
 
-        # Make the ambient stage use the GI result
-        AmbientStage.required_pipes += ["VXGIDiffuse"]
-
     def reload_shaders(self):
         # self.target_spec.shader = self.load_plugin_shader("vxgi_specular.frag.glsl")
         self.target_diff.shader = self.load_plugin_shader("vxgi_diffuse.frag.glsl")
@@ -0,0 +1,79 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("direct.stdpy.file")
+
+from rplibs.yaml import bundle  # noqa
+
+
+@pytest.fixture
+def pipeline_dir(tmpdir):
+    """ Creates a pipeline base directory with a file for each bundle pattern,
+    and loads a bundle of it """
+    files = {
+        "config/pipeline.yaml": "value: 1\n",
+        "rpplugins/ao/config.yaml": "settings: []\n",
+        "effects/default.yaml": "vertex: {}\n",
+    }
+    for name, content in files.items():
+        tmpdir.join(name).write(content, ensure=True)
+    base_path = str(tmpdir)
+    bundle_path = str(tmpdir.join("bundle.pickle"))
+    assert bundle.build_bundle(base_path, bundle_path) == 3
+    assert bundle.load_bundle(bundle_path, {
+        bundle.CONFIG_ROOT: os.path.join(base_path, "config"),
+        bundle.BASE_ROOT: base_path,
+        "effects/": os.path.join(base_path, "effects"),
+    })
+    yield tmpdir
+    bundle.unload_bundle()
+
+
+def test_files_are_found_by_their_virtual_path(pipeline_dir):
+    assert bundle.lookup("/$$rpconfig/pipeline.yaml") == {"value": 1}
+    assert bundle.lookup("/$$rp/config/pipeline.yaml") == {"value": 1}
+    assert bundle.lookup("/$$rp/rpplugins/ao/config.yaml") == {"settings": []}
+    assert bundle.lookup("effects/default.yaml") == {"vertex": {}}
+    assert bundle.lookup("/$$rp/effects/missing.yaml") is None
+
+
+def test_relative_paths_do_not_depend_on_the_working_directory(pipeline_dir, monkeypatch):
+    monkeypatch.chdir(str(pipeline_dir.join("rpplugins")))
+    assert bundle.lookup("ao/config.yaml") == {"settings": []}
+    assert bundle.lookup("../config/pipeline.yaml") == {"value": 1}
+    monkeypatch.chdir(str(pipeline_dir.join("config")))
+    assert bundle.lookup("../rpplugins/ao/config.yaml") == {"settings": []}
+    assert bundle.lookup(str(pipeline_dir.join("config", "pipeline.yaml"))) == {"value": 1}
+
+
+def test_modified_files_are_not_served(pipeline_dir):
+    pipeline_dir.join("config", "pipeline.yaml").write("value: 22\n")
+    assert bundle.lookup("/$$rpconfig/pipeline.yaml") is None
+    assert bundle.get_bundle_stats()["stale"] >= 1
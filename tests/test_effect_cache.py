@@ -0,0 +1,239 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("panda3d.core")
+
+from panda3d.core import Filename, VirtualFileSystem  # noqa
+
+from rpcore.effect import Effect  # noqa
+from rpcore.util.shader_cache import ShaderCache  # noqa
+
+TEMPLATE = """#version 430
+%defines%
+%includes%
+{marker}
+void main() {{
+    %main%
+}}
+"""
+
+EFFECT = """
+fragment:
+    dependencies:
+        - includes/test_material.inc.glsl
+    main: |
+        float value = 1.0;
+"""
+
+
+@pytest.fixture
+def effect_src(tmp_path, monkeypatch):
+    """ Mounts a temporary directory with minimal shader templates as /$$rp,
+    and returns the path of an effect file stored in it """
+    templates = tmp_path / "rp" / "shader" / "templates"
+    templates.mkdir(parents=True)
+    for name in ["vertex.vert"] + [pass_id + ".frag" for pass_id in Effect._PASSES]:
+        (templates / (name + ".glsl")).write_text(TEMPLATE.format(marker="// original"))
+    includes = tmp_path / "rp" / "shader" / "includes"
+    includes.mkdir()
+    (includes / "test_material.inc.glsl").write_text("// material\n")
+    (tmp_path / "rp" / "effects").mkdir()
+    (tmp_path / "rp" / "effects" / "test.yaml").write_text(EFFECT)
+    (tmp_path / "temp").mkdir()
+
+    vfs = VirtualFileSystem.get_global_ptr()
+    vfs.mount(Filename.from_os_specific(str(tmp_path / "rp")), "/$$rp", 0)
+    vfs.mount(Filename.from_os_specific(str(tmp_path / "temp")), "/$$rptemp", 0)
+    monkeypatch.setattr(ShaderCache, "enabled", False)
+    Effect.clear_cache()
+    yield "/$$rp/effects/test.yaml"
+    Effect.clear_cache()
+    vfs.unmount_point("/$$rptemp")
+    vfs.unmount_point("/$$rp")
+
+
+def read_vfs_file(path):
+    return VirtualFileSystem.get_global_ptr().read_file(Filename(path), True).decode("utf-8")
+
+
+def test_load_is_cached(effect_src):
+    effect = Effect.load(effect_src, {})
+    assert Effect.load(effect_src, {}) is effect
+    assert Effect.load(effect_src, {"render_shadow": False}) is not effect
+    stats = Effect.get_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_cache_hits_do_not_read_the_effect_file(effect_src, monkeypatch):
+    effect = Effect.load(effect_src, {})
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Effect file was read on a cache hit")
+
+    monkeypatch.setattr(VirtualFileSystem, "read_file", fail)
+    monkeypatch.setattr("rpcore.effect.open", fail)
+    monkeypatch.setattr("rpcore.effect.load_yaml_file", fail)
+    assert Effect.load(effect_src, {}) is effect
+
+
+def test_modified_effect_file_is_loaded_again(effect_src, tmp_path):
+    effect = Effect.load(effect_src, {})
+    effect_file = tmp_path / "rp" / "effects" / "test.yaml"
+    effect_file.write_text(EFFECT.replace("1.0", "2.0"))
+    mtime = effect_file.stat().st_mtime + 10
+    os.utime(str(effect_file), (mtime, mtime))
+
+    reloaded = Effect.load(effect_src, {})
+    assert reloaded is not effect
+    assert reloaded.effect_hash != effect.effect_hash
+    assert reloaded.effect_hash.endswith(effect.effect_hash.split("-", 1)[1])
+
+
+def test_lru_eviction(effect_src, monkeypatch):
+    monkeypatch.setattr(Effect, "_CACHE_SIZE", 2)
+    first = Effect.load(effect_src, {"render_shadow": False})
+    Effect.load(effect_src, {"render_envmap": False})
+    Effect.load(effect_src, {"render_voxelize": False})
+    assert Effect.get_cache_stats()["evictions"] == 1
+    assert Effect.load(effect_src, {"render_shadow": False}) is not first
+
+
+def test_unchanged_sources_stay_cached(effect_src):
+    effect = Effect.load(effect_src, {})
+    assert Effect.invalidate_modified() == 0
+    assert Effect.load(effect_src, {}) is effect
+
+
+@pytest.mark.parametrize("changed_file", [
+    "shader/templates/gbuffer.frag.glsl",
+    "shader/includes/test_material.inc.glsl",
+])
+def test_changed_source_invalidates_effect(effect_src, tmp_path, changed_file):
+    effect = Effect.load(effect_src, {})
+    (tmp_path / "rp" / changed_file).write_text(TEMPLATE.format(marker="// changed"))
+    assert Effect.invalidate_modified() == 1
+    assert Effect.load(effect_src, {}) is not effect
+
+
+def make_pipeline(effect_src, applied):
+    """ Creates a pipeline without any of its managers, which applies the
+    given effect and appends each applied effect to the given list """
+    pytest.importorskip("panda3d._rplight")
+    from unittest import mock
+    from rpcore.render_pipeline import RenderPipeline
+
+    pipeline = RenderPipeline.__new__(RenderPipeline)
+    for manager in ("tag_mgr", "stage_mgr", "light_mgr", "plugin_mgr"):
+        setattr(pipeline, manager, mock.MagicMock())
+    pipeline.stage_mgr.reload_changed.return_value = []
+
+    pipeline._get_applied_effects = lambda: [(mock.MagicMock(), effect_src, None, 30)]
+    pipeline._build_effect_states = lambda effect, sort: effect.get_shader_obj("gbuffer")
+    pipeline._apply_effect = lambda nodepath, effect, sort, states: applied.append(effect)
+    return pipeline
+
+
+def test_reload_shaders_regenerates_changed_template(effect_src, tmp_path):
+    applied = []
+    pipeline = make_pipeline(effect_src, applied)
+    pipeline.reload_shaders()
+    before = applied[-1]
+    assert "// original" in read_vfs_file(before._generated_shader_paths["fragment-gbuffer"])
+
+    (tmp_path / "rp" / "shader" / "templates" / "gbuffer.frag.glsl").write_text(
+        TEMPLATE.format(marker="// changed"))
+    pipeline.reload_shaders()
+    after = applied[-1]
+    assert after is not before
+    assert "// changed" in read_vfs_file(after._generated_shader_paths["fragment-gbuffer"])
+
+
+def test_compile_time_covers_lazy_passes(effect_src):
+    effect = Effect.load(effect_src, {})
+    stats = Effect.get_cache_stats()
+    assert stats["load_time"] > 0.0
+    assert stats["compile_time"] == 0.0
+    assert effect.materialized_passes == ()
+
+    effect.get_shader_obj("gbuffer")
+    assert effect.materialized_passes == ("gbuffer",)
+    assert Effect.get_cache_stats()["compile_time"] > 0.0
+
+
+def test_invalidate_dependents(effect_src):
+    effect = Effect.load(effect_src, {})
+    without_shadows = Effect.load(effect_src, {"render_shadow": False})
+
+    assert Effect.invalidate_dependents(["/$$rp/shader/includes/unrelated.inc.glsl"]) == []
+    assert Effect.invalidate_dependents(["/$$rp/shader/templates/shadow.frag.glsl"]) == [effect]
+    assert Effect.load(effect_src, {"render_shadow": False}) is without_shadows
+
+    removed = Effect.invalidate_dependents(["includes/test_material.inc.glsl"])
+    assert removed == [without_shadows]
+
+
+def test_reload_changed_reapplies_dependent_effects(effect_src, tmp_path):
+    applied = []
+    pipeline = make_pipeline(effect_src, applied)
+    effect = Effect.load(effect_src, {})
+
+    assert pipeline.reload_changed(["/$$rp/shader/includes/unrelated.inc.glsl"]) == 0
+    assert applied == []
+
+    (tmp_path / "rp" / "shader" / "includes" / "test_material.inc.glsl").write_text("// new\n")
+    assert pipeline.reload_changed(["/$$rp/shader/includes/test_material.inc.glsl"]) == 1
+    assert len(applied) == 1 and applied[0] is not effect
+
+
+def test_removed_effects_leave_the_shader_graph(effect_src, monkeypatch):
+    from rpcore.util.shader_includes import ShaderDependencyGraph
+
+    graph = ShaderDependencyGraph()
+    monkeypatch.setattr(Effect, "SHADER_GRAPH", graph)
+    monkeypatch.setattr(Effect, "_CACHE_SIZE", 2)
+
+    def load(options):
+        effect = Effect.load(effect_src, options)
+        graph.register(effect, effect.source_files)
+        return effect
+
+    evicted = load({"render_shadow": False})
+    invalidated = load({"render_envmap": False})
+    cleared = load({"render_voxelize": False})
+    assert not graph.is_registered(evicted)
+    assert graph.is_registered(invalidated)
+
+    Effect.invalidate(effect_src, {"render_envmap": False})
+    assert not graph.is_registered(invalidated)
+
+    Effect.clear_cache()
+    assert not graph.is_registered(cleared)
+    assert graph.get_files() == []
@@ -0,0 +1,197 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("panda3d.core")
+pytest.importorskip("panda3d._rplight")
+
+from rpcore import gpu_command_queue  # noqa
+from rpcore.gpu_command_queue import GPUCommandQueue  # noqa
+
+COMMAND_BYTES = GPUCommandQueue.COMMAND_SIZE * 4
+
+
+class FakeCommandList(object):
+
+    """ Command list whose commands are single byte ids, each written as a
+    full command filled with its id """
+
+    def __init__(self):
+        self.commands = []
+
+    @property
+    def num_commands(self):
+        return len(self.commands)
+
+    def add(self, *commands):
+        self.commands.extend(commands)
+
+    def write_commands_to(self, pointer, limit):
+        written = self.commands[:limit]
+        del self.commands[:limit]
+        for index, command in enumerate(written):
+            pointer[index * COMMAND_BYTES:(index + 1) * COMMAND_BYTES] = \
+                bytes([command]) * COMMAND_BYTES
+        return len(written)
+
+
+class FakeBufferTexture(object):
+
+    """ Buffer texture storing its ram image in a bytearray """
+
+    def __init__(self, num_floats):
+        self.ram_image = bytearray(num_floats * 4)
+
+    def modify_ram_image(self):
+        return self.ram_image
+
+    def setup_buffer_texture(self, num_floats, *args):  # pylint: disable=unused-argument
+        self.ram_image = bytearray(num_floats * 4)
+
+
+
+class FakeImage(object):
+
+    @staticmethod
+    def create_buffer(name, num_floats, texture_format):  # pylint: disable=unused-argument
+        return FakeBufferTexture(num_floats)
+
+    @staticmethod
+    def convert_texture_format(texture_format):  # pylint: disable=unused-argument
+        return None, None
+
+
+class FakeRenderTarget(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakeGPUCommand(object):  # pylint: disable=too-few-public-methods
+
+    CMD_store_light = 1
+
+    @staticmethod
+    def get_uses_integer_packing():
+        return False
+
+
+def get_uploaded_commands(queue, count):
+    """ Returns the ids of the first commands in the command buffer """
+    ram_image = queue._data_texture.modify_ram_image()  # pylint: disable=protected-access
+    return [ram_image[index * COMMAND_BYTES] for index in range(count)]
+
+
+@pytest.fixture
+def make_queue(monkeypatch):
+    monkeypatch.setattr(gpu_command_queue, "GPUCommandList", FakeCommandList)
+    monkeypatch.setattr(gpu_command_queue, "GPUCommand", FakeGPUCommand)
+    monkeypatch.setattr(gpu_command_queue, "Image", FakeImage)
+    monkeypatch.setattr(gpu_command_queue, "RenderTarget", FakeRenderTarget)
+    monkeypatch.setattr(gpu_command_queue, "PTAUchar", SimpleNamespace(empty_array=bytearray))
+    monkeypatch.setattr(gpu_command_queue, "PTAInt",
+                        SimpleNamespace(empty_array=lambda size: [0] * size))
+
+    def make_queue(budget, max_budget):
+        pipeline = SimpleNamespace(command_queue_budget=budget, command_queue_max_budget=max_budget,
+                                   stage_mgr=SimpleNamespace(defines={}))
+        return GPUCommandQueue(pipeline)
+    return make_queue
+
+
+def test_budget_grows_under_backlog(make_queue):
+    queue = make_queue(4, 16)
+    queue.command_list.add(*range(1, 51))
+    processed = []
+    for _ in range(3):
+        queue.process_queue()
+        processed.append(queue.num_processed_commands)
+    assert processed == [8, 16, 16]
+    assert queue.current_commands_per_frame == 16
+    assert queue.num_backlog_commands == 10
+    assert queue.backlog_age == 3
+    stats = queue.get_stats()
+    assert stats["buffer_capacity"] == 16
+    assert stats["max_backlog"] == 42
+    assert stats["bytes_uploaded"] == 16 * COMMAND_BYTES
+
+
+def test_budget_shrinks_when_idle(make_queue):
+    queue = make_queue(4, 16)
+    queue.command_list.add(*range(1, 41))
+    for _ in range(3):
+        queue.process_queue()
+    assert queue.num_queued_commands == 0
+    assert queue.backlog_age == 0
+
+    budgets = []
+    for _ in range(3):
+        queue.process_queue()
+        budgets.append(queue.current_commands_per_frame)
+    assert budgets == [8, 4, 4]
+
+
+def test_priority_commands_are_executed_first(make_queue):
+    queue = make_queue(8, 8)
+    queue.command_list.add(1, 2, 3)
+    queue.priority_list.add(9, 10)
+    queue.process_queue()
+    assert queue.num_processed_commands == 5
+    assert get_uploaded_commands(queue, 5) == [9, 10, 1, 2, 3]
+
+
+def test_priority_commands_fill_the_budget_first(make_queue):
+    queue = make_queue(2, 2)
+    queue.command_list.add(1)
+    queue.priority_list.add(9, 10, 11)
+    queue.process_queue()
+    assert get_uploaded_commands(queue, 2) == [9, 10]
+    queue.process_queue()
+    assert get_uploaded_commands(queue, 2) == [11, 1]
+
+
+def test_barrier_blocks_priority_until_drained(make_queue):
+    queue = make_queue(2, 2)
+    queue.command_list.add(1, 2, 3, 4, 5)
+    assert queue.priority_available
+    queue.mark_barrier()
+
+    available = []
+    for _ in range(3):
+        assert not queue.priority_available
+        queue.process_queue()
+        available.append(queue.priority_available)
+    assert available == [False, False, True]
+
+    # Commands queued after the barrier do not block the priority list
+    queue.command_list.add(6, 7)
+    assert queue.priority_available
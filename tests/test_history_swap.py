@@ -0,0 +1,122 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import pytest
+
+pytest.importorskip("panda3d.core")
+
+from unittest import mock  # noqa
+
+from panda3d.core import Texture  # noqa
+
+from rpcore.stage_manager import StageManager  # noqa
+
+
+class FakeTarget(object):
+
+    """ Render target which only stores its color attachment """
+
+    def __init__(self, texture):
+        self.targets = {"color": texture}
+
+    @property
+    def color_tex(self):
+        return self.targets["color"]
+
+    def swap_color_attachment(self, texture):
+        previous = self.targets["color"]
+        self.targets["color"] = texture
+        return previous
+
+
+class FakeStage(object):
+
+    """ Stage which remembers the last value bound to each shader input """
+
+    def __init__(self, stage_id, required_pipes=(), targets=()):
+        self.stage_id = stage_id
+        self.required_pipes = list(required_pipes)
+        self._targets = {str(index): target for index, target in enumerate(targets)}
+        self.inputs = {}
+
+    def set_shader_input(self, name, value):
+        self.inputs[name] = value
+
+
+def make_texture(name):
+    texture = Texture(name)
+    texture.setup_2d_texture(4, 4, Texture.T_float, Texture.F_rgba16)
+    return texture
+
+
+@pytest.fixture
+def stage_mgr(monkeypatch):
+    monkeypatch.setattr(StageManager, "_load_stage_order", lambda self: None)
+    stage_mgr = StageManager(mock.MagicMock())
+    stage_mgr.ping_pong_history = True
+    return stage_mgr
+
+
+def test_history_swap_rebinds_all_readers(stage_mgr):
+    ambient_tex = make_texture("Ambient")
+    later_tex = make_texture("Later")
+    ambient_target = FakeTarget(ambient_tex)
+
+    # The ambient stage result is exposed as PostAmbientScene and ShadedScene,
+    # until a later stage produces ShadedScene again
+    future = FakeStage("FutureReader", ["FuturePipe::PostAmbientScene"])
+    ambient = FakeStage("AmbientStage", targets=[ambient_target])
+    reader = FakeStage("ShadedSceneReader", ["ShadedScene"])
+    previous = FakeStage("PreviousReader", ["PreviousFrame::PostAmbientScene"])
+    stage_mgr.stages = [future, ambient, reader, previous]
+
+    stage_mgr.previous_pipes["PostAmbientScene"] = make_texture("Prev")
+    stage_mgr._bind_pipes_to_stage(future)
+    stage_mgr.pipes.update(PostAmbientScene=ambient_tex, ShadedScene=ambient_tex)
+    stage_mgr._bind_pipes_to_stage(reader)
+    stage_mgr._bind_pipes_to_stage(previous)
+    stage_mgr.pipes["ShadedScene"] = later_tex
+
+    stage_mgr._create_previous_pipes()
+    stage_mgr._apply_future_bindings()
+    history = previous.inputs["Previous_PostAmbientScene"]
+    assert history is not ambient_tex
+    assert future.inputs["PostAmbientScene"] is history
+    assert reader.inputs["ShadedScene"] is ambient_tex
+
+    stage_mgr._swap_history()
+    assert ambient_target.color_tex is history
+    assert reader.inputs["ShadedScene"] is history
+    assert previous.inputs["Previous_PostAmbientScene"] is ambient_tex
+    assert future.inputs["PostAmbientScene"] is ambient_tex
+    assert stage_mgr.pipes["PostAmbientScene"] is history
+    assert stage_mgr.pipes["ShadedScene"] is later_tex
+
+    stage_mgr._swap_history()
+    assert ambient_target.color_tex is ambient_tex
+    assert reader.inputs["ShadedScene"] is ambient_tex
+    assert previous.inputs["Previous_PostAmbientScene"] is history
+    assert future.inputs["PostAmbientScene"] is history
@@ -0,0 +1,134 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import random
+
+import pytest
+
+from rpcore.util.light_budget import LightImportanceBudget
+
+ORIGIN = (0.0, 0.0, 0.0)
+
+
+def test_lights_are_ranked_by_importance():
+    budget = LightImportanceBudget(max_lights=4)
+    budget.add("near", (10.0, 0.0, 0.0), radius=5.0, energy=10.0)
+    budget.add("far", (40.0, 0.0, 0.0), radius=5.0, energy=10.0)
+    budget.add("bright", (40.0, 0.0, 0.0), radius=5.0, energy=100.0)
+    budget.add("large", (0.0, 20.0, 0.0), radius=20.0, energy=10.0)
+
+    assert budget.get_importance("near", ORIGIN) == pytest.approx(2.5)
+    assert budget.get_importance("large", ORIGIN) == pytest.approx(10.0)
+    assert budget.rank(ORIGIN) == ["large", "near", "bright", "far"]
+
+
+def test_rank_matches_brute_force_across_cells():
+    rng = random.Random(4)
+    budget = LightImportanceBudget(max_lights=25, cell_size=50.0)
+    for index in range(500):
+        budget.add(index, [rng.uniform(-1000.0, 1000.0) for _ in range(3)],
+                   rng.uniform(1.0, 30.0), rng.uniform(1.0, 100.0))
+
+    camera_pos = (120.0, -40.0, 15.0)
+    expected = sorted(range(500), key=lambda key: budget.get_importance(key, camera_pos),
+                      reverse=True)
+    assert budget.rank(camera_pos) == expected[:25]
+
+
+def test_only_the_most_important_lights_get_activated():
+    budget = LightImportanceBudget(max_lights=2)
+    for index in range(4):
+        budget.add(index, (10.0 * (index + 1), 0.0, 0.0), radius=5.0, energy=10.0)
+
+    activated, hibernated = budget.update(ORIGIN)
+    assert activated == [0, 1]
+    assert hibernated == []
+    assert budget.active == {0, 1}
+
+    budget.remove(0)
+    activated, hibernated = budget.update(ORIGIN)
+    assert activated == [2]
+    assert hibernated == []
+    assert budget.active == {1, 2}
+
+
+def test_zero_budget_hibernates_all_lights():
+    budget = LightImportanceBudget(max_lights=1)
+    budget.add("light", (10.0, 0.0, 0.0), radius=5.0, energy=10.0)
+    budget.update(ORIGIN)
+    budget.max_lights = 0
+    assert budget.update(ORIGIN, force=True) == ([], ["light"])
+    assert budget.active == set()
+
+
+def count_switches(hysteresis):
+    """ Moves the camera back and forth between two equally important lights,
+    and returns how often the active light changed """
+    budget = LightImportanceBudget(max_lights=1, hysteresis=hysteresis)
+    budget.add("left", (-10.0, 0.0, 0.0), radius=5.0, energy=10.0)
+    budget.add("right", (10.0, 0.0, 0.0), radius=5.0, energy=10.0)
+    budget.update((-0.5, 0.0, 0.0))
+    assert budget.active == {"left"}
+
+    switches = 0
+    for frame in range(10):
+        # The importance ratio of both lights is (10.5 / 9.5) ^ 2 ~ 1.22
+        camera_x = 0.5 if frame % 2 == 0 else -0.5
+        activated, hibernated = budget.update((camera_x, 0.0, 0.0), force=True)
+        assert len(activated) == len(hibernated)
+        switches += len(activated)
+    return switches
+
+
+def test_hysteresis_prevents_toggling_near_the_cutoff():
+    assert count_switches(hysteresis=0.0) == 10
+    assert count_switches(hysteresis=0.25) == 0
+
+
+def test_hysteresis_is_overcome_by_clearly_more_important_lights():
+    budget = LightImportanceBudget(max_lights=1, hysteresis=0.25)
+    budget.add("active", (10.0, 0.0, 0.0), radius=5.0, energy=10.0)
+    budget.update(ORIGIN)
+
+    budget.add("slightly_brighter", (10.0, 0.0, 0.0), radius=5.0, energy=12.0)
+    assert budget.update(ORIGIN) == ([], [])
+
+    budget.add("much_brighter", (10.0, 0.0, 0.0), radius=5.0, energy=13.0)
+    assert budget.update(ORIGIN) == (["much_brighter"], ["active"])
+
+
+def test_small_camera_movements_do_not_rank_again():
+    budget = LightImportanceBudget(max_lights=1, cell_size=100.0)
+    budget.add("left", (-10.0, 0.0, 0.0), radius=5.0, energy=10.0)
+    budget.add("right", (10.0, 0.0, 0.0), radius=5.0, energy=10.0)
+    budget.update((-5.0, 0.0, 0.0))
+    assert budget.active == {"left"}
+
+    # update_distance is a tenth of the cell size
+    assert budget.update((4.0, 0.0, 0.0)) == ([], [])
+    assert budget.update((5.0, 0.0, 0.0)) == (["right"], ["left"])
+    assert budget.update((-4.0, 0.0, 0.0)) == ([], [])
+    assert budget.update((-4.0, 0.0, 0.0), force=True) == (["left"], ["right"])
@@ -0,0 +1,154 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import math
+
+import pytest
+
+from rpcore.util.light_culling import (LightCullingGrid, cull_lights, estimate_buffer_sizes,
+                                       pack_light_data, LIGHT_DATA_SIZE, LT_POINT_LIGHT)
+
+# The view space is the identity, and the frustum spans 45 degrees to each
+# side of the +z axis, in the order (-1, -1), (1, -1), (-1, 1), (1, 1)
+VIEW_MAT = [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+FRUSTUM_DIRECTIONS = [(-1.0, -1.0, 1.0, 1.0), (1.0, -1.0, 1.0, 1.0),
+                      (-1.0, 1.0, 1.0, 1.0), (1.0, 1.0, 1.0, 1.0)]
+
+
+def make_grid(max_lights_per_cell=8):
+    return LightCullingGrid(2, 2, num_slices=4, max_distance=100.0,
+                            max_lights_per_cell=max_lights_per_cell)
+
+
+def make_point_light(tile_x, tile_y, distance, radius=0.5):
+    """ Returns the light data of a point light on the center ray of the given
+    tile of a 2x2 grid, at the given distance from the camera """
+    direction = (tile_x - 0.5, tile_y - 0.5, 1.0)
+    length = math.sqrt(sum(component * component for component in direction))
+    row = [0.0] * LIGHT_DATA_SIZE
+    row[0] = LT_POINT_LIGHT
+    row[3:6] = [component / length * distance for component in direction]
+    row[9] = radius
+    return row
+
+
+def test_lights_are_stored_in_their_cells():
+    grid = make_grid()
+    light_data = [make_point_light(1, 1, 10.0), make_point_light(0, 0, 50.0),
+                  [0.0] * LIGHT_DATA_SIZE]
+    result = cull_lights(light_data, grid, VIEW_MAT, FRUSTUM_DIRECTIONS, use_numpy=False)
+
+    # Slice 0 ends at 13.8 and slice 2 spans 33.3 to 60.9 units
+    assert result.cell_lights == {(1, 1, 0): [0], (0, 0, 2): [1]}
+    assert result.num_frustum_lights == 2
+    assert result.num_processed_cells == grid.num_cells
+    for cell_slice in range(grid.num_slices):
+        for tile_y in range(2):
+            for tile_x in range(2):
+                expected = 1 if (tile_x, tile_y, cell_slice) in result.cell_lights else 0
+                assert result.get_count(tile_x, tile_y, cell_slice) == expected
+    assert result.overflow_cells == []
+
+
+def test_distant_lights_are_culled():
+    result = cull_lights([make_point_light(1, 1, 150.0)], make_grid(), VIEW_MAT,
+                         FRUSTUM_DIRECTIONS, use_numpy=False)
+    assert result.num_frustum_lights == 0
+    assert result.cell_lights == {}
+
+
+def test_lights_beyond_the_cell_capacity_overflow():
+    grid = make_grid(max_lights_per_cell=2)
+    light_data = [make_point_light(1, 1, 10.0) for _ in range(3)]
+    result = cull_lights(light_data, grid, VIEW_MAT, FRUSTUM_DIRECTIONS, use_numpy=False)
+
+    assert result.overflow_cells == [(1, 1, 0)]
+    assert result.get_count(1, 1, 0) == 3
+    assert result.cell_lights[(1, 1, 0)] == [0, 1]
+    stats = result.get_stats()
+    assert stats["num_overflow_cells"] == 1
+    assert stats["max_lights_per_cell"] == 3
+    assert stats["num_stored_lights"] == 2
+
+
+def test_only_used_cells_are_processed():
+    light_data = [make_point_light(1, 1, 10.0), make_point_light(0, 0, 50.0)]
+    result = cull_lights(light_data, make_grid(), VIEW_MAT, FRUSTUM_DIRECTIONS,
+                         used_cells={(1, 1, 0), (1, 0, 0)}, use_numpy=False)
+    assert result.cell_lights == {(1, 1, 0): [0]}
+    assert result.num_processed_cells == 2
+    assert result.num_tests == 2 * 2 * 5
+
+
+def test_buffer_sizes():
+    sizes = estimate_buffer_sizes(make_grid(), max_lights=100)
+    assert sizes == {
+        "CellGridFlags": 16,
+        "CellList": 17 * 4,
+        "CellIndices": 16 * 4,
+        "FrustumLights": 100 * 2,
+        "PerCellLights": 16 * 8 * 2,
+        "PerCellLightCounts": 16 * 4,
+        "GroupedPerCellLights": 16 * (8 + 4) * 2,
+        "GroupedPerCellLightsCount": 16 * (1 + 4) * 2,
+    }
+
+
+def test_numpy_matches_pure_python():
+    pytest.importorskip("numpy")
+    light_data = [make_point_light(index % 2, index // 2 % 2, 5.0 + index * 7.0,
+                                   1.0 + index % 3 * 6.0)
+                  for index in range(12)]
+    grid = make_grid(max_lights_per_cell=2)
+    expected = cull_lights(light_data, grid, VIEW_MAT, FRUSTUM_DIRECTIONS, use_numpy=False)
+    result = cull_lights(light_data, grid, VIEW_MAT, FRUSTUM_DIRECTIONS, use_numpy=True)
+    assert result.cell_lights == expected.cell_lights
+    assert result.overflow_cells == expected.overflow_cells
+    assert result.num_processed_cells == expected.num_processed_cells
+    for cell_slice in range(grid.num_slices):
+        for tile_y in range(2):
+            for tile_x in range(2):
+                assert result.get_count(tile_x, tile_y, cell_slice) == \
+                    expected.get_count(tile_x, tile_y, cell_slice)
+
+
+def test_packed_light_data_layout():
+    pytest.importorskip("panda3d._rplight")
+    from panda3d._rplight import RPPointLight
+
+    light = RPPointLight()
+    light.pos = (1.0, 2.0, 3.0)
+    light.radius = 5.0
+    light.inner_radius = 0.5
+    light_data, int_packing = pack_light_data([light])
+
+    assert len(light_data) == 1 and len(light_data[0]) == LIGHT_DATA_SIZE
+    result = cull_lights(light_data, make_grid(), VIEW_MAT, FRUSTUM_DIRECTIONS,
+                         int_packing=int_packing, use_numpy=False)
+    assert result.num_frustum_lights == 1
+    assert light_data[0][3:6] == pytest.approx((1.0, 2.0, 3.0))
+    assert light_data[0][9:11] == pytest.approx((5.0, 0.5))
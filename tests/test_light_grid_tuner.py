@@ -0,0 +1,101 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+from rpcore.util.light_culling import LIGHT_DATA_SIZE, LT_POINT_LIGHT, CULL_THREADS, RAY_DIRS
+from rpcore.util.light_grid_tuner import CameraPose, LightGridTuner
+
+VIEW_MAT = [[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+FRUSTUM_DIRECTIONS = [(-1.0, -1.0, 1.0, 1.0), (1.0, -1.0, 1.0, 1.0),
+                      (-1.0, 1.0, 1.0, 1.0), (1.0, 1.0, 1.0, 1.0)]
+
+# Amount of lights sharing the same cells
+DENSITY = 6
+
+
+def make_tuner(depth_samples=None):
+    """ Returns a tuner for DENSITY point lights at the same position in
+    front of the camera """
+    row = [0.0] * LIGHT_DATA_SIZE
+    row[0] = LT_POINT_LIGHT
+    row[3:6] = [0.0, 0.0, 10.0]
+    row[9] = 5.0
+    pose = CameraPose(VIEW_MAT, FRUSTUM_DIRECTIONS, depth_samples)
+    return LightGridTuner([list(row) for _ in range(DENSITY)], [pose], (64, 32),
+                          max_distance=100.0)
+
+
+def sweep(tuner):
+    return tuner.sweep(tile_sizes=[(16, 16), (32, 32)], slice_counts=[4, 8],
+                       max_lights_per_cell=[DENSITY - 2, DENSITY + 2, DENSITY * 4])
+
+
+def test_configurations_below_the_density_overflow():
+    reports = sweep(make_tuner())
+    assert len(reports) == 2 * 2 * 3
+    for report in reports:
+        assert report["max_lights_in_cell"] == DENSITY
+        if report["settings"]["max_lights_per_cell"] < DENSITY:
+            assert report["overflow_cells"] > 0
+        else:
+            assert report["overflow_cells"] == 0
+
+
+def test_cheapest_configuration_without_overflow_is_recommended():
+    tuner = make_tuner()
+    reports = sweep(tuner)
+    recommended = tuner.recommend(reports)
+
+    assert recommended["overflow_cells"] == 0
+    assert recommended["settings"]["max_lights_per_cell"] == DENSITY + 2
+    assert recommended["cost"] == min(report["cost"] for report in reports
+                                      if report["overflow_cells"] == 0)
+
+    # Configurations dropping lights are cheaper, since less lights get shaded
+    assert min(report["cost"] for report in reports) < recommended["cost"]
+
+
+def test_memory_budget_limits_the_recommendation():
+    tuner = make_tuner()
+    reports = sweep(tuner)
+    tuner.memory_budget = min(report["memory"] for report in reports
+                              if report["overflow_cells"] == 0)
+    recommended = tuner.recommend(reports)
+    assert recommended["memory"] == tuner.memory_budget
+    assert recommended["overflow_cells"] == 0
+
+
+def test_depth_samples_restrict_the_culled_cells():
+    reports = sweep(make_tuner(depth_samples=[(0.5, 0.5, 10.0)]))
+    for report in reports:
+        # Only the cell containing the sample is culled
+        assert report["cull_cost"] == DENSITY * len(RAY_DIRS) + CULL_THREADS
+        assert report["max_lights_in_cell"] == DENSITY
+
+
+def test_report_table_has_a_line_per_configuration():
+    reports = sweep(make_tuner())
+    assert len(LightGridTuner.format_report(reports).splitlines()) == len(reports) + 1
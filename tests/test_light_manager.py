@@ -0,0 +1,178 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+# pylint: disable=protected-access
+
+from collections import namedtuple
+
+import pytest
+
+pytest.importorskip("panda3d.core")
+pytest.importorskip("panda3d._rplight")
+
+from rpcore.light_manager import LightManager  # noqa
+
+Position = namedtuple("Position", "x y z")
+
+
+class FakeLight(object):  # pylint: disable=too-few-public-methods
+
+    """ Light which only provides what the light budget ranks lights by """
+
+    def __init__(self, x, energy=10.0):
+        self.pos = Position(x, 0.0, 0.0)
+        self.radius = 10.0
+        self.energy = energy
+
+
+class FakeInternalManager(object):
+
+    """ Internal light manager which records which command list each light
+    was added to """
+
+    def __init__(self):
+        self.lights = {}
+        self.command_list = None
+
+    @property
+    def max_light_index(self):
+        return len(self.lights) - 1
+
+    def set_command_list(self, command_list):
+        self.command_list = command_list
+
+    def add_light(self, light):
+        assert id(light) not in self.lights, "Light was added twice"
+        self.lights[id(light)] = self.command_list
+
+    def remove_light(self, light):
+        assert id(light) in self.lights, "Light was not added"
+        del self.lights[id(light)]
+
+
+class FakeCommandQueue(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self):
+        self.command_list = "regular"
+        self.priority_list = "priority"
+        self.priority_available = True
+        self.barriers = 0
+
+    def mark_barrier(self):
+        self.barriers += 1
+        self.priority_available = False
+
+
+def make_light_manager():
+    light_mgr = LightManager.__new__(LightManager)
+    light_mgr.light_budget = None
+    light_mgr._budget_lights = {}
+    light_mgr.internal_mgr = FakeInternalManager()
+    light_mgr.cmd_queue = FakeCommandQueue()
+    light_mgr.internal_mgr.set_command_list(light_mgr.cmd_queue.command_list)
+    light_mgr.pta_max_light_index = [0]
+    return light_mgr
+
+
+@pytest.fixture
+def light_mgr(monkeypatch):
+    light_mgr = make_light_manager()
+    view_bounds = []
+    monkeypatch.setattr(light_mgr, "_get_view_bounds", lambda: view_bounds.append(1))
+    monkeypatch.setattr(light_mgr, "_is_in_view", lambda light, bounds: light.pos.x > 0.0)
+    light_mgr.view_bounds = view_bounds
+    return light_mgr
+
+
+def test_visible_lights_are_prioritized(light_mgr):
+    visible, hidden = FakeLight(1.0), FakeLight(-1.0)
+    assert light_mgr.add_lights([visible, hidden]) == 2
+    assert light_mgr.internal_mgr.lights == {id(visible): "priority", id(hidden): "regular"}
+    assert light_mgr.internal_mgr.command_list == "regular"
+    assert light_mgr.view_bounds == [1]
+    assert light_mgr.pta_max_light_index[0] == 1
+
+
+def test_view_bounds_are_skipped_without_priority_lane(light_mgr):
+    light = FakeLight(1.0)
+    light_mgr.remove_lights([])
+    light_mgr.add_lights([light])
+    assert light_mgr.internal_mgr.lights == {id(light): "regular"}
+    assert light_mgr.view_bounds == []
+
+
+def test_single_lights_skip_the_view_bounds(light_mgr):
+    regular, prioritized = FakeLight(1.0), FakeLight(-1.0)
+    light_mgr.add_light(regular)
+    light_mgr.add_light(prioritized, priority=True)
+    assert light_mgr.internal_mgr.lights == {id(regular): "regular",
+                                             id(prioritized): "priority"}
+    assert light_mgr.internal_mgr.command_list == "regular"
+    assert light_mgr.view_bounds == []
+    assert light_mgr.pta_max_light_index[0] == 1
+
+
+def test_lights_added_before_the_budget_can_be_removed(light_mgr):
+    unmanaged = FakeLight(1.0)
+    light_mgr.add_light(unmanaged)
+    light_mgr.enable_light_budget(1)
+    managed = FakeLight(2.0)
+    light_mgr.add_light(managed)
+
+    assert light_mgr.remove_lights([unmanaged, managed]) == 2
+    assert light_mgr.internal_mgr.lights == {}
+    assert light_mgr.light_budget.num_lights == 0
+
+
+def test_hibernated_lights_are_only_removed_from_the_budget(light_mgr):
+    light_mgr.enable_light_budget(1)
+    near, far = FakeLight(1.0), FakeLight(50.0)
+    light_mgr.add_lights([near, far])
+    light_mgr._update_light_budget(Position(0.0, 0.0, 0.0))
+    assert set(light_mgr.internal_mgr.lights) == {id(near)}
+
+    assert light_mgr.remove_lights([far, near]) == 2
+    assert light_mgr.internal_mgr.lights == {}
+
+
+def test_enabling_the_budget_again_keeps_its_lights(light_mgr):
+    light_mgr.enable_light_budget(1)
+    near, far = FakeLight(1.0), FakeLight(50.0)
+    light_mgr.add_lights([near, far])
+    light_mgr._update_light_budget(Position(0.0, 0.0, 0.0))
+
+    light_mgr.enable_light_budget(2)
+    assert light_mgr.light_budget.num_lights == 2
+    light_mgr._update_light_budget(Position(0.0, 0.0, 0.0))
+    assert set(light_mgr.internal_mgr.lights) == {id(near), id(far)}
+
+    light_mgr.enable_light_budget(1)
+    light_mgr._update_light_budget(Position(0.0, 0.0, 0.0))
+    assert set(light_mgr.internal_mgr.lights) == {id(near)}
+
+    light_mgr.disable_light_budget()
+    assert set(light_mgr.internal_mgr.lights) == {id(near), id(far)}
+    assert light_mgr.remove_lights([near, far]) == 2
@@ -0,0 +1,73 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import pytest
+
+pytest.importorskip("panda3d.core")
+
+from rpcore.util import smooth_connected_curve  # noqa
+from rpcore.util.smooth_connected_curve import SmoothConnectedCurve  # noqa
+
+
+@pytest.fixture
+def fitters(monkeypatch):
+    """ Counts the CurveFitter instances created by the curves """
+    created = []
+    curve_fitter = smooth_connected_curve.CurveFitter
+
+    def make_fitter():
+        created.append(curve_fitter())
+        return created[-1]
+
+    monkeypatch.setattr(smooth_connected_curve, "CurveFitter", make_fitter)
+    return created
+
+
+def test_curves_are_fitted_once_when_first_evaluated(fitters):
+    curves = [SmoothConnectedCurve() for _ in range(5)]
+    for index, curve in enumerate(curves):
+        curve.control_points = [[0.2, 0.1 * index], [0.7, 0.5]]
+        curve.set_cv_value(0, 0.3, 0.2)
+        for _ in range(3):
+            curve.build_curve()
+    assert not fitters
+    assert [curve.fit_count for curve in curves] == [0] * 5
+
+    for curve in curves:
+        curve.get_value(0.5)
+        curve.get_value(0.25)
+    assert len(fitters) == 5
+    assert [curve.fit_count for curve in curves] == [1] * 5
+
+
+def test_changed_curves_are_fitted_again(fitters):
+    curve = SmoothConnectedCurve()
+    curve.set_single_value(0.25)
+    assert curve.get_value(0.5) == pytest.approx(0.25, abs=1e-3)
+    curve.set_single_value(0.75)
+    assert curve.get_value(0.5) == pytest.approx(0.75, abs=1e-3)
+    assert curve.fit_count == 2
+    assert len(fitters) == 2
@@ -0,0 +1,65 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import pytest
+
+pytest.importorskip("direct.stdpy.file")
+
+from rplibs.yaml import snapshot_cache  # noqa
+
+
+@pytest.fixture
+def parses():
+    """ Records the content passed to the parse function """
+    snapshot_cache.clear_snapshots()
+    parsed = []
+
+    def parse(content):
+        parsed.append(content)
+        return {"content": content.decode("utf-8")}
+
+    yield parsed, parse
+    snapshot_cache.clear_snapshots()
+
+
+def test_unchanged_files_are_parsed_once(parses):
+    parsed, parse = parses
+    first = snapshot_cache.load_cached("config.yaml", b"a: 1", parse)
+    first["content"] = "modified"
+    assert snapshot_cache.load_cached("config.yaml", b"a: 1", parse) == {"content": "a: 1"}
+    assert parsed == [b"a: 1"]
+
+
+def test_only_the_latest_version_of_a_file_is_kept(parses):
+    parsed, parse = parses
+    for version in range(5):
+        snapshot_cache.load_cached("config.yaml", "a: {}".format(version).encode("utf-8"), parse)
+    snapshot_cache.load_cached("other.yaml", b"b: 1", parse)
+    assert len(snapshot_cache._memory_snapshots) == 2  # pylint: disable=protected-access
+
+    snapshot_cache.load_cached("config.yaml", b"a: 4", parse)
+    snapshot_cache.load_cached("config.yaml", b"a: 0", parse)
+    assert len(parsed) == 7
@@ -0,0 +1,160 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import pytest
+
+from rpcore.util.stage_graph import find_dead_stages, get_pipe_lifetimes, get_required_by
+
+
+def make_stage(stage_id, required_pipes=(), produced_pipes=(), required_inputs=(),
+               required_by=None, produced_defines=None):
+    """ Creates a stage of a new class with the given id, whose produced pipes
+    are only available through a property, like for most real stages, which
+    fails unless the stage was created """
+    produced = list(produced_pipes)
+
+    def get_produced_pipes(self):
+        return {name: self.targets[name] for name in produced}
+
+    stage_cls = type(stage_id, (object,), {
+        "required_pipes": list(required_pipes),
+        "required_inputs": list(required_inputs),
+        "required_by": required_by or {},
+        "produced_inputs": {},
+        "produced_defines": produced_defines or {},
+        "produced_pipes": property(get_produced_pipes),
+    })
+    stage = stage_cls()
+    stage.stage_id = stage_id
+    return stage
+
+
+def make_pipeline(*extra_stages):
+    """ Returns a list of stages resembling the pipeline, with the given
+    stages inserted before the ambient stage """
+    gbuffer = make_stage("GBufferStage", produced_pipes=["GBuffer"])
+    lights = make_stage("ApplyLightsStage", ["GBuffer"], ["ShadedScene"])
+    ambient = make_stage("AmbientStage", ["ShadedScene", "GBuffer"], ["ShadedScene"])
+    final = make_stage("FinalStage", ["ShadedScene"])
+    return [gbuffer, lights] + list(extra_stages) + [ambient, final]
+
+
+def test_unused_stage_is_dead():
+    unused = make_stage("UnusedStage", ["GBuffer"], ["Unused"])
+    assert find_dead_stages(make_pipeline(unused)) == [unused]
+
+
+def test_stages_feeding_the_final_stage_are_live():
+    assert find_dead_stages(make_pipeline()) == []
+
+
+def test_required_by_keeps_stage_alive():
+    # Like the SSR, VXGI and ApplyEnvprobes stages, which make the ambient
+    # stage read their result
+    ssr = make_stage("SSRStage", ["ShadedScene", "GBuffer"], ["SSRSpecular"],
+                     required_by={"AmbientStage": ["SSRSpecular"]})
+    vxgi = make_stage("VXGIStage", ["GBuffer"], ["VXGIDiffuse"],
+                      required_by={"AmbientStage": ["VXGIDiffuse"]})
+    assert find_dead_stages(make_pipeline(ssr, vxgi)) == []
+
+
+def test_required_by_producer_dependencies_are_live():
+    trace = make_stage("TraceStage", ["GBuffer"], ["Trace"])
+    ssr = make_stage("SSRStage", ["Trace"], ["SSRSpecular"],
+                     required_by={"AmbientStage": ["SSRSpecular"]})
+    assert find_dead_stages(make_pipeline(trace, ssr)) == []
+
+
+def test_required_by_for_missing_stage_is_dead():
+    ssr = make_stage("SSRStage", ["GBuffer"], ["SSRSpecular"],
+                     required_by={"MissingStage": ["SSRSpecular"]})
+    assert find_dead_stages(make_pipeline(ssr)) == [ssr]
+
+
+def test_previous_frame_consumer_keeps_stage_alive():
+    # The producer runs after the consumer, which reads the previous frame
+    history = make_stage("HistoryStage", ["PreviousFrame::Velocity"], ["History"])
+    velocity = make_stage("VelocityStage", ["GBuffer"], ["Velocity"])
+    stages = make_pipeline(history, velocity)
+    stages[-2].required_pipes.append("History")
+    assert find_dead_stages(stages) == []
+
+
+def test_stages_with_defines_are_kept():
+    defines = make_stage("DefineStage", produced_pipes=["Unused"],
+                         produced_defines={"HAVE_FEATURE": 1})
+    assert find_dead_stages(make_pipeline(defines)) == []
+
+
+def test_get_required_by():
+    ssr = make_stage("SSRStage", required_by={"AmbientStage": ["SSRSpecular"]})
+    envmap = make_stage("EnvmapStage", required_by={
+        "AmbientStage": ["IBLDiffuse"], "GBufferStage": ["IBLDiffuse"]})
+    assert get_required_by([ssr, envmap]) == {
+        "AmbientStage": ["SSRSpecular", "IBLDiffuse"], "GBufferStage": ["IBLDiffuse"]}
+
+
+def test_pipe_lifetimes_include_required_by():
+    ssr = make_stage("SSRStage", ["GBuffer"], ["SSRSpecular"],
+                     required_by={"AmbientStage": ["SSRSpecular"]})
+    stages = make_pipeline(ssr)
+    lifetimes = get_pipe_lifetimes(stages)
+    assert lifetimes[(2, "SSRSpecular")] == 3
+    assert lifetimes[(0, "GBuffer")] == 3
+    assert lifetimes[(3, "ShadedScene")] == 4
+
+
+def test_pipe_lifetimes_of_other_frames():
+    velocity = make_stage("VelocityStage", ["GBuffer", "FuturePipe::Exposure"], ["Velocity"])
+    exposure = make_stage("ExposureStage", ["PreviousFrame::Velocity"], ["Exposure"])
+    lifetimes = get_pipe_lifetimes(make_pipeline(velocity, exposure))
+    assert lifetimes[(2, "Velocity")] is None
+    assert lifetimes[(3, "Exposure")] is None
+
+
+def test_stage_manager_prunes_and_adds_required_by_pipes(monkeypatch):
+    pytest.importorskip("panda3d.core")
+    from unittest import mock
+    from rpcore.globals import Globals
+    from rpcore.stage_manager import StageManager
+
+    monkeypatch.setattr(Globals, "resolution", None, raising=False)
+    ssr = make_stage("SSRStage", ["GBuffer"], ["SSRSpecular"],
+                     required_by={"AmbientStage": ["SSRSpecular"]})
+    unused = make_stage("UnusedStage", ["GBuffer"], ["Unused"])
+    stages = make_pipeline(ssr, unused)
+
+    monkeypatch.setattr(StageManager, "_load_stage_order", lambda self: None)
+    stage_mgr = StageManager(mock.MagicMock())
+    stage_mgr.stages = list(stages)
+    stage_mgr.pipeline.plugin_mgr.instances = {}
+    stage_mgr._prune_dead_stages()
+    stage_mgr._add_required_by_pipes()
+
+    ambient = stage_mgr.get_stage("AmbientStage")
+    assert stage_mgr.pruned_stages == [unused]
+    assert ssr in stage_mgr.stages
+    assert ambient.required_pipes == ["ShadedScene", "GBuffer", "SSRSpecular"]
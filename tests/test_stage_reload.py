@@ -0,0 +1,114 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import pytest
+
+pytest.importorskip("panda3d.core")
+
+from unittest import mock  # noqa
+
+from panda3d.core import Filename, VirtualFileSystem  # noqa
+
+from rpcore.loader import RPLoader  # noqa
+from rpcore.render_stage import RenderStage  # noqa
+from rpcore.stage_manager import StageManager  # noqa
+
+SHADERS = {
+    "includes/common.inc.glsl": "// common\n",
+    "includes/lighting.inc.glsl": "#pragma include \"common.inc.glsl\"\n",
+    "default_post_process.vert.glsl": "#pragma include \"includes/common.inc.glsl\"\n",
+    "ambient.frag.glsl": "#pragma include \"includes/common.inc.glsl\"\n",
+    "lighting.frag.glsl": "#pragma include \"includes/lighting.inc.glsl\"\n",
+}
+
+
+class AmbientStage(RenderStage):
+
+    def reload_shaders(self):
+        self.load_shader("ambient.frag.glsl")
+
+
+class LightingStage(RenderStage):
+
+    def reload_shaders(self):
+        self.load_shader("lighting.frag.glsl")
+
+
+@pytest.fixture
+def shader_dir(tmp_path, monkeypatch):
+    """ Mounts a temporary directory with a few shaders as /$$rp/shader, and
+    returns its path """
+    for name, content in SHADERS.items():
+        path = tmp_path / "shader" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    (tmp_path / "temp").mkdir()
+
+    vfs = VirtualFileSystem.get_global_ptr()
+    vfs.mount(Filename.from_os_specific(str(tmp_path / "shader")), "/$$rp/shader", 0)
+    vfs.mount(Filename.from_os_specific(str(tmp_path / "temp")), "/$$rptemp", 0)
+    monkeypatch.setattr(RPLoader, "load_shader", mock.Mock(side_effect=lambda *args: args))
+    yield tmp_path / "shader"
+    vfs.unmount_point("/$$rptemp")
+    vfs.unmount_point("/$$rp/shader")
+
+
+@pytest.fixture
+def stage_mgr(shader_dir, monkeypatch):
+    monkeypatch.setattr(StageManager, "_load_stage_order", lambda self: None)
+    pipeline = mock.MagicMock()
+    stage_mgr = StageManager(pipeline)
+    stage_mgr.stages = [AmbientStage(pipeline), LightingStage(pipeline)]
+    stage_mgr.reload_shaders()
+    return stage_mgr
+
+
+def test_initial_load_compiles_all_stages(stage_mgr):
+    assert stage_mgr.compiled_programs == 2
+    assert RPLoader.load_shader.call_count == 2
+
+
+def test_unchanged_reload_compiles_nothing(stage_mgr):
+    stage_mgr.reload_shaders()
+    assert stage_mgr.compiled_programs == 0
+    assert RPLoader.load_shader.call_count == 2
+
+
+def test_changed_include_only_reloads_dependent_stage(stage_mgr, shader_dir):
+    (shader_dir / "includes" / "lighting.inc.glsl").write_text("// changed\n")
+    stage_mgr.reload_shaders()
+    assert stage_mgr.compiled_programs == 1
+    assert RPLoader.load_shader.call_args == mock.call(
+        "/$$rp/shader/default_post_process.vert.glsl", "/$$rp/shader/lighting.frag.glsl")
+
+
+def test_shared_include_reloads_all_dependent_stages(stage_mgr, shader_dir):
+    lighting = stage_mgr.stages[1]
+    assert stage_mgr.get_include_dependents("/$$rp/shader/includes/lighting.inc.glsl") == [
+        lighting]
+    (shader_dir / "includes" / "common.inc.glsl").write_text("// changed\n")
+    stage_mgr.reload_shaders()
+    assert stage_mgr.compiled_programs == 2
@@ -0,0 +1,153 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip("panda3d.core")
+
+from unittest import mock  # noqa
+
+from rpcore.render_stage import RenderStage  # noqa
+from rpcore.stage_manager import StageManager  # noqa
+
+
+class Clock(object):
+
+    """ Replaces the time module of the stage manager, time only advances
+    when a stage updates """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+
+class TimedStage(RenderStage):
+
+    """ Stage whose update takes the given amount of milliseconds """
+
+    def __init__(self, pipeline, clock, duration):
+        RenderStage.__init__(self, pipeline)
+        self.clock = clock
+        self.duration = duration
+        self.updates = 0
+
+    def _get_plugin_id(self):
+        return "test"
+
+    def update(self):
+        self.updates += 1
+        self.clock.now += self.duration / 1000.0
+
+
+class GBufferStage(TimedStage):
+    pass
+
+
+class AmbientStage(TimedStage):
+    pass
+
+
+@pytest.fixture
+def stage_mgr(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("rpcore.stage_manager.time", clock)
+    monkeypatch.setattr(StageManager, "_load_stage_order", lambda self: None)
+    pipeline = mock.MagicMock()
+    stage_mgr = StageManager(pipeline)
+    stage_mgr.stages = [GBufferStage(pipeline, clock, 2.0), AmbientStage(pipeline, clock, 0.5)]
+    return stage_mgr
+
+
+def test_stats_are_recorded_per_stage(stage_mgr):
+    gbuffer, ambient = stage_mgr.stages
+    stage_mgr.enable_stage_timing()
+    for frame in range(4):
+        ambient.duration = 0.5 if frame < 3 else 4.5
+        stage_mgr.update()
+
+    stats = stage_mgr.get_stage_stats()
+    assert set(stats) == {"test:GBufferStage", "test:AmbientStage"}
+    assert stats["test:GBufferStage"] == pytest.approx(
+        {"frames": 4, "active_frames": 4, "mean": 2.0, "p95": 2.0, "max": 2.0})
+    assert stats["test:AmbientStage"]["mean"] == pytest.approx(1.5)
+    assert stats["test:AmbientStage"]["max"] == pytest.approx(4.5)
+    assert gbuffer.updates == ambient.updates == 4
+
+
+def test_inactive_stages_are_counted_but_not_timed(stage_mgr):
+    ambient = stage_mgr.stages[1]
+    stage_mgr.enable_stage_timing()
+    stage_mgr.update()
+    ambient.active = False
+    stage_mgr.update()
+
+    stats = stage_mgr.get_stage_stats()["test:AmbientStage"]
+    assert stats["frames"] == 2
+    assert stats["active_frames"] == 1
+    assert ambient.updates == 1
+
+
+def test_only_the_latest_samples_are_kept(stage_mgr):
+    gbuffer = stage_mgr.stages[0]
+    stage_mgr.enable_stage_timing(num_samples=2)
+    for duration in (10.0, 1.0, 3.0):
+        gbuffer.duration = duration
+        stage_mgr.update()
+
+    stats = stage_mgr.get_stage_stats()["test:GBufferStage"]
+    assert stats["frames"] == 3
+    assert stats["mean"] == pytest.approx(2.0)
+    assert stats["max"] == pytest.approx(3.0)
+
+
+def test_nothing_is_recorded_when_disabled(stage_mgr):
+    stage_mgr.update()
+    assert stage_mgr.get_stage_stats() == {}
+
+    stage_mgr.enable_stage_timing()
+    stage_mgr.update()
+    stage_mgr.disable_stage_timing()
+    stage_mgr.update()
+    assert stage_mgr.get_stage_stats() == {}
+    assert [stage.updates for stage in stage_mgr.stages] == [3, 3]
+
+
+def test_exported_stats(stage_mgr, tmp_path):
+    stage_mgr.enable_stage_timing()
+    stage_mgr.update()
+    filename = str(tmp_path / "stage_stats.json")
+    stage_mgr.export_stage_stats(filename)
+
+    with open(filename) as handle:
+        exported = json.load(handle)
+    assert set(exported) == {"test:GBufferStage", "test:AmbientStage"}
+    for entry in exported.values():
+        assert set(entry) == {"frames", "active_frames", "mean", "p95", "max"}
+    assert exported == stage_mgr.get_stage_stats()
@@ -0,0 +1,83 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import pytest
+
+pytest.importorskip("panda3d.core")
+
+from rpcore.util import transient_texture_pool  # noqa
+from rpcore.util.transient_texture_pool import TransientTexturePool  # noqa
+
+
+class FakeTexture(object):  # pylint: disable=too-few-public-methods
+
+    """ Texture which counts how often its memory was released """
+
+    def __init__(self, name):
+        self.name = name
+        self.released = 0
+
+    def release_all(self):
+        self.released += 1
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(transient_texture_pool, "Texture", FakeTexture)
+    return TransientTexturePool()
+
+
+def test_released_textures_are_reused(pool):
+    first = pool.acquire("key", "first", 100)
+    pool.release(first)
+    assert pool.acquire("other-key", "other", 100) is not first
+    assert pool.acquire("key", "second", 100) is first
+    assert pool.requested_bytes == 300
+    assert pool.allocated_bytes == 200
+
+
+def test_shared_texture_is_kept_until_last_target_detaches(pool):
+    texture = pool.acquire("key", "first", 100)
+    pool.release(texture)
+    assert pool.acquire("key", "second", 100) is texture
+
+    assert not pool.detach(texture)
+    assert texture.released == 0
+    assert pool.detach(texture)
+    assert texture.released == 1
+
+
+def test_detached_texture_is_not_handed_out_again(pool):
+    texture = pool.acquire("key", "first", 100)
+    pool.release(texture)
+    assert pool.detach(texture)
+    assert pool.acquire("key", "second", 100) is not texture
+
+
+def test_detach_ignores_foreign_textures(pool):
+    texture = FakeTexture("foreign")
+    assert not pool.detach(texture)
+    assert texture.released == 0
@@ -0,0 +1,48 @@
+"""
+
+RenderPipeline
+
+Copyright (c) 2014-2016 tobspr <tobias.springer1@gmail.com>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+"""
+
+import os
+import glob
+
+import pytest
+
+pytest.importorskip("direct.stdpy.file")
+
+from rplibs.yaml import get_backends  # noqa
+from rplibs.yaml.loader import compare_backends  # noqa
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+YAML_FILES = sorted(
+    glob.glob(os.path.join(BASE_DIR, "config", "*.yaml")) +
+    glob.glob(os.path.join(BASE_DIR, "effects", "*.yaml")) +
+    glob.glob(os.path.join(BASE_DIR, "rpplugins", "*", "*.yaml")))
+
+
+@pytest.mark.skipif("native" not in get_backends(), reason="CSafeLoader is not available")
+def test_native_backend_matches_vendored_backend():
+    assert len(YAML_FILES) > 20
+    assert compare_backends(YAML_FILES, open) == []